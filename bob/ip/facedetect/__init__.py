@@ -7,11 +7,11 @@ import bob.math
 from . import version
 from .version import module as __version__
 
-from ._library import FeatureExtractor, BoundingBox, prune_detections, overlapping_detections
+from ._library import FeatureExtractor, BoundingBox, BoxArray, CompiledCascade, Workspace, ImagePyramid, prune_detections, overlapping_detections, best_detection
 from .detector import *
 from .train import *
 
-from .detect import default_cascade, best_detection, detect_single_face, detect_all_faces
+from .detect import default_cascade, warm_up, detect_single_face, detect_all_faces, detect_faces_batch
 
 
 def get_config():
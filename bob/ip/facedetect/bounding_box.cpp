@@ -581,6 +581,23 @@ static PyObject* PyBobIpFacedetectBoundingBox_contains(PyBobIpFacedetectBounding
 }
 
 
+static auto reduce = bob::extension::FunctionDoc(
+  "__reduce__",
+  "Returns the information to pickle this bounding box",
+  "This function allows bounding boxes to be pickled, e.g., to send them between processes.",
+  true
+)
+.add_prototype("", "class, arguments")
+.add_return("class", "type", "The :py:class:`BoundingBox` class")
+.add_return("arguments", "((float, float), (float, float))", "The top-left position and the size of the bounding box")
+;
+static PyObject* PyBobIpFacedetectBoundingBox_reduce(PyBobIpFacedetectBoundingBoxObject* self) {
+  BOB_TRY
+  return Py_BuildValue("O((dd)(dd))", Py_TYPE(self), self->cxx->top(), self->cxx->left(), self->cxx->height(), self->cxx->width());
+  BOB_CATCH_MEMBER("cannot reduce bounding box", 0)
+}
+
+
 static PyMethodDef PyBobIpFacedetectBoundingBox_methods[] = {
   {
     scale.name(),
@@ -624,6 +641,12 @@ static PyMethodDef PyBobIpFacedetectBoundingBox_methods[] = {
     METH_VARARGS|METH_KEYWORDS,
     contains.doc()
   },
+  {
+    reduce.name(),
+    (PyCFunction)PyBobIpFacedetectBoundingBox_reduce,
+    METH_NOARGS,
+    reduce.doc()
+  },
   {0} /* Sentinel */
 };
 
@@ -0,0 +1,407 @@
+/**
+ * @brief Binds the BoxArray class to python
+ *
+ * Copyright (C) 2011-2014 Idiap Research Institute, Martigny, Switzerland
+ */
+
+#include "main.h"
+#include <boost/format.hpp>
+
+/******************************************************************/
+/************ Constructor Section *********************************/
+/******************************************************************/
+
+static auto BoxArray_doc = bob::extension::ClassDoc(
+  BOB_EXT_MODULE_PREFIX ".BoxArray",
+  "An array of bounding boxes, which are stored in one (N,4) array",
+  "Each row of the array contains the top, left, height and width of one bounding box. "
+  "In opposition to a list of :py:class:`BoundingBox` objects, no object is created per bounding box, so that large numbers of detections can be handled efficiently. "
+  "All functions of this class are computed for all bounding boxes at once, and give the same results as the according functions of :py:class:`BoundingBox`.\n\n"
+  "Single bounding boxes can be accessed via indexing, which creates a new :py:class:`BoundingBox`."
+).add_constructor(
+  bob::extension::FunctionDoc(
+    "__init__",
+    "Constructs a new array of bounding boxes",
+    0,
+    true
+  )
+  .add_prototype("boxes", "")
+  .add_parameter("boxes", "array_like <2D, float> or [:py:class:`BoundingBox`] or :py:class:`BoxArray`", "The bounding boxes, either as an (N,4) array of ``(top, left, height, width)`` rows, or as a list of bounding boxes, or another box array to copy")
+);
+
+
+static int PyBobIpFacedetectBoxArray_init(PyBobIpFacedetectBoxArrayObject* self, PyObject* args, PyObject* kwargs) {
+  BOB_TRY
+
+  char** kwlist = BoxArray_doc.kwlist(0);
+
+  PyObject* boxes;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O", kwlist, &boxes)) return -1;
+
+  if (PyBobIpFacedetectBoxArray_Check(boxes)){
+    // copy construct
+    self->cxx.reset(new bob::ip::facedetect::BoxArray(reinterpret_cast<PyBobIpFacedetectBoxArrayObject*>(boxes)->cxx->boxes()));
+    return 0;
+  }
+
+  if (PyList_Check(boxes)){
+    // convert list of bounding boxes
+    std::vector<boost::shared_ptr<bob::ip::facedetect::BoundingBox>> list(PyList_GET_SIZE(boxes));
+    for (Py_ssize_t i = 0; i < PyList_GET_SIZE(boxes); ++i){
+      PyObject* v = PyList_GET_ITEM(boxes, i);
+      if (!PyBobIpFacedetectBoundingBox_Check(v)){
+        PyErr_Format(PyExc_TypeError, "%s : expected a list of BoundingBox objects, but object number %d is of type `%s'", Py_TYPE(self)->tp_name, (int)i, Py_TYPE(v)->tp_name);
+        return -1;
+      }
+      list[i] = ((PyBobIpFacedetectBoundingBoxObject*)v)->cxx;
+    }
+    self->cxx.reset(new bob::ip::facedetect::BoxArray(list));
+    return 0;
+  }
+
+  // convert array
+  PyBlitzArrayObject* array;
+  if (!PyBlitzArray_Converter(boxes, &array)) return -1;
+  auto array_ = make_safe(array);
+  if (array->ndim == 2 && array->shape[0] == 0){
+    // empty arrays might not have the correct data type
+    self->cxx.reset(new bob::ip::facedetect::BoxArray(0));
+    return 0;
+  }
+  auto b = PyBlitzArrayCxx_AsBlitz<double,2>(array, "boxes");
+  if (!b) return -1;
+  self->cxx.reset(new bob::ip::facedetect::BoxArray(*b));
+  return 0;
+
+  BOB_CATCH_MEMBER("cannot create BoxArray", -1)
+}
+
+static void PyBobIpFacedetectBoxArray_delete(PyBobIpFacedetectBoxArrayObject* self) {
+  self->cxx.reset();
+  Py_TYPE(self)->tp_free((PyObject*)self);
+}
+
+int PyBobIpFacedetectBoxArray_Check(PyObject* o) {
+  return PyObject_IsInstance(o, reinterpret_cast<PyObject*>(&PyBobIpFacedetectBoxArray_Type));
+}
+
+PyObject* PyBobIpFacedetectBoxArray_New(boost::shared_ptr<bob::ip::facedetect::BoxArray> boxes) {
+  PyBobIpFacedetectBoxArrayObject* ret = reinterpret_cast<PyBobIpFacedetectBoxArrayObject*>(PyBobIpFacedetectBoxArray_Type.tp_alloc(&PyBobIpFacedetectBoxArray_Type, 0));
+  if (ret) ret->cxx = boxes;
+  return reinterpret_cast<PyObject*>(ret);
+}
+
+static PyObject* PyBobIpFacedetectBoxArray_Str(PyBobIpFacedetectBoxArrayObject* self) {
+  BOB_TRY
+  return PyString_FromString((boost::format("<BoxArray with %d bounding boxes>") % self->cxx->size()).str().c_str());
+  BOB_CATCH_MEMBER("cannot create string representation", 0)
+}
+
+
+/******************************************************************/
+/************ Sequence Section ************************************/
+/******************************************************************/
+
+static Py_ssize_t PyBobIpFacedetectBoxArray_len(PyBobIpFacedetectBoxArrayObject* self) {
+  return self->cxx->size();
+}
+
+static PyObject* PyBobIpFacedetectBoxArray_getitem(PyBobIpFacedetectBoxArrayObject* self, Py_ssize_t i) {
+  BOB_TRY
+  if (i < 0 || i >= self->cxx->size()){
+    PyErr_Format(PyExc_IndexError, "%s index %d out of range", Py_TYPE(self)->tp_name, (int)i);
+    return 0;
+  }
+  PyBobIpFacedetectBoundingBoxObject* bb = reinterpret_cast<PyBobIpFacedetectBoundingBoxObject*>(PyBobIpFacedetectBoundingBox_Type.tp_alloc(&PyBobIpFacedetectBoundingBox_Type, 0));
+  bb->cxx = self->cxx->box(i);
+  return Py_BuildValue("N", bb);
+  BOB_CATCH_MEMBER("cannot get bounding box", 0)
+}
+
+static PySequenceMethods PyBobIpFacedetectBoxArray_sequence = {
+  (lenfunc)PyBobIpFacedetectBoxArray_len,
+  0,
+  0,
+  (ssizeargfunc)PyBobIpFacedetectBoxArray_getitem,
+  0,
+  0,
+  0,
+  0,
+  0,
+  0
+};
+
+
+/******************************************************************/
+/************ Variables Section ***********************************/
+/******************************************************************/
+
+static auto boxes = bob::extension::VariableDoc(
+  "boxes",
+  "array_like <2D, float>",
+  "The (N,4) array of ``(top, left, height, width)`` rows of the bounding boxes, read access only"
+);
+PyObject* PyBobIpFacedetectBoxArray_boxes(PyBobIpFacedetectBoxArrayObject* self, void*){
+  BOB_TRY
+  return PyBlitzArrayCxx_AsConstNumpy(self->cxx->boxes());
+  BOB_CATCH_MEMBER("boxes could not be read", 0)
+}
+
+static auto area = bob::extension::VariableDoc(
+  "area",
+  "array_like <1D, float>",
+  "The areas of the bounding boxes, read access only"
+);
+PyObject* PyBobIpFacedetectBoxArray_area(PyBobIpFacedetectBoxArrayObject* self, void*){
+  BOB_TRY
+  blitz::Array<double,1> area(self->cxx->size());
+  for (int i = area.extent(0); i--;)
+    area(i) = self->cxx->area(i);
+  return PyBlitzArrayCxx_AsNumpy(area);
+  BOB_CATCH_MEMBER("area could not be read", 0)
+}
+
+static PyGetSetDef PyBobIpFacedetectBoxArray_getseters[] = {
+    {
+      boxes.name(),
+      (getter)PyBobIpFacedetectBoxArray_boxes,
+      0,
+      boxes.doc(),
+      0
+    },
+    {
+      area.name(),
+      (getter)PyBobIpFacedetectBoxArray_area,
+      0,
+      area.doc(),
+      0
+    },
+    {0}  /* Sentinel */
+};
+
+
+/******************************************************************/
+/************ Functions Section ***********************************/
+/******************************************************************/
+
+static auto shift = bob::extension::FunctionDoc(
+  "shift",
+  "This function returns shifted versions of all bounding boxes",
+  0,
+  true
+)
+.add_prototype("offset", "box_array")
+.add_parameter("offset", "(float, float)", "The offset with which the bounding boxes should be shifted")
+.add_return("box_array", ":py:class:`BoxArray`", "The shifted bounding boxes")
+;
+static PyObject* PyBobIpFacedetectBoxArray_shift(PyBobIpFacedetectBoxArrayObject* self, PyObject* args, PyObject* kwargs) {
+  BOB_TRY
+  char** kwlist = shift.kwlist();
+
+  blitz::TinyVector<double,2> offset;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "(dd)", kwlist, &offset[0], &offset[1])) return 0;
+  return PyBobIpFacedetectBoxArray_New(self->cxx->shift(offset[0], offset[1]));
+  BOB_CATCH_MEMBER("cannot shift", 0)
+}
+
+static auto scale = bob::extension::FunctionDoc(
+  "scale",
+  "This function returns scaled versions of all bounding boxes",
+  "When the ``centered`` parameter is set to ``True``, the transformation center will be in the center of each bounding box, otherwise it will be at (0,0)",
+  true
+)
+.add_prototype("scale, [centered]", "box_array")
+.add_parameter("scale", "float", "The scale with which the bounding boxes should be scaled")
+.add_parameter("centered", "bool", "[Default: ``False``] : Should the scaling done with repect to the center of the bounding boxes?")
+.add_return("box_array", ":py:class:`BoxArray`", "The scaled bounding boxes")
+;
+static PyObject* PyBobIpFacedetectBoxArray_scale(PyBobIpFacedetectBoxArrayObject* self, PyObject* args, PyObject* kwargs) {
+  BOB_TRY
+  char** kwlist = scale.kwlist();
+
+  double scale;
+  PyObject* centered = 0;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "d|O!", kwlist, &scale, &PyBool_Type, &centered)) return 0;
+  if (f(centered))
+    return PyBobIpFacedetectBoxArray_New(self->cxx->scaleCentered(scale));
+  return PyBobIpFacedetectBoxArray_New(self->cxx->scale(scale));
+  BOB_CATCH_MEMBER("cannot scale", 0)
+}
+
+static auto mirror_x = bob::extension::FunctionDoc(
+  "mirror_x",
+  "This function returns horizontally mirrored versions of all bounding boxes",
+  0,
+  true
+)
+.add_prototype("width", "box_array")
+.add_parameter("width", "int", "The width of the image at which the bounding boxes should be mirrored")
+.add_return("box_array", ":py:class:`BoxArray`", "The mirrored bounding boxes")
+;
+static PyObject* PyBobIpFacedetectBoxArray_mirror_x(PyBobIpFacedetectBoxArrayObject* self, PyObject* args, PyObject* kwargs) {
+  BOB_TRY
+  char** kwlist = mirror_x.kwlist();
+
+  int width;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "i", kwlist, &width)) return 0;
+  return PyBobIpFacedetectBoxArray_New(self->cxx->mirrorX(width));
+  BOB_CATCH_MEMBER("cannot mirror horizontally", 0)
+}
+
+static auto similarity = bob::extension::FunctionDoc(
+  "similarity",
+  "This function computes the Jaccard similarity indexes between these and the given bounding boxes",
+  "When ``other`` is a single :py:class:`BoundingBox`, the similarities of all bounding boxes with ``other`` are returned. "
+  "When ``other`` is a :py:class:`BoxArray`, the matrix of pairwise similarities is returned. "
+  "The similarities are identical to the ones computed by :py:meth:`BoundingBox.similarity`.",
+  true
+)
+.add_prototype("other", "sim")
+.add_parameter("other", ":py:class:`BoundingBox` or :py:class:`BoxArray`", "The other bounding box(es) to compute the similarities with")
+.add_return("sim", "array_like <1D or 2D, float>", "The Jaccard similarity indexes; of shape ``(N,)`` for a single bounding box, or ``(N,M)`` for a box array with ``M`` bounding boxes")
+;
+static PyObject* PyBobIpFacedetectBoxArray_similarity(PyBobIpFacedetectBoxArrayObject* self, PyObject* args, PyObject* kwargs) {
+  BOB_TRY
+  char** kwlist = similarity.kwlist();
+
+  PyObject* other;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O", kwlist, &other)) return 0;
+
+  const bob::ip::facedetect::BoxArray& boxes = *self->cxx;
+  if (PyBobIpFacedetectBoundingBox_Check(other)){
+    const bob::ip::facedetect::BoundingBox& bb = *reinterpret_cast<PyBobIpFacedetectBoundingBoxObject*>(other)->cxx;
+    blitz::Array<double,1> sim(boxes.size());
+    for (int i = sim.extent(0); i--;)
+      sim(i) = boxes.similarity(i, bb);
+    return PyBlitzArrayCxx_AsNumpy(sim);
+  }
+  if (PyBobIpFacedetectBoxArray_Check(other)){
+    // compute the pairwise similarities of both box arrays
+    const bob::ip::facedetect::BoxArray& others = *reinterpret_cast<PyBobIpFacedetectBoxArrayObject*>(other)->cxx;
+    blitz::Array<double,2> sim(boxes.size(), others.size());
+    for (int i = sim.extent(0); i--;)
+      for (int j = sim.extent(1); j--;)
+        sim(i,j) = boxes.similarity(i, others, j);
+    return PyBlitzArrayCxx_AsNumpy(sim);
+  }
+  PyErr_Format(PyExc_TypeError, "%s : expected a BoundingBox or a BoxArray, but got an object of type `%s'", Py_TYPE(self)->tp_name, Py_TYPE(other)->tp_name);
+  return 0;
+  BOB_CATCH_MEMBER("cannot compute similarity", 0)
+}
+
+static auto is_valid_for = bob::extension::FunctionDoc(
+  "is_valid_for",
+  "Checks which of the bounding boxes are inside the given image size",
+  0,
+  true
+)
+.add_prototype("size", "valid")
+.add_parameter("size", "(int, int)", "The size of the image to test")
+.add_return("valid", "array_like <1D, bool>", "``True`` for each bounding box that is inside the image boundaries, ``False`` otherwise")
+;
+static PyObject* PyBobIpFacedetectBoxArray_is_valid_for(PyBobIpFacedetectBoxArrayObject* self, PyObject* args, PyObject* kwargs) {
+  BOB_TRY
+  char** kwlist = is_valid_for.kwlist();
+
+  blitz::TinyVector<int,2> size;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "(ii)", kwlist, &size[0], &size[1])) return 0;
+
+  blitz::Array<bool,1> valid(self->cxx->size());
+  for (int i = valid.extent(0); i--;)
+    valid(i) = self->cxx->isValidFor(i, size);
+  return PyBlitzArrayCxx_AsNumpy(valid);
+  BOB_CATCH_MEMBER("cannot compute validity", 0)
+}
+
+static auto reduce = bob::extension::FunctionDoc(
+  "__reduce__",
+  "Returns the information to pickle this box array",
+  "This function allows box arrays to be pickled, e.g., to send them between processes.",
+  true
+)
+.add_prototype("", "class, arguments")
+.add_return("class", "type", "The :py:class:`BoxArray` class")
+.add_return("arguments", "(array_like <2D, float>,)", "The :py:attr:`boxes`")
+;
+static PyObject* PyBobIpFacedetectBoxArray_reduce(PyBobIpFacedetectBoxArrayObject* self) {
+  BOB_TRY
+  return Py_BuildValue("O(N)", Py_TYPE(self), PyBlitzArrayCxx_AsNumpy(self->cxx->boxes().copy()));
+  BOB_CATCH_MEMBER("cannot reduce box array", 0)
+}
+
+static PyMethodDef PyBobIpFacedetectBoxArray_methods[] = {
+  {
+    scale.name(),
+    (PyCFunction)PyBobIpFacedetectBoxArray_scale,
+    METH_VARARGS|METH_KEYWORDS,
+    scale.doc()
+  },
+  {
+    shift.name(),
+    (PyCFunction)PyBobIpFacedetectBoxArray_shift,
+    METH_VARARGS|METH_KEYWORDS,
+    shift.doc()
+  },
+  {
+    mirror_x.name(),
+    (PyCFunction)PyBobIpFacedetectBoxArray_mirror_x,
+    METH_VARARGS|METH_KEYWORDS,
+    mirror_x.doc()
+  },
+  {
+    similarity.name(),
+    (PyCFunction)PyBobIpFacedetectBoxArray_similarity,
+    METH_VARARGS|METH_KEYWORDS,
+    similarity.doc()
+  },
+  {
+    is_valid_for.name(),
+    (PyCFunction)PyBobIpFacedetectBoxArray_is_valid_for,
+    METH_VARARGS|METH_KEYWORDS,
+    is_valid_for.doc()
+  },
+  {
+    reduce.name(),
+    (PyCFunction)PyBobIpFacedetectBoxArray_reduce,
+    METH_NOARGS,
+    reduce.doc()
+  },
+  {0} /* Sentinel */
+};
+
+
+/******************************************************************/
+/************ Module Section **************************************/
+/******************************************************************/
+
+// Define the BoxArray type struct; will be initialized later
+PyTypeObject PyBobIpFacedetectBoxArray_Type = {
+  PyVarObject_HEAD_INIT(0,0)
+  0
+};
+
+bool init_BobIpFacedetectBoxArray(PyObject* module)
+{
+  // initialize the type struct
+  PyBobIpFacedetectBoxArray_Type.tp_name = BoxArray_doc.name();
+  PyBobIpFacedetectBoxArray_Type.tp_basicsize = sizeof(PyBobIpFacedetectBoxArrayObject);
+  PyBobIpFacedetectBoxArray_Type.tp_flags = Py_TPFLAGS_DEFAULT;
+  PyBobIpFacedetectBoxArray_Type.tp_doc = BoxArray_doc.doc();
+  PyBobIpFacedetectBoxArray_Type.tp_repr = (reprfunc)PyBobIpFacedetectBoxArray_Str;
+  PyBobIpFacedetectBoxArray_Type.tp_str = (reprfunc)PyBobIpFacedetectBoxArray_Str;
+
+  // set the functions
+  PyBobIpFacedetectBoxArray_Type.tp_new = PyType_GenericNew;
+  PyBobIpFacedetectBoxArray_Type.tp_init = reinterpret_cast<initproc>(PyBobIpFacedetectBoxArray_init);
+  PyBobIpFacedetectBoxArray_Type.tp_dealloc = reinterpret_cast<destructor>(PyBobIpFacedetectBoxArray_delete);
+  PyBobIpFacedetectBoxArray_Type.tp_as_sequence = &PyBobIpFacedetectBoxArray_sequence;
+  PyBobIpFacedetectBoxArray_Type.tp_methods = PyBobIpFacedetectBoxArray_methods;
+  PyBobIpFacedetectBoxArray_Type.tp_getset = PyBobIpFacedetectBoxArray_getseters;
+
+  // check that everything is fine
+  if (PyType_Ready(&PyBobIpFacedetectBoxArray_Type) < 0) return false;
+
+  // add the type to the module
+  Py_INCREF(&PyBobIpFacedetectBoxArray_Type);
+  return PyModule_AddObject(module, "BoxArray", (PyObject*)&PyBobIpFacedetectBoxArray_Type) >= 0;
+}
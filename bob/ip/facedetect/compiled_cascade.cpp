@@ -0,0 +1,435 @@
+/**
+ * @brief Binds the CompiledCascade class to python
+ *
+ * Copyright (C) 2011-2014 Idiap Research Institute, Martigny, Switzerland
+ */
+
+#include "main.h"
+
+/******************************************************************/
+/************ Constructor Section *********************************/
+/******************************************************************/
+
+static auto CompiledCascade_doc = bob::extension::ClassDoc(
+  BOB_EXT_MODULE_PREFIX ".CompiledCascade",
+  "A cascade of strong classifiers, which is stored in contiguous arrays",
+  "All weak machines of all strong classifiers of a :py:class:`Cascade` are required to be :py:class:`bob.learn.boosting.LUTMachine`\\s. "
+  "Their look-up-tables are concatenated into one 2D array, where each look-up-table is already multiplied with the weight of its weak machine. "
+  "Hence, the prediction of a patch is computed in a tight loop without calling any :py:class:`bob.learn.boosting.BoostedMachine`, and the predictions are identical to the ones of :py:meth:`Cascade.__call__`.\n\n"
+  "Usually, this class is not created directly, but using :py:meth:`Cascade.compile`."
+).add_constructor(
+  bob::extension::FunctionDoc(
+    "__init__",
+    "Creates a compiled cascade from the given flattened cascade",
+    "The parameters can be obtained by :py:meth:`Cascade.flatten`.",
+    true
+  )
+  .add_prototype("stage_ends, feature_indices, look_up_tables, thresholds", "")
+  .add_parameter("stage_ends", "array_like <1D, int32>", "For each strong classifier, the index of the first weak machine of the next strong classifier")
+  .add_parameter("feature_indices", "array_like <1D, int32>", "The feature index of each weak machine")
+  .add_parameter("look_up_tables", "array_like <2D, float>", "The weighted look-up-table of each weak machine (one row per weak machine)")
+  .add_parameter("thresholds", "array_like <1D, float>", "The rejection threshold of each strong classifier")
+);
+
+
+static int PyBobIpFacedetectCompiledCascade_init(PyBobIpFacedetectCompiledCascadeObject* self, PyObject* args, PyObject* kwargs) {
+  BOB_TRY
+
+  char** kwlist = CompiledCascade_doc.kwlist(0);
+
+  PyBlitzArrayObject* stage_ends,* feature_indices,* look_up_tables,* thresholds;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O&O&O&O&", kwlist, &PyBlitzArray_Converter, &stage_ends, &PyBlitzArray_Converter, &feature_indices, &PyBlitzArray_Converter, &look_up_tables, &PyBlitzArray_Converter, &thresholds)) return -1;
+  auto stage_ends_ = make_safe(stage_ends);
+  auto feature_indices_ = make_safe(feature_indices);
+  auto look_up_tables_ = make_safe(look_up_tables);
+  auto thresholds_ = make_safe(thresholds);
+  auto e = PyBlitzArrayCxx_AsBlitz<int32_t,1>(stage_ends, "stage_ends");
+  auto i = PyBlitzArrayCxx_AsBlitz<int32_t,1>(feature_indices, "feature_indices");
+  auto l = PyBlitzArrayCxx_AsBlitz<double,2>(look_up_tables, "look_up_tables");
+  auto t = PyBlitzArrayCxx_AsBlitz<double,1>(thresholds, "thresholds");
+  if (!e || !i || !l || !t) return -1;
+
+  self->cxx.reset(new bob::ip::facedetect::CompiledCascade(*e, *i, *l, *t));
+  return 0;
+
+  BOB_CATCH_MEMBER("cannot create CompiledCascade", -1)
+}
+
+static void PyBobIpFacedetectCompiledCascade_delete(PyBobIpFacedetectCompiledCascadeObject* self) {
+  self->cxx.reset();
+  Py_TYPE(self)->tp_free((PyObject*)self);
+}
+
+int PyBobIpFacedetectCompiledCascade_Check(PyObject* o) {
+  return PyObject_IsInstance(o, reinterpret_cast<PyObject*>(&PyBobIpFacedetectCompiledCascade_Type));
+}
+
+
+/******************************************************************/
+/************ Variables Section ***********************************/
+/******************************************************************/
+
+static auto stage_ends = bob::extension::VariableDoc(
+  "stage_ends",
+  "array_like <1D, int32>",
+  "For each strong classifier, the index of the first weak machine of the next strong classifier, read access only"
+);
+PyObject* PyBobIpFacedetectCompiledCascade_stage_ends(PyBobIpFacedetectCompiledCascadeObject* self, void*){
+  BOB_TRY
+  return PyBlitzArrayCxx_AsConstNumpy(self->cxx->getStageEnds());
+  BOB_CATCH_MEMBER("stage_ends could not be read", 0)
+}
+
+static auto feature_indices = bob::extension::VariableDoc(
+  "feature_indices",
+  "array_like <1D, int32>",
+  "The feature index of each weak machine, read access only"
+);
+PyObject* PyBobIpFacedetectCompiledCascade_feature_indices(PyBobIpFacedetectCompiledCascadeObject* self, void*){
+  BOB_TRY
+  return PyBlitzArrayCxx_AsConstNumpy(self->cxx->getFeatureIndices());
+  BOB_CATCH_MEMBER("feature_indices could not be read", 0)
+}
+
+static auto look_up_tables = bob::extension::VariableDoc(
+  "look_up_tables",
+  "array_like <2D, float>",
+  "The weighted look-up-tables of all weak machines, read access only"
+);
+PyObject* PyBobIpFacedetectCompiledCascade_look_up_tables(PyBobIpFacedetectCompiledCascadeObject* self, void*){
+  BOB_TRY
+  return PyBlitzArrayCxx_AsConstNumpy(self->cxx->getLookUpTables());
+  BOB_CATCH_MEMBER("look_up_tables could not be read", 0)
+}
+
+static auto thresholds = bob::extension::VariableDoc(
+  "thresholds",
+  "array_like <1D, float>",
+  "The rejection thresholds of the strong classifiers, read access only"
+);
+PyObject* PyBobIpFacedetectCompiledCascade_thresholds(PyBobIpFacedetectCompiledCascadeObject* self, void*){
+  BOB_TRY
+  return PyBlitzArrayCxx_AsConstNumpy(self->cxx->getThresholds());
+  BOB_CATCH_MEMBER("thresholds could not be read", 0)
+}
+
+static auto upper_bounds = bob::extension::VariableDoc(
+  "upper_bounds",
+  "array_like <1D, float>",
+  "The maximum value that the prediction can increase from the beginning of each strong classifier on, read access only",
+  "These bounds are computed from the maximum values of the look-up-tables. "
+  "Since a patch can be rejected after each strong classifier, the bound of a strong classifier is its maximum contribution plus the positive part of the bound of the next strong classifier."
+);
+PyObject* PyBobIpFacedetectCompiledCascade_upper_bounds(PyBobIpFacedetectCompiledCascadeObject* self, void*){
+  BOB_TRY
+  return PyBlitzArrayCxx_AsConstNumpy(self->cxx->getUpperBounds());
+  BOB_CATCH_MEMBER("upper_bounds could not be read", 0)
+}
+
+static auto number_of_stages = bob::extension::VariableDoc(
+  "number_of_stages",
+  "int",
+  "The number of strong classifiers in this cascade, read access only"
+);
+PyObject* PyBobIpFacedetectCompiledCascade_number_of_stages(PyBobIpFacedetectCompiledCascadeObject* self, void*){
+  BOB_TRY
+  return Py_BuildValue("i", self->cxx->numberOfStages());
+  BOB_CATCH_MEMBER("number_of_stages could not be read", 0)
+}
+
+static PyGetSetDef PyBobIpFacedetectCompiledCascade_getseters[] = {
+    {
+      stage_ends.name(),
+      (getter)PyBobIpFacedetectCompiledCascade_stage_ends,
+      0,
+      stage_ends.doc(),
+      0
+    },
+    {
+      feature_indices.name(),
+      (getter)PyBobIpFacedetectCompiledCascade_feature_indices,
+      0,
+      feature_indices.doc(),
+      0
+    },
+    {
+      look_up_tables.name(),
+      (getter)PyBobIpFacedetectCompiledCascade_look_up_tables,
+      0,
+      look_up_tables.doc(),
+      0
+    },
+    {
+      thresholds.name(),
+      (getter)PyBobIpFacedetectCompiledCascade_thresholds,
+      0,
+      thresholds.doc(),
+      0
+    },
+    {
+      upper_bounds.name(),
+      (getter)PyBobIpFacedetectCompiledCascade_upper_bounds,
+      0,
+      upper_bounds.doc(),
+      0
+    },
+    {
+      number_of_stages.name(),
+      (getter)PyBobIpFacedetectCompiledCascade_number_of_stages,
+      0,
+      number_of_stages.doc(),
+      0
+    },
+    {0}  /* Sentinel */
+};
+
+
+/******************************************************************/
+/************ Functions Section ***********************************/
+/******************************************************************/
+
+static auto predict = bob::extension::FunctionDoc(
+  "predict",
+  "Computes the prediction of this cascade for the given bounding box",
+  "The features are extracted from the image that the given ``extractor`` -- or the given ``workspace`` -- has been prepared with, see :py:meth:`FeatureExtractor.prepare`. "
+  "The prediction is identical to the one computed by :py:meth:`Cascade.__call__`.\n\n"
+  ".. note:: The :py:func:`__call__` function is an alias for this function.",
+  true
+)
+.add_prototype("extractor, bounding_box, [workspace]", "prediction")
+.add_parameter("extractor", ":py:class:`FeatureExtractor`", "The feature extractor that has been prepared with the (scaled) image")
+.add_parameter("bounding_box", ":py:class:`BoundingBox`", "The bounding box for which the prediction should be computed")
+.add_parameter("workspace", ":py:class:`Workspace`", "[default: ``None``] The workspace that has been prepared with the (scaled) image; if not given, the internal workspace of the ``extractor`` is used")
+.add_return("prediction", "float", "The prediction of the cascade for the given ``bounding_box``")
+;
+static PyObject* PyBobIpFacedetectCompiledCascade_predict(PyBobIpFacedetectCompiledCascadeObject* self, PyObject* args, PyObject* kwargs) {
+  BOB_TRY
+  char** kwlist = predict.kwlist();
+
+  PyBobIpFacedetectFeatureExtractorObject* extractor;
+  PyBobIpFacedetectBoundingBoxObject* bb;
+  PyBobIpFacedetectWorkspaceObject* workspace = 0;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O!O!|O!", kwlist, &PyBobIpFacedetectFeatureExtractor_Type, &extractor, &PyBobIpFacedetectBoundingBox_Type, &bb, &PyBobIpFacedetectWorkspace_Type, &workspace)) return 0;
+
+  self->cxx->check(*extractor->cxx);
+  const bob::ip::facedetect::Workspace& ws = workspace ? *workspace->cxx : extractor->cxx->getWorkspace();
+  extractor->cxx->checkWorkspace(ws);
+  return Py_BuildValue("d", self->cxx->predict(*extractor->cxx, ws, bb->cxx->top(), bb->cxx->left()));
+  BOB_CATCH_MEMBER("cannot compute prediction", 0)
+}
+
+static auto scan = bob::extension::FunctionDoc(
+  "scan",
+  "Computes the predictions for all patches of the image that the given ``extractor`` or ``workspace`` has been prepared with",
+  "The patches are sampled in the same way as :py:meth:`Sampler.sample_scaled` does. "
+  "Only the predictions and the top-left positions of patches that have a prediction above ``threshold`` are returned, where the positions are transformed back into the original image resolution.\n\n"
+  "By default, each patch is evaluated by all stages, until it is rejected, before the next patch is evaluated. "
+  "When ``breadth_first`` is enabled, the first stage is evaluated for all patches, then the second stage is evaluated for all patches that have not been rejected, and so on. "
+  "Both ways compute identical predictions.\n\n"
+  "The GIL is released during the scan, so different extractors -- or one extractor with different workspaces -- can be scanned in different threads.\n\n"
+  "The results are collected in buffers of the workspace, which are only enlarged when more patches are scanned than before, see :py:attr:`Workspace.allocations`; only the returned arrays are newly created in each call.\n\n"
+  ".. note:: Usually, this function is not called directly, but via :py:meth:`Sampler.scan_cascade`.",
+  true
+)
+.add_prototype("extractor, scale, patch_size, distance, [threshold], [breadth_first], [workspace]", "predictions, tops, lefts")
+.add_parameter("extractor", ":py:class:`FeatureExtractor`", "The feature extractor that has been prepared with the scaled image")
+.add_parameter("scale", "float", "The scale, which the ``extractor`` has been prepared with")
+.add_parameter("patch_size", "(int, int)", "The size of the patches to sample in the scaled image")
+.add_parameter("distance", "int", "The distance between two sampled patches in the scaled image")
+.add_parameter("threshold", "float or ``None``", "[default: ``None``] Only patches with a prediction above this threshold are returned; if ``None``, all patches are returned")
+.add_parameter("breadth_first", "bool", "[default: ``False``] Evaluate the patches stage by stage?")
+.add_parameter("workspace", ":py:class:`Workspace`", "[default: ``None``] The workspace that has been prepared with the scaled image; if not given, the internal workspace of the ``extractor`` is used")
+.add_return("predictions", "array_like <1D, float>", "The predictions of the returned patches")
+.add_return("tops", "array_like <1D, float>", "The top coordinates of the returned patches in the original image")
+.add_return("lefts", "array_like <1D, float>", "The left coordinates of the returned patches in the original image")
+;
+static PyObject* PyBobIpFacedetectCompiledCascade_scan(PyBobIpFacedetectCompiledCascadeObject* self, PyObject* args, PyObject* kwargs) {
+  BOB_TRY
+  char** kwlist = scan.kwlist();
+
+  PyBobIpFacedetectFeatureExtractorObject* extractor;
+  double scale;
+  blitz::TinyVector<int,2> patch_size;
+  int distance;
+  PyObject* threshold = 0,* breadth_first = 0;
+  PyBobIpFacedetectWorkspaceObject* workspace = 0;
+
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O!d(ii)i|OO!O!", kwlist, &PyBobIpFacedetectFeatureExtractor_Type, &extractor, &scale, &patch_size[0], &patch_size[1], &distance, &threshold, &PyBool_Type, &breadth_first, &PyBobIpFacedetectWorkspace_Type, &workspace)) return 0;
+
+  double thres = -std::numeric_limits<double>::max();
+  if (threshold && threshold != Py_None){
+    thres = PyFloat_AsDouble(threshold);
+    if (PyErr_Occurred()) return 0;
+  }
+
+  // release the GIL, so that several images or scales can be scanned in parallel
+  bool bf = f(breadth_first);
+  const bob::ip::facedetect::Workspace& ws = workspace ? *workspace->cxx : extractor->cxx->getWorkspace();
+  // the results are written into the buffers of the workspace
+  std::vector<double>& predictions = ws.resultPredictions();
+  std::vector<int32_t>& tops = ws.resultTops(), & lefts = ws.resultLefts();
+  std::string error;
+  Py_BEGIN_ALLOW_THREADS
+  try {
+    if (bf)
+      self->cxx->scanBreadthFirst(*extractor->cxx, ws, patch_size, distance, thres, predictions, tops, lefts);
+    else
+      self->cxx->scan(*extractor->cxx, ws, patch_size, distance, thres, predictions, tops, lefts);
+  } catch (std::exception& e) {
+    error = e.what();
+  } catch (...) {
+    error = "unknown exception";
+  }
+  Py_END_ALLOW_THREADS
+  if (!error.empty()) throw std::runtime_error(error);
+
+  // transform the results into the original image resolution
+  const double factor = 1./scale;
+  blitz::Array<double,1> p(predictions.size()), y(tops.size()), x(lefts.size());
+  for (int i = 0; i < p.extent(0); ++i){
+    p(i) = predictions[i];
+    y(i) = tops[i] * factor;
+    x(i) = lefts[i] * factor;
+  }
+
+  // return tuple: predictions, tops, lefts
+  return Py_BuildValue("NNN", PyBlitzArrayCxx_AsNumpy(p), PyBlitzArrayCxx_AsNumpy(y), PyBlitzArrayCxx_AsNumpy(x));
+  BOB_CATCH_MEMBER("cannot scan image", 0)
+}
+
+static auto scan_best = bob::extension::FunctionDoc(
+  "scan_best",
+  "Computes the predictions for the patches of the image that can be close to the best prediction",
+  "The patches are sampled in the same way as :py:meth:`scan` does, but only patches with a prediction above ``max(0, best - margin)`` are returned, where ``best`` is the highest prediction found so far. "
+  "The evaluation of a patch is stopped as soon as its prediction cannot exceed this value anymore, even if the maximum values of the look-up-tables of all remaining strong classifiers would be added, see :py:attr:`upper_bounds`. "
+  "Hence, the predictions of the returned patches are identical to the ones of :py:meth:`scan`, and all patches with a prediction above ``max(0, best - margin)`` are returned, where ``best`` is the highest prediction of the image.\n\n"
+  "To search several scales, pass the returned ``best`` value to the next call.\n\n"
+  ".. note:: Usually, this function is not called directly, but via :py:meth:`Sampler.search_cascade`.",
+  true
+)
+.add_prototype("extractor, scale, patch_size, distance, [margin], [best], [workspace]", "predictions, tops, lefts, best")
+.add_parameter("extractor", ":py:class:`FeatureExtractor`", "The feature extractor that has been prepared with the scaled image")
+.add_parameter("scale", "float", "The scale, which the ``extractor`` has been prepared with")
+.add_parameter("patch_size", "(int, int)", "The size of the patches to sample in the scaled image")
+.add_parameter("distance", "int", "The distance between two sampled patches in the scaled image")
+.add_parameter("margin", "float or ``None``", "[default: ``None``] The margin below the best prediction, in which predictions are returned; if ``None``, all positive predictions are returned")
+.add_parameter("best", "float or ``None``", "[default: ``None``] The best prediction found so far, e.g., in other scales of the image")
+.add_parameter("workspace", ":py:class:`Workspace`", "[default: ``None``] The workspace that has been prepared with the scaled image; if not given, the internal workspace of the ``extractor`` is used")
+.add_return("predictions", "array_like <1D, float>", "The predictions of the returned patches")
+.add_return("tops", "array_like <1D, float>", "The top coordinates of the returned patches in the original image")
+.add_return("lefts", "array_like <1D, float>", "The left coordinates of the returned patches in the original image")
+.add_return("best", "float or ``None``", "The best prediction found so far, or ``None`` if no positive prediction has been found")
+;
+static PyObject* PyBobIpFacedetectCompiledCascade_scan_best(PyBobIpFacedetectCompiledCascadeObject* self, PyObject* args, PyObject* kwargs) {
+  BOB_TRY
+  char** kwlist = scan_best.kwlist();
+
+  PyBobIpFacedetectFeatureExtractorObject* extractor;
+  double scale;
+  blitz::TinyVector<int,2> patch_size;
+  int distance;
+  PyObject* margin = 0,* best = 0;
+  PyBobIpFacedetectWorkspaceObject* workspace = 0;
+
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O!d(ii)i|OOO!", kwlist, &PyBobIpFacedetectFeatureExtractor_Type, &extractor, &scale, &patch_size[0], &patch_size[1], &distance, &margin, &best, &PyBobIpFacedetectWorkspace_Type, &workspace)) return 0;
+
+  double m = std::numeric_limits<double>::infinity();
+  if (margin && margin != Py_None){
+    m = PyFloat_AsDouble(margin);
+    if (PyErr_Occurred()) return 0;
+  }
+  double b = -std::numeric_limits<double>::max();
+  if (best && best != Py_None){
+    b = PyFloat_AsDouble(best);
+    if (PyErr_Occurred()) return 0;
+  }
+
+  const bob::ip::facedetect::Workspace& ws = workspace ? *workspace->cxx : extractor->cxx->getWorkspace();
+  // the results are written into the buffers of the workspace
+  std::vector<double>& predictions = ws.resultPredictions();
+  std::vector<int32_t>& tops = ws.resultTops(), & lefts = ws.resultLefts();
+  std::string error;
+  Py_BEGIN_ALLOW_THREADS
+  try {
+    self->cxx->scanBest(*extractor->cxx, ws, patch_size, distance, m, b, predictions, tops, lefts);
+  } catch (std::exception& e) {
+    error = e.what();
+  } catch (...) {
+    error = "unknown exception";
+  }
+  Py_END_ALLOW_THREADS
+  if (!error.empty()) throw std::runtime_error(error);
+
+  // transform the results into the original image resolution
+  const double factor = 1./scale;
+  blitz::Array<double,1> p(predictions.size()), y(tops.size()), x(lefts.size());
+  for (int i = 0; i < p.extent(0); ++i){
+    p(i) = predictions[i];
+    y(i) = tops[i] * factor;
+    x(i) = lefts[i] * factor;
+  }
+
+  // return tuple: predictions, tops, lefts, best
+  if (b > 0.)
+    return Py_BuildValue("NNNd", PyBlitzArrayCxx_AsNumpy(p), PyBlitzArrayCxx_AsNumpy(y), PyBlitzArrayCxx_AsNumpy(x), b);
+  return Py_BuildValue("NNNO", PyBlitzArrayCxx_AsNumpy(p), PyBlitzArrayCxx_AsNumpy(y), PyBlitzArrayCxx_AsNumpy(x), Py_None);
+  BOB_CATCH_MEMBER("cannot scan image", 0)
+}
+
+
+static PyMethodDef PyBobIpFacedetectCompiledCascade_methods[] = {
+  {
+    predict.name(),
+    (PyCFunction)PyBobIpFacedetectCompiledCascade_predict,
+    METH_VARARGS|METH_KEYWORDS,
+    predict.doc()
+  },
+  {
+    scan.name(),
+    (PyCFunction)PyBobIpFacedetectCompiledCascade_scan,
+    METH_VARARGS|METH_KEYWORDS,
+    scan.doc()
+  },
+  {
+    scan_best.name(),
+    (PyCFunction)PyBobIpFacedetectCompiledCascade_scan_best,
+    METH_VARARGS|METH_KEYWORDS,
+    scan_best.doc()
+  },
+  {0} /* Sentinel */
+};
+
+/******************************************************************/
+/************ Module Section **************************************/
+/******************************************************************/
+
+// Define the CompiledCascade type struct; will be initialized later
+PyTypeObject PyBobIpFacedetectCompiledCascade_Type = {
+  PyVarObject_HEAD_INIT(0,0)
+  0
+};
+
+bool init_BobIpFacedetectCompiledCascade(PyObject* module)
+{
+  // initialize the type struct
+  PyBobIpFacedetectCompiledCascade_Type.tp_name = CompiledCascade_doc.name();
+  PyBobIpFacedetectCompiledCascade_Type.tp_basicsize = sizeof(PyBobIpFacedetectCompiledCascadeObject);
+  PyBobIpFacedetectCompiledCascade_Type.tp_flags = Py_TPFLAGS_DEFAULT;
+  PyBobIpFacedetectCompiledCascade_Type.tp_doc = CompiledCascade_doc.doc();
+
+  // set the functions
+  PyBobIpFacedetectCompiledCascade_Type.tp_new = PyType_GenericNew;
+  PyBobIpFacedetectCompiledCascade_Type.tp_init = reinterpret_cast<initproc>(PyBobIpFacedetectCompiledCascade_init);
+  PyBobIpFacedetectCompiledCascade_Type.tp_dealloc = reinterpret_cast<destructor>(PyBobIpFacedetectCompiledCascade_delete);
+  PyBobIpFacedetectCompiledCascade_Type.tp_call = reinterpret_cast<ternaryfunc>(PyBobIpFacedetectCompiledCascade_predict);
+  PyBobIpFacedetectCompiledCascade_Type.tp_methods = PyBobIpFacedetectCompiledCascade_methods;
+  PyBobIpFacedetectCompiledCascade_Type.tp_getset = PyBobIpFacedetectCompiledCascade_getseters;
+
+  // check that everything is fine
+  if (PyType_Ready(&PyBobIpFacedetectCompiledCascade_Type) < 0)
+    return false;
+
+  // add the type to the module
+  Py_INCREF(&PyBobIpFacedetectCompiledCascade_Type);
+  return PyModule_AddObject(module, "CompiledCascade", (PyObject*)&PyBobIpFacedetectCompiledCascade_Type) >= 0;
+}
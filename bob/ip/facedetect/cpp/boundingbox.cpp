@@ -1,5 +1,8 @@
 #include "features.h"
 #include <bob.core/logging.h>
+#include <boost/format.hpp>
+#include <limits>
+#include <cmath>
 
 boost::shared_ptr<bob::ip::facedetect::BoundingBox> bob::ip::facedetect::BoundingBox::overlap(const BoundingBox& other) const{
   // compute intersection rectangle
@@ -25,13 +28,142 @@ double bob::ip::facedetect::BoundingBox::similarity(const BoundingBox& other) co
   return intersection / (area() + other.area() - intersection);
 }
 
+bob::ip::facedetect::BoxArray::BoxArray(const blitz::Array<double,2>& boxes)
+: m_boxes(boxes.extent(0), 4)
+{
+  if (boxes.extent(1) != 4)
+    throw std::runtime_error((boost::format("The bounding boxes need to be of shape (N,4), but the second dimension is %d") % boxes.extent(1)).str());
+  m_boxes = boxes;
+}
+
+bob::ip::facedetect::BoxArray::BoxArray(const std::vector<boost::shared_ptr<BoundingBox>>& boxes)
+: m_boxes(boxes.size(), 4)
+{
+  for (int i = boxes.size(); i--;)
+    set(i, *boxes[i]);
+}
+
+boost::shared_ptr<bob::ip::facedetect::BoxArray> bob::ip::facedetect::BoxArray::shift(double y, double x) const{
+  boost::shared_ptr<BoxArray> shifted(new BoxArray(m_boxes));
+  for (int i = size(); i--;){
+    shifted->m_boxes(i,0) += y;
+    shifted->m_boxes(i,1) += x;
+  }
+  return shifted;
+}
+
+boost::shared_ptr<bob::ip::facedetect::BoxArray> bob::ip::facedetect::BoxArray::scale(double scale) const{
+  boost::shared_ptr<BoxArray> scaled(new BoxArray(size()));
+  scaled->m_boxes = m_boxes * scale;
+  return scaled;
+}
+
+boost::shared_ptr<bob::ip::facedetect::BoxArray> bob::ip::facedetect::BoxArray::scaleCentered(double scale) const{
+  boost::shared_ptr<BoxArray> scaled(new BoxArray(size()));
+  for (int i = size(); i--;)
+    scaled->set(i, *box(i)->scaleCentered(scale));
+  return scaled;
+}
+
+boost::shared_ptr<bob::ip::facedetect::BoxArray> bob::ip::facedetect::BoxArray::mirrorX(int width) const{
+  boost::shared_ptr<BoxArray> mirrored(new BoxArray(m_boxes));
+  for (int i = size(); i--;)
+    mirrored->m_boxes(i,1) = width - m_boxes(i,3) - m_boxes(i,1);
+  return mirrored;
+}
+
+boost::shared_ptr<bob::ip::facedetect::BoxArray> bob::ip::facedetect::BoxArray::select(const std::vector<int32_t>& indices) const{
+  boost::shared_ptr<BoxArray> selected(new BoxArray((int)indices.size()));
+  for (int i = indices.size(); i--;)
+    selected->m_boxes(i, blitz::Range::all()) = m_boxes(indices[i], blitz::Range::all());
+  return selected;
+}
+
+
 typedef std::pair<double, int> indexer;
 // sort descending
 bool gt(const indexer& a, const indexer& b){
   return a.first > b.first;
 }
 
-void bob::ip::facedetect::pruneDetections(const std::vector<boost::shared_ptr<BoundingBox>>& boxes, const blitz::Array<double, 1>& weights, double threshold, std::vector<boost::shared_ptr<BoundingBox>>& pruned_boxes, blitz::Array<double, 1>& pruned_weights, const int number_of_detections){
+static void checkSizes(const bob::ip::facedetect::BoxArray& boxes, const blitz::Array<double, 1>& weights){
+  if (boxes.size() != weights.extent(0))
+    throw std::runtime_error((boost::format("The number of detections %d and predictions %d differ") % boxes.size() % weights.extent(0)).str());
+}
+
+// A regular grid over the image plane, which stores in each cell the boxes that were added and that cover the cell
+class BoxGrid{
+  public:
+    BoxGrid(const bob::ip::facedetect::BoxArray& boxes, int cellsPerBox = 4)
+    : m_boxes(boxes)
+    {
+      // the cell size is the median size of the boxes
+      std::vector<double> sizes(boxes.size());
+      m_top = m_left = std::numeric_limits<double>::max();
+      double bottom = -std::numeric_limits<double>::max(), right = -std::numeric_limits<double>::max();
+      for (int i = boxes.size(); i--;){
+        sizes[i] = std::max(boxes.height(i), boxes.width(i));
+        m_top = std::min(m_top, boxes.top(i));
+        m_left = std::min(m_left, boxes.left(i));
+        bottom = std::max(bottom, boxes.bottom(i));
+        right = std::max(right, boxes.right(i));
+      }
+      std::nth_element(sizes.begin(), sizes.begin() + sizes.size()/2, sizes.end());
+      // limit the total number of cells relative to the number of boxes, in case the boxes are small compared to their spread
+      const double maxCells = std::max(cellsPerBox * (double)boxes.size(), 1.);
+      m_cellSize = std::max(std::max(sizes[sizes.size()/2], 1.), std::max(std::sqrt((bottom - m_top) * (right - m_left) / maxCells), std::max(bottom - m_top, right - m_left) / maxCells));
+      while ((double)(cell(bottom, m_top) + 1) * (cell(right, m_left) + 1) > maxCells)
+        m_cellSize *= 1.5;
+      m_rows = cell(bottom, m_top) + 1;
+      m_cols = cell(right, m_left) + 1;
+      m_cells.resize(m_rows * m_cols);
+    }
+
+    // adds the box with the given index to all cells that it covers; returns the number of the added box
+    int add(int index){
+      int slot = m_indices.size();
+      m_indices.push_back(index);
+      m_stamps.push_back(-1);
+      for (int y = cell(m_boxes.top(index), m_top); y <= cell(m_boxes.bottom(index), m_top); ++y)
+        for (int x = cell(m_boxes.left(index), m_left); x <= cell(m_boxes.right(index), m_left); ++x)
+          m_cells[y * m_cols + x].push_back(slot);
+      return slot;
+    }
+
+    // returns the smallest number of the added boxes that has a similarity above the (non-negative) threshold with the box of the given index, or -1
+    // when firstOnly is false, any overlapping box might be returned
+    int overlap(int index, double threshold, bool firstOnly = true){
+      int found = -1;
+      // only boxes that intersect can have a similarity above the threshold, and they share at least one cell
+      for (int y = cell(m_boxes.top(index), m_top); y <= cell(m_boxes.bottom(index), m_top); ++y)
+        for (int x = cell(m_boxes.left(index), m_left); x <= cell(m_boxes.right(index), m_left); ++x){
+          const std::vector<int>& c = m_cells[y * m_cols + x];
+          for (std::vector<int>::const_iterator it = c.begin(); it != c.end(); ++it){
+            // boxes that cover several cells are tested only once
+            if (m_stamps[*it] == index || (found >= 0 && *it >= found)) continue;
+            m_stamps[*it] = index;
+            if (m_boxes.similarity(m_indices[*it], index) > threshold){
+              if (!firstOnly) return *it;
+              found = *it;
+            }
+          }
+        }
+      return found;
+    }
+
+  private:
+    int cell(double position, double start) const {return std::max((int)((position - start) / m_cellSize), 0);}
+
+    const bob::ip::facedetect::BoxArray& m_boxes;
+    std::vector<int> m_indices;
+    std::vector<int> m_stamps;
+    double m_top, m_left, m_cellSize;
+    int m_rows, m_cols;
+    std::vector<std::vector<int> > m_cells;
+};
+
+void bob::ip::facedetect::pruneDetections(const BoxArray& boxes, const blitz::Array<double, 1>& weights, double threshold, std::vector<int32_t>& pruned_indices, const int number_of_detections){
+  checkSizes(boxes, weights);
   // sort boxes
   std::vector<indexer> sorted(boxes.size());
   for (int i = boxes.size(); i--;){
@@ -46,14 +178,16 @@ void bob::ip::facedetect::pruneDetections(const std::vector<boost::shared_ptr<Bo
   if (threshold >= 1.){
     // for overlap == 1 (or larger), all detections will be returned, but sorted
     pruned.insert(pruned.end(), sorted.begin(), sorted.end());
-  } else {
-    // prune detections (attention, this is O(n^2)!)
+  } else if (threshold < 0.){
+    // all boxes have a similarity above the threshold, so only the first one is kept
+    if (!sorted.empty()) pruned.push_back(sorted.front());
+  } else if (!sorted.empty()){
+    // prune detections, where only the boxes that are kept in the same grid cells are compared
+    BoxGrid grid(boxes);
     for (sit = sorted.begin(); sit != sorted.end(); ++sit){
-      for (pit = pruned.begin(); pit != pruned.end(); ++pit){
-        if (boxes[pit->second]->similarity(*boxes[sit->second]) > threshold) break;
-      }
-      if (pit == pruned.end()){
+      if (grid.overlap(sit->second, threshold, false) < 0){
         pruned.push_back(*sit);
+        grid.add(sit->second);
         if (number_of_detections > 0 && pruned.size() == (unsigned)number_of_detections){
           break;
         }
@@ -61,23 +195,36 @@ void bob::ip::facedetect::pruneDetections(const std::vector<boost::shared_ptr<Bo
     }
   }
 
-  // fill pruned boxes
-  pruned_boxes.reserve(pruned.size());
-  pruned_weights.resize(pruned.size());
-  int i = 0;
-  for (pit = pruned.begin(); pit != pruned.end(); ++pit, ++i){
-    pruned_boxes.push_back(boxes[pit->second]);
-    pruned_weights(i) = pit->first;
+  // fill pruned indices
+  pruned_indices.clear();
+  pruned_indices.reserve(pruned.size());
+  for (pit = pruned.begin(); pit != pruned.end(); ++pit){
+    pruned_indices.push_back(pit->second);
   }
 
   // done.
 }
 
-void bob::ip::facedetect::bestOverlap(const std::vector<boost::shared_ptr<BoundingBox>>& boxes, const blitz::Array<double, 1>& weights, double threshold, std::vector<boost::shared_ptr<BoundingBox>>& overlapping_boxes, blitz::Array<double, 1>& overlapping_weights){
-  if (boxes.empty()){
+void bob::ip::facedetect::pruneDetections(const std::vector<boost::shared_ptr<BoundingBox>>& boxes, const blitz::Array<double, 1>& weights, double threshold, std::vector<boost::shared_ptr<BoundingBox>>& pruned_boxes, blitz::Array<double, 1>& pruned_weights, const int number_of_detections){
+  std::vector<int32_t> indices;
+  pruneDetections(BoxArray(boxes), weights, threshold, indices, number_of_detections);
+
+  // fill pruned boxes
+  pruned_boxes.reserve(indices.size());
+  pruned_weights.resize(indices.size());
+  for (int i = 0; i < (int)indices.size(); ++i){
+    pruned_boxes.push_back(boxes[indices[i]]);
+    pruned_weights(i) = weights(indices[i]);
+  }
+}
+
+void bob::ip::facedetect::bestOverlap(const BoxArray& boxes, const blitz::Array<double, 1>& weights, double threshold, std::vector<int32_t>& overlapping_indices){
+  overlapping_indices.clear();
+  if (!boxes.size()){
     bob::core::error << "Cannot find any box to compute overlaps" << std::endl;
     return;
   }
+  checkSizes(boxes, weights);
   // sort boxes
   std::vector<indexer> sorted(boxes.size());
   for (int i = boxes.size(); i--;){
@@ -85,53 +232,98 @@ void bob::ip::facedetect::bestOverlap(const std::vector<boost::shared_ptr<Boundi
   }
   std::sort(sorted.begin(), sorted.end(), gt);
 
-  std::list<indexer> overlapping;
-  std::list<indexer>::const_iterator oit;
-
-  // compute all overlapping detections
-  // **this is O(n^2)!**
-  std::list<std::list<indexer> > collected;
-  std::list<indexer> best;
-  best.push_back(sorted.front());
-  collected.push_back(best);
-
-  std::vector<indexer>::const_iterator sit = sorted.begin();
-  std::list<std::list<indexer> >::iterator cit;
-  for (++sit; sit != sorted.end(); ++sit){
-    for (cit = collected.begin(); cit != collected.end(); ++cit){
-      if (boxes[sit->second]->similarity(*boxes[cit->front().second]) > threshold){
-        cit->push_back(*sit);
-        break;
+  // collect the detections in clusters, where each detection is added to the first cluster whose head overlaps with it
+  std::vector<std::vector<indexer> > collected;
+  std::vector<double> totals;
+  std::vector<indexer>::const_iterator sit;
+  if (threshold < 0.){
+    // all boxes have a similarity above the threshold with the head of the first cluster
+    collected.push_back(sorted);
+    totals.push_back(0.);
+    for (sit = sorted.begin(); sit != sorted.end(); ++sit)
+      totals[0] += sit->first;
+  } else {
+    // only the heads of the clusters that are stored in the same grid cells are compared
+    BoxGrid heads(boxes);
+    for (sit = sorted.begin(); sit != sorted.end(); ++sit){
+      int c = heads.overlap(sit->second, threshold);
+      if (c < 0){
+        c = heads.add(sit->second);
+        collected.push_back(std::vector<indexer>());
+        totals.push_back(0.);
       }
-    }
-    if (cit == collected.end()){
-      std::list<indexer> novel;
-      novel.push_back(*sit);
-      collected.push_back(novel);
+      collected[c].push_back(*sit);
+      totals[c] += sit->first;
     }
   }
 
   // now, take the list with the highest TOTAL detection value
   double best_total = 0.;
-  for (cit = collected.begin(); cit != collected.end(); ++cit){
-    double current_total = 0.;
-    for (oit = cit->begin(); oit != cit->end(); ++oit){
-      current_total += oit->first;
-    }
-    if (current_total > best_total){
-      best_total = current_total;
-      overlapping = *cit;
+  int best = -1;
+  for (int c = 0; c < (int)collected.size(); ++c){
+    if (totals[c] > best_total){
+      best_total = totals[c];
+      best = c;
     }
   }
 
-  // fill overlapping boxes
-  overlapping_boxes.reserve(overlapping.size());
-  overlapping_weights.resize(overlapping.size());
-  int i = 0;
-  for (oit = overlapping.begin(); oit != overlapping.end(); ++oit, ++i){
-    overlapping_boxes.push_back(boxes[oit->second]);
-    overlapping_weights(i) = oit->first;
+  // fill overlapping indices
+  if (best >= 0){
+    overlapping_indices.reserve(collected[best].size());
+    for (sit = collected[best].begin(); sit != collected[best].end(); ++sit){
+      overlapping_indices.push_back(sit->second);
+    }
   }
 
   // done.
 }
+
+boost::shared_ptr<bob::ip::facedetect::BoundingBox> bob::ip::facedetect::bestDetection(const BoxArray& boxes, const blitz::Array<double, 1>& weights, double threshold, double& value){
+  checkSizes(boxes, weights);
+  // remove all negative predictions since they harm the calculation of the weights
+  std::vector<int32_t> positive;
+  for (int i = 0; i < boxes.size(); ++i){
+    if (weights(i) > 0.) positive.push_back(i);
+  }
+  if (positive.empty())
+    throw std::runtime_error("No detections with a prediction value > 0 have been found");
+  boost::shared_ptr<BoxArray> selected = boxes.select(positive);
+  blitz::Array<double, 1> selected_weights(positive.size());
+  for (int i = selected_weights.extent(0); i--;)
+    selected_weights(i) = weights(positive[i]);
+
+  // keep only the bounding boxes with the highest overlap
+  std::vector<int32_t> indices;
+  bestOverlap(*selected, selected_weights, threshold, indices);
+
+  // compute the weighted mean of the detected bounding boxes
+  double sum = 0., top = 0., left = 0., bottom = 0., right = 0.;
+  value = 0.;
+  for (std::vector<int32_t>::const_iterator it = indices.begin(); it != indices.end(); ++it){
+    double w = selected_weights(*it);
+    sum += w;
+    top += w * selected->top(*it);
+    left += w * selected->left(*it);
+    bottom += w * selected->bottom(*it);
+    right += w * selected->right(*it);
+    value += w * w;
+  }
+  top /= sum; left /= sum; bottom /= sum; right /= sum;
+  // the prediction is the weighted mean of the predictions
+  value /= sum;
+
+  return boost::shared_ptr<BoundingBox>(new BoundingBox(top, left, bottom - top, right - left));
+}
+
+void bob::ip::facedetect::bestOverlap(const std::vector<boost::shared_ptr<BoundingBox>>& boxes, const blitz::Array<double, 1>& weights, double threshold, std::vector<boost::shared_ptr<BoundingBox>>& overlapping_boxes, blitz::Array<double, 1>& overlapping_weights){
+  std::vector<int32_t> indices;
+  bestOverlap(BoxArray(boxes), weights, threshold, indices);
+
+  // fill overlapping boxes
+  overlapping_boxes.reserve(indices.size());
+  overlapping_weights.resize(indices.size());
+  for (int i = 0; i < (int)indices.size(); ++i){
+    overlapping_boxes.push_back(boxes[indices[i]]);
+    overlapping_weights(i) = weights(indices[i]);
+  }
+}
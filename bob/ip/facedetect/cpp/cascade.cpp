@@ -0,0 +1,173 @@
+#include "features.h"
+#include <boost/format.hpp>
+
+bob::ip::facedetect::CompiledCascade::CompiledCascade(const blitz::Array<int32_t,1>& stageEnds, const blitz::Array<int32_t,1>& featureIndices, const blitz::Array<double,2>& lookUpTables, const blitz::Array<double,1>& thresholds)
+: m_stageEnds(stageEnds.copy()),
+  m_featureIndices(featureIndices.copy()),
+  m_lookUpTables(lookUpTables.copy()),
+  m_thresholds(thresholds.copy())
+{
+  if (m_thresholds.extent(0) != m_stageEnds.extent(0))
+    throw std::runtime_error((boost::format("The number of thresholds %d and stages %d differ") % m_thresholds.extent(0) % m_stageEnds.extent(0)).str());
+  if (m_featureIndices.extent(0) != m_lookUpTables.extent(0))
+    throw std::runtime_error((boost::format("The number of feature indices %d and look-up-tables %d differ") % m_featureIndices.extent(0) % m_lookUpTables.extent(0)).str());
+  for (int s = 0, begin = 0; s < m_stageEnds.extent(0); begin = m_stageEnds(s++)){
+    if (m_stageEnds(s) < begin || m_stageEnds(s) > m_featureIndices.extent(0))
+      throw std::runtime_error((boost::format("The end %d of stage %d is invalid") % m_stageEnds(s) % s).str());
+  }
+
+  // compute the upper bounds of the predictions of the remaining stages
+  // since a patch might be rejected after any stage, the bound is the maximum over the sums of the maximum stage contributions
+  m_upperBounds.resize(m_thresholds.extent(0));
+  for (int s = m_thresholds.extent(0); s-- > 0;){
+    const int begin = s ? m_stageEnds(s-1) : 0;
+    double stageMaximum = 0.;
+    for (int i = begin; i < m_stageEnds(s); ++i)
+      stageMaximum += blitz::max(m_lookUpTables(i, blitz::Range::all()));
+    m_upperBounds(s) = stageMaximum + (s + 1 < m_thresholds.extent(0) ? std::max(0., m_upperBounds(s+1)) : 0.);
+  }
+}
+
+void bob::ip::facedetect::CompiledCascade::check(const FeatureExtractor& extractor) const{
+  if (m_featureIndices.extent(0) && blitz::max(m_featureIndices) >= extractor.numberOfFeatures())
+    throw std::runtime_error((boost::format("The feature index %d is too large for the feature extractor with %d features") % blitz::max(m_featureIndices) % extractor.numberOfFeatures()).str());
+  if (m_featureIndices.extent(0) && m_lookUpTables.extent(1) < extractor.getMaxLabel())
+    throw std::runtime_error((boost::format("The look-up-tables with %d entries are too small for the feature extractor with %d labels") % m_lookUpTables.extent(1) % extractor.getMaxLabel()).str());
+}
+
+// the number of patches of the given size that are sampled in an image of the given shape with the given distance
+static std::size_t numberOfPatches(const blitz::TinyVector<int,2>& shape, const blitz::TinyVector<int,2>& patchSize, int distance){
+  return (std::size_t)std::max((shape[0] - patchSize[0] + distance - 1) / distance, 0) * std::max((shape[1] - patchSize[1] + distance - 1) / distance, 0);
+}
+
+void bob::ip::facedetect::CompiledCascade::scan(const FeatureExtractor& extractor, const Workspace& workspace, const blitz::TinyVector<int,2>& patchSize, int distance, double threshold, std::vector<double>& predictions, std::vector<int32_t>& tops, std::vector<int32_t>& lefts) const{
+  if (distance <= 0)
+    throw std::runtime_error((boost::format("The distance %d must be positive") % distance).str());
+  check(extractor);
+  extractor.checkWorkspace(workspace);
+
+  // reserve the memory for the results, so that it is not (re-)allocated while scanning
+  const std::size_t patches = numberOfPatches(workspace.getShape(), patchSize, distance);
+  workspace.reserve(predictions, patches);
+  workspace.reserve(tops, patches);
+  workspace.reserve(lefts, patches);
+
+  const blitz::TinyVector<int,2> shape = workspace.getShape();
+  // iterate over the same patches as the Python Sampler does
+  for (int y = 0; y < shape[0] - patchSize[0]; y += distance){
+    for (int x = 0; x < shape[1] - patchSize[1]; x += distance){
+      double result = predict(extractor, workspace, y, x);
+      if (result > threshold){
+        predictions.push_back(result);
+        tops.push_back(y);
+        lefts.push_back(x);
+      }
+    }
+  }
+}
+
+void bob::ip::facedetect::CompiledCascade::scanBreadthFirst(const FeatureExtractor& extractor, const Workspace& workspace, const blitz::TinyVector<int,2>& patchSize, int distance, double threshold, std::vector<double>& predictions, std::vector<int32_t>& tops, std::vector<int32_t>& lefts) const{
+  if (distance <= 0)
+    throw std::runtime_error((boost::format("The distance %d must be positive") % distance).str());
+  check(extractor);
+  extractor.checkWorkspace(workspace);
+
+  // reserve the memory for the results, so that it is not (re-)allocated while scanning
+  const std::size_t patches = numberOfPatches(workspace.getShape(), patchSize, distance);
+  workspace.reserve(predictions, patches);
+  workspace.reserve(tops, patches);
+  workspace.reserve(lefts, patches);
+
+  // collect all patches in the same order as the Python Sampler does, using the scratch memory of the workspace
+  const blitz::TinyVector<int,2> shape = workspace.getShape();
+  std::vector<int32_t>& ys = workspace.m_tops, & xs = workspace.m_lefts, & survivors = workspace.m_survivors;
+  std::vector<double>& results = workspace.m_results;
+  workspace.reserve(ys, patches);
+  workspace.reserve(xs, patches);
+  workspace.reserve(results, patches);
+  workspace.reserve(survivors, patches);
+  for (int y = 0; y < shape[0] - patchSize[0]; y += distance){
+    for (int x = 0; x < shape[1] - patchSize[1]; x += distance){
+      // the indices of the patches that survived all stages so far
+      survivors.push_back(ys.size());
+      ys.push_back(y);
+      xs.push_back(x);
+    }
+  }
+  results.resize(ys.size(), 0.);
+
+  for (int s = 0, begin = 0; s < m_thresholds.extent(0) && !survivors.empty(); begin = m_stageEnds(s++)){
+    const int end = m_stageEnds(s);
+    const double stageThreshold = m_thresholds(s);
+    std::vector<int32_t>::iterator next = survivors.begin();
+    for (std::vector<int32_t>::const_iterator it = survivors.begin(); it != survivors.end(); ++it){
+      const int32_t p = *it;
+      // sum up the weak machines of this stage in the same (reverse) order as the BoostedMachine does
+      double sum = 0.;
+      for (int i = end; i-- > begin;)
+        sum += m_lookUpTables(i, extractor.extractSingle(m_featureIndices(i), ys[p], xs[p], workspace));
+      results[p] += sum;
+      // compact the surviving patches in-place (using the same comparison as the early rejection)
+      if (!(results[p] < stageThreshold))
+        *next++ = p;
+    }
+    survivors.erase(next, survivors.end());
+  }
+
+  // return the results in the order of the patches
+  for (std::size_t p = 0; p < results.size(); ++p){
+    if (results[p] > threshold){
+      predictions.push_back(results[p]);
+      tops.push_back(ys[p]);
+      lefts.push_back(xs[p]);
+    }
+  }
+}
+
+void bob::ip::facedetect::CompiledCascade::scanBest(const FeatureExtractor& extractor, const Workspace& workspace, const blitz::TinyVector<int,2>& patchSize, int distance, double margin, double& best, std::vector<double>& predictions, std::vector<int32_t>& tops, std::vector<int32_t>& lefts) const{
+  if (distance <= 0)
+    throw std::runtime_error((boost::format("The distance %d must be positive") % distance).str());
+  if (!(margin >= 0.))
+    throw std::runtime_error((boost::format("The margin %f must not be negative") % margin).str());
+  check(extractor);
+  extractor.checkWorkspace(workspace);
+
+  // reserve the memory for the results, so that it is not (re-)allocated while scanning
+  const std::size_t patches = numberOfPatches(workspace.getShape(), patchSize, distance);
+  workspace.reserve(predictions, patches);
+  workspace.reserve(tops, patches);
+  workspace.reserve(lefts, patches);
+
+  // a small tolerance for rounding errors in the upper bounds
+  const double tolerance = 1e-8;
+  const blitz::TinyVector<int,2> shape = workspace.getShape();
+  // iterate over the same patches as the Python Sampler does
+  for (int y = 0; y < shape[0] - patchSize[0]; y += distance){
+    for (int x = 0; x < shape[1] - patchSize[1]; x += distance){
+      // only positive predictions close to the best prediction are of interest
+      const double cut = std::max(0., best - margin);
+      double result = 0.;
+      bool stopped = false;
+      for (int s = 0, begin = 0; s < m_thresholds.extent(0); begin = m_stageEnds(s++)){
+        if (result + m_upperBounds(s) + tolerance < cut){
+          // the prediction cannot exceed the cut anymore
+          stopped = true;
+          break;
+        }
+        // sum up the weak machines of this stage in the same (reverse) order as the BoostedMachine does
+        double sum = 0.;
+        for (int i = m_stageEnds(s); i-- > begin;)
+          sum += m_lookUpTables(i, extractor.extractSingle(m_featureIndices(i), y, x, workspace));
+        result += sum;
+        // early rejection
+        if (result < m_thresholds(s)) break;
+      }
+      if (!stopped && result > cut){
+        predictions.push_back(result);
+        tops.push_back(y);
+        lefts.push_back(x);
+        best = std::max(best, result);
+      }
+    }
+  }
+}
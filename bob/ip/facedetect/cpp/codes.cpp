@@ -0,0 +1,135 @@
+#include "features.h"
+#include <algorithm>
+#include <cmath>
+#include <vector>
+
+// The LBP codes of a whole image are computed row by row.
+// Each of the functions below runs over contiguous rows of pixels, so that the compiler can vectorize the loops.
+// Where supported, the functions are additionally compiled for AVX2, and the version that fits the CPU is selected at runtime.
+// Note that FMA is not enabled on purpose, so that all comparisons are evaluated exactly as in bob::ip::base::LBP.
+#if defined(__GNUC__) && !defined(__clang__) && defined(__x86_64__) && defined(__linux__)
+#define ROW_FUNCTION __attribute__((target_clones("avx2","default"))) static
+#else
+#define ROW_FUNCTION static
+#endif
+
+// the comparison of bob::ip::base::LBP: a > b || bob::core::isClose(a, b)
+static inline uint16_t greaterOrClose(double a, double b){
+  return (a > b) | (std::fabs(a - b) <= 1e-8 + 1e-5 * std::min(std::fabs(a), std::fabs(b)));
+}
+
+// sets the given bit of the codes, when a >= b
+ROW_FUNCTION void compareRow(const double* a, const double* b, int bit, int width, uint16_t* codes){
+  for (int x = 0; x < width; ++x)
+    codes[x] |= greaterOrClose(a[x], b[x]) << bit;
+}
+
+// computes the average of the center and the neighboring pixels, summing up in the same order as bob::ip::base::LBP
+ROW_FUNCTION void averageRow(const double* const* pixels, int P, const double* center, int width, double* average){
+  std::copy(center, center + width, average);
+  for (int p = 0; p < P; ++p)
+    for (int x = 0; x < width; ++x)
+      average[x] += pixels[p][x];
+  for (int x = 0; x < width; ++x)
+    average[x] /= (P + 1);
+}
+
+// appends the two bits of the direction coded LBP for the opposing pixels a and b
+ROW_FUNCTION void directionRow(const double* a, const double* b, const double* center, int width, uint16_t* codes){
+  for (int x = 0; x < width; ++x){
+    const double da = a[x] - center[x], db = b[x] - center[x];
+    codes[x] = (codes[x] << 2) + ((da * db) >= 0.) + 2 * greaterOrClose(std::fabs(da), std::fabs(db));
+  }
+}
+
+// returns the given row as double values; double rows are used directly, other types are converted into the buffer
+static inline const double* asDouble(const double* row, int, double*){
+  return row;
+}
+
+static inline const double* asDouble(const uint8_t* row, int width, double* buffer){
+  for (int x = 0; x < width; ++x)
+    buffer[x] = row[x];
+  return buffer;
+}
+
+// checks that the array is stored in C-order without gaps
+template <typename T>
+static bool isContiguous(const blitz::Array<T,2>& array){
+  return array.base(0) == 0 && array.base(1) == 0 && array.stride(1) == 1 && array.stride(0) == array.extent(1);
+}
+
+template <typename T>
+static bool computeCodes(bob::ip::base::LBP& lbp, const blitz::Array<T,2>& image, blitz::Array<uint16_t,2>& codes){
+  const int P = lbp.getNNeighbours();
+  if (lbp.isMultiBlockLBP() || lbp.getCircular() || lbp.getBorderHandling() != bob::ip::base::LBP_BORDER_SHRINK || (P != 4 && P != 8))
+    return false;
+  if (!isContiguous(image) || !isContiguous(codes))
+    return false;
+  bob::core::array::assertSameShape(codes, lbp.getLBPShape(image.shape(), false));
+
+  // the positions of the neighbors relative to the center pixel, in the order of the LBP bits (as defined in bob::ip::base::LBP)
+  const blitz::TinyVector<int,2> offset = lbp.getOffset();
+  const blitz::TinyVector<double,2> radii = lbp.getRadii();
+  const int r_y = (int)round(radii[0]), r_x = (int)round(radii[1]);
+  const int d_y4[] = {-r_y, 0, r_y, 0}, d_x4[] = {0, r_x, 0, -r_x};
+  const int d_y8[] = {-r_y, -r_y, -r_y, 0, r_y, r_y, r_y, 0}, d_x8[] = {-r_x, 0, r_x, r_x, r_x, 0, -r_x, -r_x};
+  const int* d_y = P == 4 ? d_y4 : d_y8;
+  const int* d_x = P == 4 ? d_x4 : d_x8;
+  const blitz::Array<uint16_t,1>& lut = lbp.getLookUpTable();
+  const int height = codes.extent(0), width = codes.extent(1), stride = image.extent(1);
+  std::vector<int> shifts(P);
+  for (int p = 0; p < P; ++p)
+    shifts[p] = d_y[p] * stride + d_x[p];
+
+  const bool average = lbp.getToAverage();
+  const bool averageBit = lbp.getAddAverageBit() && !lbp.getRotationInvariant() && !lbp.getUniform();
+  std::vector<double> buffer((P+1) * width), reference(width);
+  std::vector<uint16_t> row(width);
+  const double* pixels[8];
+
+  for (int y = 0; y < height; ++y){
+    const T* c = image.data() + (y + offset[0]) * stride + offset[1];
+    const double* center = asDouble(c, width, &buffer[P * width]);
+    for (int p = 0; p < P; ++p)
+      pixels[p] = asDouble(c + shifts[p], width, &buffer[p * width]);
+    const double* cmp = center;
+    if (average){
+      averageRow(pixels, P, center, width, &reference[0]);
+      cmp = &reference[0];
+    }
+
+    std::fill(row.begin(), row.end(), 0);
+    switch (lbp.get_eLBP()){
+      case bob::ip::base::ELBP_REGULAR:
+        // with the average bit, all other bits are shifted by one
+        for (int p = 0; p < P; ++p)
+          compareRow(pixels[p], cmp, P - p - 1 + averageBit, width, &row[0]);
+        if (averageBit)
+          compareRow(center, cmp, 0, width, &row[0]);
+        break;
+      case bob::ip::base::ELBP_TRANSITIONAL:
+        for (int p = 0; p < P; ++p)
+          compareRow(pixels[p], pixels[(p+1) % P], P - p - 1, width, &row[0]);
+        break;
+      case bob::ip::base::ELBP_DIRECTION_CODED:
+        for (int p = 0; p < P/2; ++p)
+          directionRow(pixels[p], pixels[p + P/2], cmp, width, &row[0]);
+        break;
+    }
+
+    // convert the codes according to the LBP type (uniform, rotation invariant, ...)
+    uint16_t* target = codes.data() + y * width;
+    for (int x = 0; x < width; ++x)
+      target[x] = lut(row[x]);
+  }
+  return true;
+}
+
+bool bob::ip::facedetect::denseCodes(bob::ip::base::LBP& lbp, const blitz::Array<double,2>& image, blitz::Array<uint16_t,2>& codes){
+  return computeCodes(lbp, image, codes);
+}
+
+bool bob::ip::facedetect::denseCodes(bob::ip::base::LBP& lbp, const blitz::Array<uint8_t,2>& image, blitz::Array<uint16_t,2>& codes){
+  return computeCodes(lbp, image, codes);
+}
@@ -1,5 +1,6 @@
 #include "features.h"
 #include <boost/format.hpp>
+#include <limits>
 
 bob::ip::facedetect::FeatureExtractor::FeatureExtractor(const blitz::TinyVector<int,2>& patchSize)
 : m_patchSize(patchSize),
@@ -7,7 +8,10 @@ bob::ip::facedetect::FeatureExtractor::FeatureExtractor(const blitz::TinyVector<
   m_extractors(),
   m_featureStarts(1),
   m_isMultiBlock(false),
-  m_hasSingleOffsets(false)
+  m_hasSingleOffsets(false),
+  m_useCodeMaps(false),
+  m_scaleBlocks(false),
+  m_compact(false)
 {
   // first feature extractor always starts at zero
   m_featureStarts(0) = 0;
@@ -18,7 +22,10 @@ bob::ip::facedetect::FeatureExtractor::FeatureExtractor(const blitz::TinyVector<
   m_lookUpTable(0,3),
   m_extractors(),
   m_isMultiBlock(templAte.isMultiBlockLBP()),
-  m_hasSingleOffsets(false)
+  m_hasSingleOffsets(false),
+  m_useCodeMaps(false),
+  m_scaleBlocks(false),
+  m_compact(false)
 {
   // initialize the extractors
   if (!m_isMultiBlock){
@@ -73,7 +80,10 @@ bob::ip::facedetect::FeatureExtractor::FeatureExtractor(const blitz::TinyVector<
 : m_patchSize(patchSize),
   m_lookUpTable(0,3),
   m_extractors(extractors),
-  m_hasSingleOffsets(false)
+  m_hasSingleOffsets(false),
+  m_useCodeMaps(false),
+  m_scaleBlocks(false),
+  m_compact(false)
 {
   m_isMultiBlock = extractors[0]->isMultiBlockLBP();
   // check if all other lbp extractors have the same multi-block characteristics
@@ -89,13 +99,21 @@ bob::ip::facedetect::FeatureExtractor::FeatureExtractor(const blitz::TinyVector<
 bob::ip::facedetect::FeatureExtractor::FeatureExtractor(const FeatureExtractor& other)
 : m_patchSize(other.m_patchSize),
   m_lookUpTable(other.m_lookUpTable),
-  m_extractors(other.m_extractors),
+  m_extractors(),
   m_featureStarts(other.m_featureStarts),
   m_modelIndices(other.m_modelIndices),
   m_isMultiBlock(other.m_isMultiBlock),
-  m_hasSingleOffsets(other.m_hasSingleOffsets)
+  m_hasSingleOffsets(other.m_hasSingleOffsets),
+  m_useCodeMaps(other.m_useCodeMaps),
+  m_scaleBlocks(other.m_scaleBlocks),
+  m_compact(other.m_compact)
 {
   // we copy everything, except for the internally allocated memory
+  // the LBP extractors are copied as well, since they have internal memory, too
+  for (auto it = other.m_extractors.begin(); it != other.m_extractors.end(); ++it){
+    m_extractors.push_back(boost::shared_ptr<bob::ip::base::LBP>(new bob::ip::base::LBP(**it)));
+  }
+  m_workspace.m_extractors = m_extractors;
   m_featureImages.clear();
   if (! m_hasSingleOffsets){
     for (int e = 0; e < (int)m_extractors.size(); ++e){
@@ -106,7 +124,11 @@ bob::ip::facedetect::FeatureExtractor::FeatureExtractor(const FeatureExtractor&
 }
 
 
-bob::ip::facedetect::FeatureExtractor::FeatureExtractor(bob::io::base::HDF5File& file){
+bob::ip::facedetect::FeatureExtractor::FeatureExtractor(bob::io::base::HDF5File& file)
+: m_useCodeMaps(false),
+  m_scaleBlocks(false),
+  m_compact(false)
+{
   // read information from file
   load(file);
 }
@@ -143,9 +165,11 @@ void bob::ip::facedetect::FeatureExtractor::append(const boost::shared_ptr<bob::
     throw std::runtime_error("Cannot append given extractor since multi-block types differ.");
   m_isMultiBlock = lbp->isMultiBlockLBP();
   m_hasSingleOffsets = true;
+  m_workspace.m_hasCodeMaps = false;
   // copy LBP classes
   int lbp_index = m_extractors.size();
   m_extractors.push_back(lbp);
+  m_workspace.m_extractors = m_extractors;
   int oldFeatures = m_featureStarts(m_featureStarts.extent(0)-1);
   int newFeatures = oldFeatures + offsets.size();
   m_featureStarts.resizeAndPreserve(m_featureStarts.extent(0)+1);
@@ -167,6 +191,9 @@ void bob::ip::facedetect::FeatureExtractor::append(const boost::shared_ptr<bob::
 
 
 void bob::ip::facedetect::FeatureExtractor::init(){
+  // code maps need to be re-computed
+  m_workspace.m_hasCodeMaps = false;
+  m_workspace.m_extractors = m_extractors;
   // initialize the indices for the full feature vector extraction
   m_featureStarts.resize(m_extractors.size()+1);
   m_featureStarts(0) = 0;
@@ -194,13 +221,230 @@ void bob::ip::facedetect::FeatureExtractor::init(){
   }
 }
 
+void bob::ip::facedetect::FeatureExtractor::initWorkspace(Workspace& workspace) const{
+  if (&workspace == &m_workspace){
+    // the internal workspace uses our LBP extractors directly
+    workspace.m_extractors = m_extractors;
+    return;
+  }
+  // check if the workspace has been set up for our LBP extractors
+  bool same = workspace.m_sources.size() == m_extractors.size();
+  for (std::size_t e = 0; same && e < m_extractors.size(); ++e)
+    same = workspace.m_sources[e] == m_extractors[e];
+  if (!same){
+    // copy our LBP extractors, since they cannot be used in several threads at the same time
+    workspace.m_sources = m_extractors;
+    workspace.m_extractors.clear();
+    for (auto it = m_extractors.begin(); it != m_extractors.end(); ++it){
+      workspace.m_extractors.push_back(boost::shared_ptr<bob::ip::base::LBP>(new bob::ip::base::LBP(**it)));
+    }
+    workspace.m_hasCodeMaps = false;
+    workspace.m_codeMaps.clear();
+    workspace.m_codeMapBuffers.clear();
+  }
+}
+
+void bob::ip::facedetect::FeatureExtractor::checkWorkspace(const Workspace& workspace) const{
+  if (&workspace != &m_workspace && workspace.m_sources != m_extractors)
+    throw std::runtime_error("The given workspace has not been prepared with this feature extractor");
+}
+
+// computes the integral square image of the given image with an additional row and column of zeros
+static void integralSquare(const blitz::Array<uint8_t,2>& image, blitz::Array<uint64_t,2>& square){
+  square(0, blitz::Range::all()) = 0;
+  for (int y = 0; y < image.extent(0); ++y){
+    uint64_t row = 0;
+    square(y+1,0) = 0;
+    for (int x = 0; x < image.extent(1); ++x){
+      row += (uint64_t)image(y,x) * image(y,x);
+      square(y+1,x+1) = square(y,x+1) + row;
+    }
+  }
+}
+
+void bob::ip::facedetect::FeatureExtractor::prepare(const blitz::Array<uint8_t,2>& image, double scale, bool computeIntegralSquareImage, Workspace& workspace) const{
+  const blitz::TinyVector<int,2> shape = image.shape();
+  // only unscaled images are prepared in compact form, since scaled uint8 images would need to be rounded, which changes the LBP codes; the uint32 integral image must not overflow
+  // when the LBP blocks are scaled, the image is kept in full resolution, so it can be prepared in compact form in any scale
+  const bool scaledBlocks = useScaledBlocks(scale, computeIntegralSquareImage);
+  if (!m_compact || (scale != 1. && !scaledBlocks) || 255. * shape[0] * shape[1] > std::numeric_limits<uint32_t>::max()){
+    prepare<uint8_t>(image, scale, computeIntegralSquareImage, workspace);
+    return;
+  }
+  initWorkspace(workspace);
+
+  // copy image
+  workspace.view(workspace.m_compactImageBuffer, workspace.m_compactImage, shape);
+  workspace.m_compactImage = image;
+  if (scaledBlocks){
+    // compute the integer integral image in full resolution, and scale the LBP blocks instead
+    workspace.view(workspace.m_compactIntegralBuffer, workspace.m_compactIntegralImage, blitz::TinyVector<int,2>(shape[0]+1, shape[1]+1));
+    bob::ip::base::integral<uint8_t,uint32_t>(workspace.m_compactImage, workspace.m_compactIntegralImage, true);
+    prepareBlocks(bob::ip::base::getScaledShape(shape, scale), 0, 0, true, workspace);
+    return;
+  }
+  if (m_isMultiBlock or computeIntegralSquareImage){
+    // compute integral images of scaled image
+    workspace.view(workspace.m_compactIntegralBuffer, workspace.m_compactIntegralImage, blitz::TinyVector<int,2>(shape[0]+1, shape[1]+1));
+    bob::ip::base::integral<uint8_t,uint32_t>(workspace.m_compactImage, workspace.m_compactIntegralImage, true);
+    if (computeIntegralSquareImage){
+      workspace.view(workspace.m_compactIntegralSquareBuffer, workspace.m_compactIntegralSquareImage, workspace.m_compactIntegralImage.shape());
+      integralSquare(workspace.m_compactImage, workspace.m_compactIntegralSquareImage);
+    }
+  }
+  workspace.m_shape = shape;
+  workspace.m_scaledBlocks = false;
+  workspace.m_compact = true;
+  if (m_useCodeMaps){
+    // compute the LBP codes for the whole image
+    computeCodeMaps(workspace);
+  } else {
+    workspace.m_hasCodeMaps = false;
+  }
+}
+
+void bob::ip::facedetect::FeatureExtractor::prepare(const ImagePyramid& pyramid, double scale, bool computeIntegralSquareImage, Workspace& workspace) const{
+  initWorkspace(workspace);
+
+  const blitz::TinyVector<int,2> shape = pyramid.scaledShape(scale);
+  if (useScaledBlocks(scale, computeIntegralSquareImage)){
+    // use the nearest octave, and scale the LBP blocks instead
+    const int octave = pyramid.octaveIndex(shape);
+    if (workspace.m_integralSource != pyramid.identifier() || workspace.m_integralOctave != octave){
+      workspace.view(workspace.m_imageBuffer, workspace.m_image, pyramid.getOctave(octave).shape());
+      workspace.m_image = pyramid.getOctave(octave);
+    }
+    prepareBlocks(shape, pyramid.identifier(), octave, false, workspace);
+    return;
+  }
+
+  // scale image from the nearest octave
+  workspace.view(workspace.m_imageBuffer, workspace.m_image, shape);
+  pyramid.scale(workspace.m_image);
+  prepareScaled(computeIntegralSquareImage, workspace);
+}
+
+void bob::ip::facedetect::FeatureExtractor::prepareBlocks(const blitz::TinyVector<int,2>& shape, uint64_t source, int octave, bool compact, Workspace& workspace) const{
+  if (!compact && (!source || workspace.m_integralSource != source || workspace.m_integralOctave != octave)){
+    // compute integral image of the prepared image
+    workspace.view(workspace.m_integralBuffer, workspace.m_integralImage, blitz::TinyVector<int,2>(workspace.m_image.extent(0)+1, workspace.m_image.extent(1)+1));
+    bob::ip::base::integral<double>(workspace.m_image, workspace.m_integralImage, true);
+    workspace.m_integralSource = source;
+    workspace.m_integralOctave = octave;
+  }
+  // the image, which the blocks are scaled to, and its integral image
+  const blitz::TinyVector<int,2> imageShape = compact ? workspace.m_compactImage.shape() : workspace.m_image.shape();
+  const blitz::TinyVector<int,2> integralShape = compact ? workspace.m_compactIntegralImage.shape() : workspace.m_integralImage.shape();
+  workspace.m_shape = shape;
+  workspace.m_scaledBlocks = true;
+  workspace.m_compact = compact;
+  workspace.m_hasCodeMaps = false;
+  workspace.m_blockScale = (double)imageShape[0] / std::max(shape[0], 1), (double)imageShape[1] / std::max(shape[1], 1);
+
+  if (workspace.m_scaledSources != m_extractors){
+    // copy our LBP extractors, whose block sizes will be scaled
+    workspace.m_scaledSources = m_extractors;
+    workspace.m_scaledExtractors.clear();
+    workspace.m_blockOffsets.clear();
+    for (auto it = m_extractors.begin(); it != m_extractors.end(); ++it){
+      workspace.m_scaledExtractors.push_back(boost::shared_ptr<bob::ip::base::LBP>(new bob::ip::base::LBP(**it)));
+      workspace.m_blockOffsets.push_back((*it)->getOffset());
+    }
+    workspace.m_scaledOffsets.resize(m_extractors.size());
+    workspace.m_scaledLimits.resize(m_extractors.size());
+  }
+
+  // scale the block sizes and overlaps of the extractors
+  for (int e = 0; e < (int)m_extractors.size(); ++e){
+    const blitz::TinyVector<int,2> size = m_extractors[e]->getBlockSize(), overlap = m_extractors[e]->getBlockOverlap();
+    blitz::TinyVector<int,2> scaledSize, scaledOverlap;
+    for (int d = 0; d < 2; ++d){
+      scaledSize[d] = std::max((int)(size[d] * workspace.m_blockScale[d] + 0.5), 1);
+      scaledOverlap[d] = std::min((int)(overlap[d] * workspace.m_blockScale[d] + 0.5), scaledSize[d] - 1);
+    }
+    bob::ip::base::LBP& lbp = *workspace.m_scaledExtractors[e];
+    if (lbp.getBlockSize()[0] != scaledSize[0] || lbp.getBlockSize()[1] != scaledSize[1] || lbp.getBlockOverlap()[0] != scaledOverlap[0] || lbp.getBlockOverlap()[1] != scaledOverlap[1])
+      lbp.setBlockSizeAndOverlap(scaledSize, scaledOverlap);
+    workspace.m_scaledOffsets[e] = lbp.getOffset();
+    // the last top-left position of the scaled feature region that fits into the integral image
+    const blitz::TinyVector<int,2> positions = lbp.getLBPShape(integralShape, true);
+    workspace.m_scaledLimits[e] = positions[0] - 1, positions[1] - 1;
+  }
+}
+
+void bob::ip::facedetect::FeatureExtractor::prepareScaled(bool computeIntegralSquareImage, Workspace& workspace) const{
+  workspace.m_shape = workspace.m_image.shape();
+  workspace.m_scaledBlocks = false;
+  workspace.m_compact = false;
+  // the integral image (if any) is not the one of an octave anymore
+  workspace.m_integralSource = 0;
+  if (m_isMultiBlock or computeIntegralSquareImage){
+    // compute integral image of scaled image
+    workspace.view(workspace.m_integralBuffer, workspace.m_integralImage, blitz::TinyVector<int,2>(workspace.m_image.extent(0)+1, workspace.m_image.extent(1)+1));
+    if (computeIntegralSquareImage){
+      workspace.view(workspace.m_integralSquareBuffer, workspace.m_integralSquareImage, workspace.m_integralImage.shape());
+      bob::ip::base::integral<double>(workspace.m_image, workspace.m_integralImage, workspace.m_integralSquareImage, true);
+    } else {
+      bob::ip::base::integral<double>(workspace.m_image, workspace.m_integralImage, true);
+    }
+  }
+  if (m_useCodeMaps){
+    // compute the LBP codes for the whole image
+    computeCodeMaps(workspace);
+  } else {
+    workspace.m_hasCodeMaps = false;
+  }
+}
+
+void bob::ip::facedetect::FeatureExtractor::computeCodeMaps(Workspace& workspace, bool all) const{
+  // get the extractors that are required by the model
+  std::vector<bool> used(m_extractors.size(), all || m_modelIndices.extent(0) == 0);
+  for (int i = 0; i < m_modelIndices.extent(0); ++i)
+    used[m_lookUpTable(m_modelIndices(i),0)] = true;
+
+  const blitz::Array<double,2>& source = m_isMultiBlock ? workspace.m_integralImage : workspace.m_image;
+  const blitz::TinyVector<int,2> sourceShape = !workspace.m_compact ? source.shape() : m_isMultiBlock ? workspace.m_compactIntegralImage.shape() : workspace.m_compactImage.shape();
+  workspace.m_codeMaps.resize(m_extractors.size());
+  workspace.m_codeMapBuffers.resize(m_extractors.size());
+  workspace.m_codeMapOffsets.resize(m_extractors.size());
+  for (int e = 0; e < (int)m_extractors.size(); ++e){
+    const auto& lbp = workspace.m_extractors[e];
+    blitz::TinyVector<int,2> shape = lbp->getLBPShape(sourceShape, m_isMultiBlock);
+    if (!used[e] || shape[0] <= 0 || shape[1] <= 0){
+      // no codes required (or possible)
+      workspace.m_codeMaps[e].resize(0,0);
+      continue;
+    }
+    workspace.view(workspace.m_codeMapBuffers[e], workspace.m_codeMaps[e], shape);
+    // compute the LBP codes of whole rows at once, where the LBP type is supported
+    const bool dense = !m_isMultiBlock && (workspace.m_compact ? denseCodes(*lbp, workspace.m_compactImage, workspace.m_codeMaps[e]) : denseCodes(*lbp, source, workspace.m_codeMaps[e]));
+    if (!dense){
+      // extract the LBP codes for all pixels in the same way as for a single pixel
+      if (!workspace.m_compact)
+        lbp->extract(source, workspace.m_codeMaps[e], m_isMultiBlock);
+      else if (m_isMultiBlock)
+        lbp->extract(workspace.m_compactIntegralImage, workspace.m_codeMaps[e], true);
+      else
+        lbp->extract(workspace.m_compactImage, workspace.m_codeMaps[e], false);
+    }
+    workspace.m_codeMapOffsets[e] = lbp->getOffset();
+  }
+  workspace.m_hasCodeMaps = true;
+  workspace.m_allCodeMaps = all || m_modelIndices.extent(0) == 0;
+}
+
+// the sum of the pixels in the given region, computed from the given integral image
+template <typename T>
+static double boxSum(const blitz::Array<T,2>& integral, int t, int l, int b, int r){
+  return (double)integral(t, l) + (double)integral(b, r) - (double)integral(t, r) - (double)integral(b, l);
+}
+
 double bob::ip::facedetect::FeatureExtractor::mean(const BoundingBox& boundingBox) const{
+  if (m_workspace.m_scaledBlocks)
+    throw std::runtime_error("The mean and variance cannot be computed when the blocks of the LBP extractors are scaled instead of the image");
   int t = boundingBox.itop(), b = boundingBox.ibottom()-1, l = boundingBox.ileft(), r = boundingBox.iright()-1;
   // compute the mean using the integral image
-  double sum = m_integralImage(t, l)
-             + m_integralImage(b, r)
-             - m_integralImage(t, r)
-             - m_integralImage(b, l);
+  double sum = m_workspace.m_compact ? boxSum(m_workspace.m_compactIntegralImage, t, l, b, r) : boxSum(m_workspace.m_integralImage, t, l, b, r);
 
   double pixelCount = boundingBox.area();
 
@@ -209,17 +453,13 @@ double bob::ip::facedetect::FeatureExtractor::mean(const BoundingBox& boundingBo
 
 
 double bob::ip::facedetect::FeatureExtractor::variance(const BoundingBox& boundingBox) const{
+  if (m_workspace.m_scaledBlocks)
+    throw std::runtime_error("The mean and variance cannot be computed when the blocks of the LBP extractors are scaled instead of the image");
   int t = boundingBox.itop(), b = boundingBox.ibottom()-1, l = boundingBox.ileft(), r = boundingBox.iright()-1;
   // compute the variance using the integral image and the integral square image
-  double square = m_integralSquareImage(t, l)
-                + m_integralSquareImage(b, r)
-                - m_integralSquareImage(t, r)
-                - m_integralSquareImage(b, l);
+  double square = m_workspace.m_compact ? boxSum(m_workspace.m_compactIntegralSquareImage, t, l, b, r) : boxSum(m_workspace.m_integralSquareImage, t, l, b, r);
 
-  double sum = m_integralImage(t, l)
-             + m_integralImage(b, r)
-             - m_integralImage(t, r)
-             - m_integralImage(b, l);
+  double sum = m_workspace.m_compact ? boxSum(m_workspace.m_compactIntegralImage, t, l, b, r) : boxSum(m_workspace.m_integralImage, t, l, b, r);
 
   double pixelCount = boundingBox.area();
 
@@ -228,17 +468,13 @@ double bob::ip::facedetect::FeatureExtractor::variance(const BoundingBox& boundi
 
 
 blitz::TinyVector<double,2> bob::ip::facedetect::FeatureExtractor::meanAndVariance(const BoundingBox& boundingBox) const{
+  if (m_workspace.m_scaledBlocks)
+    throw std::runtime_error("The mean and variance cannot be computed when the blocks of the LBP extractors are scaled instead of the image");
   int t = boundingBox.itop(), b = boundingBox.ibottom()-1, l = boundingBox.ileft(), r = boundingBox.iright()-1;
   // compute the variance using the integral image and the integral square image
-  double square = m_integralSquareImage(t, l)
-                + m_integralSquareImage(b, r)
-                - m_integralSquareImage(t, r)
-                - m_integralSquareImage(b, l);
+  double square = m_workspace.m_compact ? boxSum(m_workspace.m_compactIntegralSquareImage, t, l, b, r) : boxSum(m_workspace.m_integralSquareImage, t, l, b, r);
 
-  double sum = m_integralImage(t, l)
-             + m_integralImage(b, r)
-             - m_integralImage(t, r)
-             - m_integralImage(b, l);
+  double sum = m_workspace.m_compact ? boxSum(m_workspace.m_compactIntegralImage, t, l, b, r) : boxSum(m_workspace.m_integralImage, t, l, b, r);
 
   double pixelCount = boundingBox.area();
 
@@ -248,13 +484,17 @@ blitz::TinyVector<double,2> bob::ip::facedetect::FeatureExtractor::meanAndVarian
 
 
 void bob::ip::facedetect::FeatureExtractor::extractAll(const BoundingBox& boundingBox, blitz::Array<uint16_t,2>& dataset, int datasetIndex) const{
-  if (m_hasSingleOffsets){
+  if (m_workspace.m_scaledBlocks || m_workspace.m_compact){
+    // extract all features one by one from the scaled LBP extractors or the compact images
+    for (int i = m_lookUpTable.extent(0); i--;)
+      dataset(datasetIndex,i) = extractSingle(i, boundingBox.itop(), boundingBox.ileft(), m_workspace);
+  } else if (m_hasSingleOffsets){
     if (m_isMultiBlock){
       for (int i = m_lookUpTable.extent(0); i--;){
 //        std::cout << i << "\t" << m_lookUpTable(i,1) << "\t" << m_lookUpTable(i,2) << "\t -- \t" << boundingBox.top() << "\t" << boundingBox.left() << std::endl;
         const auto& lbp = m_extractors[m_lookUpTable(i,0)];
         try {
-          dataset(datasetIndex,i) = lbp->extract(m_integralImage, boundingBox.itop() + m_lookUpTable(i,1), boundingBox.ileft() + m_lookUpTable(i,2), true);
+          dataset(datasetIndex,i) = lbp->extract(m_workspace.m_integralImage, boundingBox.itop() + m_lookUpTable(i,1), boundingBox.ileft() + m_lookUpTable(i,2), true);
         } catch (std::runtime_error& e){
           std::cerr << "Couldn't extract feature from bounding box " << boundingBox.itop() << "," << boundingBox.ileft() << "," << boundingBox.ibottom() << "," <<boundingBox.iright() << " with extractor " << lbp->getBlockSize()[0] << "," << lbp->getBlockSize()[1] << " at position [" << m_lookUpTable(i,1) << "," << m_lookUpTable(i,2) << "]" << std::endl;
           throw;
@@ -263,18 +503,18 @@ void bob::ip::facedetect::FeatureExtractor::extractAll(const BoundingBox& boundi
     } else {
       for (int i = m_lookUpTable.extent(0); i--;){
         const auto& lbp = m_extractors[m_lookUpTable(i,0)];
-        dataset(datasetIndex,i) = lbp->extract(m_image, boundingBox.itop() + m_lookUpTable(i,1), boundingBox.ileft() + m_lookUpTable(i,2));
+        dataset(datasetIndex,i) = lbp->extract(m_workspace.m_image, boundingBox.itop() + m_lookUpTable(i,1), boundingBox.ileft() + m_lookUpTable(i,2));
       }
     }
   } else {
     // extract full feature set
     if (m_isMultiBlock){
-      blitz::Array<double,2> subwindow = m_integralImage(blitz::Range(boundingBox.itop(), boundingBox.ibottom()), blitz::Range(boundingBox.ileft(), boundingBox.iright()));
+      blitz::Array<double,2> subwindow = m_workspace.m_integralImage(blitz::Range(boundingBox.itop(), boundingBox.ibottom()), blitz::Range(boundingBox.ileft(), boundingBox.iright()));
       for (int e = 0; e < (int)m_extractors.size(); ++e){
         m_extractors[e]->extract(subwindow, m_featureImages[e], true);
       }
     } else {
-      blitz::Array<double,2> subwindow = m_image(blitz::Range(boundingBox.itop(), boundingBox.ibottom()-1), blitz::Range(boundingBox.ileft(), boundingBox.iright()-1));
+      blitz::Array<double,2> subwindow = m_workspace.m_image(blitz::Range(boundingBox.itop(), boundingBox.ibottom()-1), blitz::Range(boundingBox.ileft(), boundingBox.iright()-1));
       for (int e = 0; e < (int)m_extractors.size(); ++e){
         m_extractors[e]->extract(subwindow, m_featureImages[e], false);
       }
@@ -290,34 +530,90 @@ void bob::ip::facedetect::FeatureExtractor::extractAll(const BoundingBox& boundi
   }
 }
 
-void bob::ip::facedetect::FeatureExtractor::extractSome(const BoundingBox& boundingBox, blitz::Array<uint16_t,1>& featureVector) const{
+void bob::ip::facedetect::FeatureExtractor::extractAllBatch(const BoxArray& boxes, blitz::Array<uint16_t,2>& dataset){
+  const int features = numberOfFeatures();
+  if (dataset.extent(0) < boxes.size() || dataset.extent(1) != features){
+    boost::format m("The dataset of shape (%d, %d) cannot store %d feature vectors of length %d");
+    m % dataset.extent(0) % dataset.extent(1) % boxes.size() % features;
+    throw std::runtime_error(m.str());
+  }
+  if (m_workspace.m_scaledBlocks){
+    // the scaled LBP extractors have no code maps
+    for (int b = 0; b < boxes.size(); ++b)
+      for (int i = features; i--;)
+        dataset(b,i) = extractSingle(i, (int)round(boxes.top(b)), (int)round(boxes.left(b)), m_workspace);
+    return;
+  }
+
+  // compute the LBP codes of all extractors only once for the prepared image
+  if (!m_workspace.m_hasCodeMaps || !m_workspace.m_allCodeMaps)
+    computeCodeMaps(m_workspace, true);
+
+  // the position of each feature in the code map of its extractor, relative to the top-left of the bounding box
+  const int extractors = m_extractors.size();
+  std::vector<int> positions(features);
+  std::vector<blitz::TinyVector<int,4> > ranges(extractors, blitz::TinyVector<int,4>(INT_MAX, INT_MIN, INT_MAX, INT_MIN));
+  for (int i = 0; i < features; ++i){
+    const int e = m_lookUpTable(i,0);
+    const blitz::Array<uint16_t,2>& codes = m_workspace.m_codeMaps[e];
+    const int y = m_lookUpTable(i,1) - m_workspace.m_codeMapOffsets[e][0], x = m_lookUpTable(i,2) - m_workspace.m_codeMapOffsets[e][1];
+    positions[i] = y * codes.stride(0) + x * codes.stride(1);
+    ranges[e] = std::min(ranges[e][0], y), std::max(ranges[e][1], y), std::min(ranges[e][2], x), std::max(ranges[e][3], x);
+  }
+
+  for (int b = 0; b < boxes.size(); ++b){
+    const int top = (int)round(boxes.top(b)), left = (int)round(boxes.left(b));
+    for (int e = 0; e < extractors; ++e){
+      const blitz::Array<uint16_t,2>& codes = m_workspace.m_codeMaps[e];
+      if (ranges[e][0] <= ranges[e][1] && (top + ranges[e][0] < 0 || top + ranges[e][1] >= codes.extent(0) || left + ranges[e][2] < 0 || left + ranges[e][3] >= codes.extent(1))){
+        boost::format m("The features of the bounding box %d at position (%d, %d) cannot be extracted from the prepared image");
+        m % b % top % left;
+        throw std::runtime_error(m.str());
+      }
+    }
+    // gather the codes of all features
+    for (int i = 0; i < features; ++i){
+      const blitz::Array<uint16_t,2>& codes = m_workspace.m_codeMaps[m_lookUpTable(i,0)];
+      dataset(b,i) = codes.data()[top * codes.stride(0) + left * codes.stride(1) + positions[i]];
+    }
+  }
+}
+
+void bob::ip::facedetect::FeatureExtractor::extractSome(const BoundingBox& boundingBox, blitz::Array<uint16_t,1>& featureVector, const Workspace& workspace) const{
   if (m_modelIndices.extent(0) == 0)
     throw std::runtime_error("Please set the model indices before calling this function!");
   // extract only required data
-  return extractIndexed(boundingBox, featureVector, m_modelIndices);
+  return extractIndexed(boundingBox, featureVector, m_modelIndices, workspace);
 }
 
-void bob::ip::facedetect::FeatureExtractor::extractIndexed(const BoundingBox& boundingBox, blitz::Array<uint16_t,1>& featureVector, const blitz::Array<int32_t,1>& indices) const{
+void bob::ip::facedetect::FeatureExtractor::extractIndexed(const BoundingBox& boundingBox, blitz::Array<uint16_t,1>& featureVector, const blitz::Array<int32_t,1>& indices, const Workspace& workspace) const{
   if (indices.extent(0) == 0)
     throw std::runtime_error("The given indices are empty!");
+  checkWorkspace(workspace);
   // extract only requested data
-  if (m_isMultiBlock){
+  if (workspace.m_scaledBlocks || workspace.m_compact){
+    for (int i = indices.extent(0); i--;){
+      int index = indices(i);
+      featureVector(index) = extractSingle(index, boundingBox.itop(), boundingBox.ileft(), workspace);
+    }
+  } else if (m_isMultiBlock){
     for (int i = indices.extent(0); i--;){
       int index = indices(i);
-      const auto& lbp = m_extractors[m_lookUpTable(index,0)];
-      featureVector(index) = lbp->extract(m_integralImage, boundingBox.top() + m_lookUpTable(index,1), boundingBox.left() + m_lookUpTable(index,2), true);
+      const auto& lbp = workspace.m_extractors[m_lookUpTable(index,0)];
+      featureVector(index) = lbp->extract(workspace.m_integralImage, boundingBox.top() + m_lookUpTable(index,1), boundingBox.left() + m_lookUpTable(index,2), true);
     }
   } else {
     for (int i = indices.extent(0); i--;){
       int index = indices(i);
-      const auto& lbp = m_extractors[m_lookUpTable(index,0)];
-      featureVector(index) = lbp->extract(m_image, boundingBox.top() + m_lookUpTable(index,1), boundingBox.left() + m_lookUpTable(index,2));
+      const auto& lbp = workspace.m_extractors[m_lookUpTable(index,0)];
+      featureVector(index) = lbp->extract(workspace.m_image, boundingBox.top() + m_lookUpTable(index,1), boundingBox.left() + m_lookUpTable(index,2));
     }
   }
 }
 
 void bob::ip::facedetect::FeatureExtractor::load(bob::io::base::HDF5File& hdf5file){
   // get global information
+  m_workspace.m_hasCodeMaps = false;
   m_patchSize[0] = hdf5file.read<int32_t>("PatchSize", 0);
   m_patchSize[1] = hdf5file.read<int32_t>("PatchSize", 1);
 
@@ -331,6 +627,7 @@ void bob::ip::facedetect::FeatureExtractor::load(bob::io::base::HDF5File& hdf5fi
     m_extractors.push_back(boost::shared_ptr<bob::ip::base::LBP>(new bob::ip::base::LBP(hdf5file)));
     hdf5file.cd("..");
   }
+  m_workspace.m_extractors = m_extractors;
   m_isMultiBlock = m_extractors[0]->isMultiBlockLBP();
 
   m_hasSingleOffsets = hdf5file.contains("SelectedOffsets");
@@ -64,8 +64,240 @@ class BoundingBox{
     double m_area;
 };
 
+// An array of bounding boxes, which are stored in one (N,4) array of top, left, height and width
+class BoxArray{
+  public:
+    // creates an array of the given number of empty bounding boxes
+    BoxArray(int size = 0) : m_boxes(size, 4) {m_boxes = 0.;}
+    // copies the given (N,4) array
+    BoxArray(const blitz::Array<double,2>& boxes);
+    // copies the given bounding boxes
+    BoxArray(const std::vector<boost::shared_ptr<BoundingBox>>& boxes);
+
+    int size() const {return m_boxes.extent(0);}
+    const blitz::Array<double,2>& boxes() const {return m_boxes;}
+
+    // query functions for the bounding box with the given index
+    double top(int i) const {return m_boxes(i,0);}
+    double bottom(int i) const {return m_boxes(i,0) + m_boxes(i,2);}
+    double left(int i) const {return m_boxes(i,1);}
+    double right(int i) const {return m_boxes(i,1) + m_boxes(i,3);}
+    double height(int i) const {return m_boxes(i,2);}
+    double width(int i) const {return m_boxes(i,3);}
+    double area(int i) const {return m_boxes(i,3) * m_boxes(i,2);}
+
+    boost::shared_ptr<BoundingBox> box(int i) const {return boost::shared_ptr<BoundingBox>(new BoundingBox(top(i), left(i), height(i), width(i)));}
+    void set(int i, const BoundingBox& box) {m_boxes(i,0) = box.top(); m_boxes(i,1) = box.left(); m_boxes(i,2) = box.height(); m_boxes(i,3) = box.width();}
+
+    // create bounding boxes by shifting, scaling and mirroring, see BoundingBox
+    boost::shared_ptr<BoxArray> shift(double y, double x) const;
+    boost::shared_ptr<BoxArray> scale(double scale) const;
+    boost::shared_ptr<BoxArray> scaleCentered(double scale) const;
+    boost::shared_ptr<BoxArray> mirrorX(int width) const;
+    // selects the bounding boxes with the given indices
+    boost::shared_ptr<BoxArray> select(const std::vector<int32_t>& indices) const;
+
+    // Jaccard similarity between the bounding boxes with the given indices, computed in the same way as BoundingBox::similarity
+    double similarity(int i, int j) const {return similarity(i, top(j), left(j), bottom(j), right(j), area(j));}
+    double similarity(int i, const BoundingBox& other) const {return similarity(i, other.top(), other.left(), other.bottom(), other.right(), other.area());}
+    double similarity(int i, const BoxArray& other, int j) const {return similarity(i, other.top(j), other.left(j), other.bottom(j), other.right(j), other.area(j));}
+
+    bool isValidFor(int i, blitz::TinyVector<int,2> shape) const {return top(i) >= 0 && bottom(i) < shape[0] && left(i) >= 0 && right(i) < shape[1];}
+
+  private:
+    double similarity(int i, double otherTop, double otherLeft, double otherBottom, double otherRight, double otherArea) const {
+      // compute intersection rectangle
+      double t = std::max(top(i), otherTop),
+             b = std::min(bottom(i), otherBottom),
+             l = std::max(left(i), otherLeft),
+             r = std::min(right(i), otherRight);
+
+      // no overlap?
+      if (l >= r || t >= b) return 0.;
+
+      // compute overlap
+      double intersection = (b-t) * (r-l);
+      return intersection / (area(i) + otherArea - intersection);
+    }
+
+    blitz::Array<double,2> m_boxes;
+};
+
 void pruneDetections(const std::vector<boost::shared_ptr<BoundingBox>>& detections, const blitz::Array<double, 1>& predictions, double threshold, std::vector<boost::shared_ptr<BoundingBox>>& pruned_boxes, blitz::Array<double, 1>& pruned_weights, const int number_of_detections);
 void bestOverlap(const std::vector<boost::shared_ptr<BoundingBox>>& detections, const blitz::Array<double, 1>& predictions, double threshold, std::vector<boost::shared_ptr<BoundingBox>>& pruned_boxes, blitz::Array<double, 1>& pruned_weights);
+// the same as above, but the indices of the pruned (or overlapping) detections are returned, sorted by descending predictions
+void pruneDetections(const BoxArray& detections, const blitz::Array<double, 1>& predictions, double threshold, std::vector<int32_t>& pruned_indices, const int number_of_detections);
+void bestOverlap(const BoxArray& detections, const blitz::Array<double, 1>& predictions, double threshold, std::vector<int32_t>& overlapping_indices);
+// merges the positive detections that overlap with the best detection into one bounding box, and returns its prediction in value
+boost::shared_ptr<BoundingBox> bestDetection(const BoxArray& detections, const blitz::Array<double, 1>& predictions, double threshold, double& value);
+
+// computes the LBP codes of all pixels of the image row by row, with the same result as bob::ip::base::LBP::extract
+// returns false (and leaves codes untouched) for extractors that are not supported, i.e., multi-block, circular or wrapping LBP's
+bool denseCodes(bob::ip::base::LBP& lbp, const blitz::Array<double,2>& image, blitz::Array<uint16_t,2>& codes);
+bool denseCodes(bob::ip::base::LBP& lbp, const blitz::Array<uint8_t,2>& image, blitz::Array<uint16_t,2>& codes);
+
+// An image pyramid, where each octave is computed by averaging 2x2 pixel blocks of the previous octave
+// Images of any scale are computed from the smallest octave that is at least as large as the scaled image
+class ImagePyramid{
+
+  public:
+    ImagePyramid() : m_identifier(0) {}
+    template <typename T>
+      ImagePyramid(const blitz::Array<T,2>& image, int maximumOctaves = 0) : m_identifier(0) {build(image, maximumOctaves);}
+
+    // computes all octaves of the given image (at most the given number, if positive), reusing the memory of the previous octaves, if possible
+    template <typename T>
+      void build(const blitz::Array<T,2>& image, int maximumOctaves = 0);
+
+    int numberOfOctaves() const {return m_octaves.size();}
+    // the octave with the given index, where the octave 0 is the image itself
+    const blitz::Array<double,2>& getOctave(int index) const {return m_octaves[index];}
+
+    // the shape of the image
+    blitz::TinyVector<int,2> shape() const {return m_octaves.empty() ? blitz::TinyVector<int,2>(0,0) : m_octaves[0].shape();}
+    // the shape of the image scaled with the given scale, which is identical to scaling the image directly
+    blitz::TinyVector<int,2> scaledShape(double scale) const {return bob::ip::base::getScaledShape(shape(), scale);}
+
+    // the index of the octave, from which the image of the given shape is computed
+    int octaveIndex(const blitz::TinyVector<int,2>& shape) const;
+
+    // scales the image to the shape of the given scaled image
+    void scale(blitz::Array<double,2>& scaled) const;
+
+    // a number that is unique for each call to build, over all image pyramids
+    uint64_t identifier() const {return m_identifier;}
+
+  private:
+    // computes all octaves from the first one
+    void decimate(int maximumOctaves);
+
+    std::vector<blitz::Array<double,2> > m_octaves;
+    uint64_t m_identifier;
+};
+
+template <typename T>
+  inline void ImagePyramid::build(const blitz::Array<T,2>& image, int maximumOctaves){
+    if (m_octaves.empty()) m_octaves.resize(1);
+    if (m_octaves[0].extent(0) != image.extent(0) || m_octaves[0].extent(1) != image.extent(1))
+      m_octaves[0].resize(image.shape());
+    m_octaves[0] = blitz::cast<double>(image);
+    decimate(maximumOctaves);
+  }
+
+class FeatureExtractor;
+
+// The per-image memory that is required to extract features with a FeatureExtractor
+// Several workspaces can be used with the same FeatureExtractor, e.g., in different threads
+// The buffers of a workspace are sized for the largest image that has been prepared, and smaller images are stored in views into these buffers
+// Hence, preparing and scanning images of the same size again does not allocate any memory
+class Workspace{
+
+  public:
+    Workspace() : m_shape(0,0), m_scaledBlocks(false), m_blockScale(1.,1.), m_integralSource(0), m_integralOctave(0), m_compact(false), m_hasCodeMaps(false), m_allCodeMaps(false), m_allocations(0) {}
+
+    // the prepared image
+    const blitz::Array<double,2>& getImage() const {return m_image;}
+
+    // the prepared uint8 image, when the image has been prepared in compact form
+    const blitz::Array<uint8_t,2>& getCompactImage() const {return m_compactImage;}
+    bool isCompact() const {return m_compact;}
+
+    // the shape of the prepared image in the requested scale, which differs from the shape of the prepared image, when the LBP blocks are scaled instead
+    const blitz::TinyVector<int,2>& getShape() const {return m_shape;}
+    bool hasScaledBlocks() const {return m_scaledBlocks;}
+
+    // the LBP code map of the given extractor, which is empty if it has not been computed
+    const blitz::Array<uint16_t,2>& getCodeMap(int extractor) const {return m_codeMaps[extractor];}
+
+    // the number of times that any buffer of this workspace needed to be (re-)allocated
+    std::size_t getAllocations() const {return m_allocations;}
+
+    // the buffers, into which the results of scanning the prepared image can be written, see CompiledCascade::scan; their memory is reserved by the scan and counted in the allocations
+    std::vector<double>& resultPredictions() const {return m_resultPredictions;}
+    std::vector<int32_t>& resultTops() const {return m_resultTops;}
+    std::vector<int32_t>& resultLefts() const {return m_resultLefts;}
+
+  private:
+    friend class FeatureExtractor;
+    friend class CompiledCascade;
+
+    // sets the given view to the top-left part of the given buffer, which is enlarged if required
+    template <typename T>
+      void view(blitz::Array<T,2>& buffer, blitz::Array<T,2>& view, const blitz::TinyVector<int,2>& shape);
+    // clears the given vector and makes sure that it can store the given number of elements without allocation
+    template <typename T>
+      void reserve(std::vector<T>& buffer, std::size_t size) const {buffer.clear(); if (buffer.capacity() < size){buffer.reserve(size); ++m_allocations;}}
+
+    // the LBP extractors of the FeatureExtractor, and our private copies of them, since LBP's have internal memory
+    std::vector<boost::shared_ptr<bob::ip::base::LBP>> m_sources;
+    std::vector<boost::shared_ptr<bob::ip::base::LBP>> m_extractors;
+
+    blitz::Array<double,2> m_image;
+    blitz::Array<double,2> m_integralImage;
+    blitz::Array<double,2> m_integralSquareImage;
+    blitz::TinyVector<int,2> m_shape;
+
+    // when the LBP blocks are scaled, the image is not: positions in the requested scale are multiplied by the block scale to get positions in the prepared image
+    bool m_scaledBlocks;
+    blitz::TinyVector<double,2> m_blockScale;
+    // copies of the LBP extractors with scaled block sizes, and for each extractor: the offset of the unscaled and the scaled extractor, and the last valid top-left position of the scaled feature region
+    std::vector<boost::shared_ptr<bob::ip::base::LBP>> m_scaledSources;
+    std::vector<boost::shared_ptr<bob::ip::base::LBP>> m_scaledExtractors;
+    std::vector<blitz::TinyVector<int,2> > m_blockOffsets;
+    std::vector<blitz::TinyVector<int,2> > m_scaledOffsets;
+    std::vector<blitz::TinyVector<int,2> > m_scaledLimits;
+    // the identifier of the image pyramid and the octave that the integral image has been computed for, so that it is not re-computed for the next scale
+    uint64_t m_integralSource;
+    int m_integralOctave;
+
+    // the compact form of the prepared image, and its integer integral images, which are used instead of the double precision images above
+    bool m_compact;
+    blitz::Array<uint8_t,2> m_compactImage;
+    blitz::Array<uint32_t,2> m_compactIntegralImage;
+    blitz::Array<uint64_t,2> m_compactIntegralSquareImage;
+
+    // dense LBP codes for the whole prepared image, one per extractor (all extractors, or only the used ones)
+    bool m_hasCodeMaps;
+    bool m_allCodeMaps;
+    std::vector<blitz::Array<uint16_t,2> > m_codeMaps;
+    std::vector<blitz::TinyVector<int,2> > m_codeMapOffsets;
+
+    // the buffers, which the arrays above are views into
+    blitz::Array<double,2> m_imageBuffer;
+    blitz::Array<double,2> m_integralBuffer;
+    blitz::Array<double,2> m_integralSquareBuffer;
+    std::vector<blitz::Array<uint16_t,2> > m_codeMapBuffers;
+    blitz::Array<uint8_t,2> m_compactImageBuffer;
+    blitz::Array<uint32_t,2> m_compactIntegralBuffer;
+    blitz::Array<uint64_t,2> m_compactIntegralSquareBuffer;
+
+    // scratch memory for scanning the prepared image stage by stage
+    mutable std::vector<int32_t> m_tops;
+    mutable std::vector<int32_t> m_lefts;
+    mutable std::vector<double> m_results;
+    mutable std::vector<int32_t> m_survivors;
+
+    // the results of the last scan of the prepared image
+    mutable std::vector<double> m_resultPredictions;
+    mutable std::vector<int32_t> m_resultTops;
+    mutable std::vector<int32_t> m_resultLefts;
+
+    mutable std::size_t m_allocations;
+};
+
+template <typename T>
+  inline void Workspace::view(blitz::Array<T,2>& buffer, blitz::Array<T,2>& view, const blitz::TinyVector<int,2>& shape){
+    if (shape[0] <= 0 || shape[1] <= 0){
+      // empty arrays do not need any memory
+      view.resize(std::max(shape[0], 0), std::max(shape[1], 0));
+      return;
+    }
+    if (buffer.extent(0) < shape[0] || buffer.extent(1) < shape[1]){
+      buffer.resize(std::max(buffer.extent(0), shape[0]), std::max(buffer.extent(1), shape[1]));
+      ++m_allocations;
+    }
+    view.reference(buffer(blitz::Range(0, shape[0]-1), blitz::Range(0, shape[1]-1)));
+  }
 
 class FeatureExtractor{
 
@@ -102,17 +334,70 @@ class FeatureExtractor{
     uint16_t getMaxLabel() const {return m_extractors[0]->getMaxLabel();}
 
     template <typename T>
-      void prepare(const blitz::Array<T,2>& image, double scale, bool computeIntegralSquareImage);
+      void prepare(const blitz::Array<T,2>& image, double scale, bool computeIntegralSquareImage) {prepare(image, scale, computeIntegralSquareImage, m_workspace);}
+    // prepares the given workspace, without modifying this extractor
+    template <typename T>
+      void prepare(const blitz::Array<T,2>& image, double scale, bool computeIntegralSquareImage, Workspace& workspace) const;
+    // the same for uint8 images; if compact images are enabled, the image in scale 1 (or in full resolution, when the LBP blocks are scaled) is stored as uint8, and its integral images as uint32 and uint64
+    void prepare(const blitz::Array<uint8_t,2>& image, double scale, bool computeIntegralSquareImage, Workspace& workspace) const;
+    // the same, but the scaled image is computed from the given image pyramid
+    void prepare(const ImagePyramid& pyramid, double scale, bool computeIntegralSquareImage) {prepare(pyramid, scale, computeIntegralSquareImage, m_workspace);}
+    void prepare(const ImagePyramid& pyramid, double scale, bool computeIntegralSquareImage, Workspace& workspace) const;
 
     // the prepared image
-    const blitz::Array<double,2>& getImage() const {return m_image;}
+    const blitz::Array<double,2>& getImage() const {return m_workspace.m_image;}
 
-    // Extract the features
-    void extractAll(const BoundingBox& boundingBox, blitz::Array<uint16_t,2>& dataset, int datasetIndex) const;
+    // the internal workspace, which is used when no workspace is given
+    const Workspace& getWorkspace() const {return m_workspace;}
+    // throws when the given workspace has not been prepared by this extractor
+    void checkWorkspace(const Workspace& workspace) const;
+
+    // enables scaling the blocks of multi-block LBP extractors instead of scaling the image, for scales smaller than 1 (unless code maps are used)
+    // the integral image is computed only once per octave of an image pyramid (or for the full resolution image), and the feature positions and block sizes are scaled instead
+    void setScaleBlocks(bool scaleBlocks) {m_scaleBlocks = scaleBlocks;}
+    bool getScaleBlocks() const {return m_scaleBlocks;}
 
-    void extractSome(const BoundingBox& boundingBox, blitz::Array<uint16_t,1>& featureVector) const;
+    // enables preparing uint8 images in compact form, i.e., without converting them to double precision when they are prepared in scale 1
+    // the LBP codes are identical to the ones extracted from the (rounded) scaled image
+    void setCompact(bool compact) {m_compact = compact;}
+    bool getCompact() const {return m_compact;}
 
-    void extractIndexed(const BoundingBox& boundingBox, blitz::Array<uint16_t,1>& featureVector, const blitz::Array<int32_t,1>& indices) const;
+    // enables the computation of dense LBP code maps in prepare, for the extractors used by the model indices (or all extractors, if no model indices are set)
+    void setUseCodeMaps(bool useCodeMaps) {m_useCodeMaps = useCodeMaps; m_workspace.m_hasCodeMaps = false; m_workspace.m_codeMaps.clear();}
+    bool getUseCodeMaps() const {return m_useCodeMaps;}
+    // the LBP code map of the given extractor, which is empty if it has not been computed
+    const blitz::Array<uint16_t,2>& getCodeMap(int extractor) const {return m_workspace.getCodeMap(extractor);}
+
+    // Extract the features
+    void extractAll(const BoundingBox& boundingBox, blitz::Array<uint16_t,2>& dataset, int datasetIndex) const;
+    // extracts all features of all bounding boxes into the first rows of the dataset, using the code maps of all extractors
+    void extractAllBatch(const BoxArray& boxes, blitz::Array<uint16_t,2>& dataset);
+
+    void extractSome(const BoundingBox& boundingBox, blitz::Array<uint16_t,1>& featureVector) const {extractSome(boundingBox, featureVector, m_workspace);}
+    void extractSome(const BoundingBox& boundingBox, blitz::Array<uint16_t,1>& featureVector, const Workspace& workspace) const;
+
+    void extractIndexed(const BoundingBox& boundingBox, blitz::Array<uint16_t,1>& featureVector, const blitz::Array<int32_t,1>& indices) const {extractIndexed(boundingBox, featureVector, indices, m_workspace);}
+    void extractIndexed(const BoundingBox& boundingBox, blitz::Array<uint16_t,1>& featureVector, const blitz::Array<int32_t,1>& indices, const Workspace& workspace) const;
+
+    // extracts the single feature with the given index for the patch at the given top-left position
+    uint16_t extractSingle(int32_t index, int top, int left) const {return extractSingle(index, top, left, m_workspace);}
+    uint16_t extractSingle(int32_t index, int top, int left, const Workspace& workspace) const {
+      if (workspace.m_scaledBlocks) return extractScaled(index, top, left, workspace);
+      const int e = m_lookUpTable(index,0);
+      if (workspace.m_hasCodeMaps && workspace.m_codeMaps[e].size()){
+        // read the pre-computed code
+        return workspace.m_codeMaps[e](top + m_lookUpTable(index,1) - workspace.m_codeMapOffsets[e][0], left + m_lookUpTable(index,2) - workspace.m_codeMapOffsets[e][1]);
+      }
+      const auto& lbp = workspace.m_extractors[e];
+      if (workspace.m_compact){
+        if (m_isMultiBlock)
+          return lbp->extract(workspace.m_compactIntegralImage, top + m_lookUpTable(index,1), left + m_lookUpTable(index,2), true);
+        return lbp->extract(workspace.m_compactImage, top + m_lookUpTable(index,1), left + m_lookUpTable(index,2));
+      }
+      if (m_isMultiBlock)
+        return lbp->extract(workspace.m_integralImage, top + m_lookUpTable(index,1), left + m_lookUpTable(index,2), true);
+      return lbp->extract(workspace.m_image, top + m_lookUpTable(index,1), left + m_lookUpTable(index,2));
+    }
 
     double mean(const BoundingBox& boundingBox) const;
     double variance(const BoundingBox& boundingBox) const;
@@ -127,6 +412,31 @@ class FeatureExtractor{
 
     void init();
 
+    // sets up the LBP extractors of the given workspace
+    void initWorkspace(Workspace& workspace) const;
+
+    // should the blocks be scaled instead of the image?
+    bool useScaledBlocks(double scale, bool computeIntegralSquareImage) const {return m_scaleBlocks && m_isMultiBlock && !m_useCodeMaps && scale < 1. && !computeIntegralSquareImage;}
+    // computes the integral image of the prepared image (unless it has been computed for the given source before) and scales the LBP extractors from the prepared image to the given shape
+    // for a compact image, the integer integral image must have been computed already
+    void prepareBlocks(const blitz::TinyVector<int,2>& shape, uint64_t source, int octave, bool compact, Workspace& workspace) const;
+
+    // extracts the single feature with the given index from the integral image, where the feature region is scaled from the requested scale to the prepared image
+    uint16_t extractScaled(int32_t index, int top, int left, const Workspace& workspace) const {
+      const int e = m_lookUpTable(index,0);
+      const int y = std::min(std::max((int)((top + m_lookUpTable(index,1) - workspace.m_blockOffsets[e][0]) * workspace.m_blockScale[0] + 0.5), 0), workspace.m_scaledLimits[e][0]);
+      const int x = std::min(std::max((int)((left + m_lookUpTable(index,2) - workspace.m_blockOffsets[e][1]) * workspace.m_blockScale[1] + 0.5), 0), workspace.m_scaledLimits[e][1]);
+      if (workspace.m_compact)
+        return workspace.m_scaledExtractors[e]->extract(workspace.m_compactIntegralImage, y + workspace.m_scaledOffsets[e][0], x + workspace.m_scaledOffsets[e][1], true);
+      return workspace.m_scaledExtractors[e]->extract(workspace.m_integralImage, y + workspace.m_scaledOffsets[e][0], x + workspace.m_scaledOffsets[e][1], true);
+    }
+
+    // computes the integral images and the LBP code maps of the scaled image of the given workspace
+    void prepareScaled(bool computeIntegralSquareImage, Workspace& workspace) const;
+
+    // computes the LBP code maps of the image prepared in the given workspace, for the used or for all extractors
+    void computeCodeMaps(Workspace& workspace, bool all = false) const;
+
     // look up table storing three information: lbp index, offset y, offset x
     blitz::TinyVector<int,2> m_patchSize;
     blitz::Array<int,2> m_lookUpTable;
@@ -136,32 +446,86 @@ class FeatureExtractor{
     blitz::Array<int32_t,1> m_featureStarts;
     blitz::Array<int32_t,1> m_modelIndices;
 
-    blitz::Array<double,2> m_image;
-    blitz::Array<double,2> m_integralImage;
-    blitz::Array<double,2> m_integralSquareImage;
+    // the internal workspace, which stores the prepared image
+    Workspace m_workspace;
 
     mutable std::vector<blitz::Array<uint16_t,2> > m_featureImages;
     bool m_isMultiBlock;
     bool m_hasSingleOffsets;
+
+    bool m_useCodeMaps;
+    bool m_scaleBlocks;
+    bool m_compact;
 };
 
-template <typename T>
-  inline void FeatureExtractor::prepare(const blitz::Array<T,2>& image, double scale, bool computeIntegralSquareImage){
-    // TODO: implement different MB-LBP behaviour here (i.e., scaling the LBP's instead of scaling the image)
+// A cascade of strong classifiers of look-up-table weak machines, stored in contiguous arrays
+class CompiledCascade{
 
-    // scale image
-    m_image.resize(bob::ip::base::getScaledShape(image.shape(), scale));
-    bob::ip::base::scale(image, m_image);
-    if (m_isMultiBlock or computeIntegralSquareImage){
-      // compute integral image of scaled image
-      m_integralImage.resize(m_image.extent(0)+1, m_image.extent(1)+1);
-      if (computeIntegralSquareImage){
-        m_integralSquareImage.resize(m_integralImage.extent(0), m_integralImage.extent(1));
-        bob::ip::base::integral<double>(m_image, m_integralImage, m_integralSquareImage, true);
-      } else {
-        bob::ip::base::integral<double>(m_image, m_integralImage, true);
+  public:
+    // The look-up-tables need to be already multiplied with the weights of the weak machines
+    CompiledCascade(const blitz::Array<int32_t,1>& stageEnds, const blitz::Array<int32_t,1>& featureIndices, const blitz::Array<double,2>& lookUpTables, const blitz::Array<double,1>& thresholds);
+
+    // checks that the given extractor can be used with this cascade
+    void check(const FeatureExtractor& extractor) const;
+
+    // computes the prediction for the patch at the given top-left position of the image that the given workspace has been prepared with
+    double predict(const FeatureExtractor& extractor, const Workspace& workspace, int top, int left) const {
+      double result = 0.;
+      for (int s = 0, begin = 0; s < m_thresholds.extent(0); begin = m_stageEnds(s++)){
+        // sum up the weak machines of this stage in the same (reverse) order as the BoostedMachine does
+        double sum = 0.;
+        for (int i = m_stageEnds(s); i-- > begin;)
+          sum += m_lookUpTables(i, extractor.extractSingle(m_featureIndices(i), top, left, workspace));
+        result += sum;
+        // early rejection
+        if (result < m_thresholds(s)) break;
       }
+      return result;
+    }
+
+    // scans all patches of the given size of the image that the given workspace has been prepared with
+    // the top-left positions of all patches with predictions above threshold are returned
+    void scan(const FeatureExtractor& extractor, const Workspace& workspace, const blitz::TinyVector<int,2>& patchSize, int distance, double threshold, std::vector<double>& predictions, std::vector<int32_t>& tops, std::vector<int32_t>& lefts) const;
+    // the same as scan, but each stage is evaluated for all patches that survived the previous stage, before the next stage is evaluated
+    void scanBreadthFirst(const FeatureExtractor& extractor, const Workspace& workspace, const blitz::TinyVector<int,2>& patchSize, int distance, double threshold, std::vector<double>& predictions, std::vector<int32_t>& tops, std::vector<int32_t>& lefts) const;
+    // the same as scan, but only patches with predictions above max(0, best - margin) are returned, where best is the best prediction so far (which is updated)
+    // the evaluation of a patch is stopped, as soon as its prediction cannot exceed max(0, best - margin) anymore
+    void scanBest(const FeatureExtractor& extractor, const Workspace& workspace, const blitz::TinyVector<int,2>& patchSize, int distance, double margin, double& best, std::vector<double>& predictions, std::vector<int32_t>& tops, std::vector<int32_t>& lefts) const;
+
+    int numberOfStages() const {return m_thresholds.extent(0);}
+    const blitz::Array<int32_t,1>& getStageEnds() const {return m_stageEnds;}
+    const blitz::Array<int32_t,1>& getFeatureIndices() const {return m_featureIndices;}
+    const blitz::Array<double,2>& getLookUpTables() const {return m_lookUpTables;}
+    const blitz::Array<double,1>& getThresholds() const {return m_thresholds;}
+    const blitz::Array<double,1>& getUpperBounds() const {return m_upperBounds;}
+
+  private:
+    blitz::Array<int32_t,1> m_stageEnds;
+    blitz::Array<int32_t,1> m_featureIndices;
+    blitz::Array<double,2> m_lookUpTables;
+    blitz::Array<double,1> m_thresholds;
+    // the maximum value that the prediction can increase from the beginning of each stage on
+    blitz::Array<double,1> m_upperBounds;
+};
+
+template <typename T>
+  inline void FeatureExtractor::prepare(const blitz::Array<T,2>& image, double scale, bool computeIntegralSquareImage, Workspace& workspace) const{
+    initWorkspace(workspace);
+
+    const blitz::TinyVector<int,2> shape = bob::ip::base::getScaledShape(image.shape(), scale);
+    if (useScaledBlocks(scale, computeIntegralSquareImage)){
+      // keep the full resolution image, and scale the LBP blocks instead
+      // since we cannot know whether the image has changed, its integral image is always re-computed
+      workspace.view(workspace.m_imageBuffer, workspace.m_image, image.shape());
+      workspace.m_image = blitz::cast<double>(image);
+      prepareBlocks(shape, 0, 0, false, workspace);
+      return;
     }
+
+    // scale image
+    workspace.view(workspace.m_imageBuffer, workspace.m_image, shape);
+    bob::ip::base::scale(image, workspace.m_image);
+    prepareScaled(computeIntegralSquareImage, workspace);
   }
 
 } } } // namespaces
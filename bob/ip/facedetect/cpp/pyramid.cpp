@@ -0,0 +1,43 @@
+#include "features.h"
+#include <atomic>
+
+// the number of image pyramids that have been built so far
+static std::atomic<uint64_t> s_builds(0);
+
+void bob::ip::facedetect::ImagePyramid::decimate(int maximumOctaves){
+  m_identifier = ++s_builds;
+  // compute octaves, until the image cannot be halved anymore (or the maximum number of octaves is reached)
+  int count = 1;
+  while ((maximumOctaves <= 0 || count < maximumOctaves) && m_octaves[count-1].extent(0) >= 2 && m_octaves[count-1].extent(1) >= 2){
+    if ((int)m_octaves.size() <= count) m_octaves.resize(count+1);
+    const blitz::Array<double,2>& source = m_octaves[count-1];
+    blitz::Array<double,2>& target = m_octaves[count];
+    const int h = source.extent(0) / 2, w = source.extent(1) / 2;
+    if (target.extent(0) != h || target.extent(1) != w) target.resize(h, w);
+    // average 2x2 blocks
+    for (int y = 0; y < h; ++y)
+      for (int x = 0; x < w; ++x)
+        target(y,x) = 0.25 * (source(2*y, 2*x) + source(2*y, 2*x+1) + source(2*y+1, 2*x) + source(2*y+1, 2*x+1));
+    ++count;
+  }
+  m_octaves.resize(count);
+}
+
+int bob::ip::facedetect::ImagePyramid::octaveIndex(const blitz::TinyVector<int,2>& shape) const{
+  if (m_octaves.empty())
+    throw std::runtime_error("The image pyramid has not been built yet");
+  // find the smallest octave that is at least as large as the given shape
+  for (int o = m_octaves.size(); --o > 0;){
+    if (m_octaves[o].extent(0) >= shape[0] && m_octaves[o].extent(1) >= shape[1])
+      return o;
+  }
+  return 0;
+}
+
+void bob::ip::facedetect::ImagePyramid::scale(blitz::Array<double,2>& scaled) const{
+  const blitz::Array<double,2>& octave = m_octaves[octaveIndex(scaled.shape())];
+  if (octave.extent(0) == scaled.extent(0) && octave.extent(1) == scaled.extent(1))
+    scaled = octave;
+  else
+    bob::ip::base::scale(octave, scaled);
+}
@@ -1,74 +1,101 @@
 import pkg_resources
 import math
+import os
+import tempfile
+import itertools
+import collections
+import multiprocessing
+import threading
 
-from .detector import Sampler, Cascade
-from ._library import BoundingBox, prune_detections, overlapping_detections
+from .detector import Sampler, Cascade, StreamingPruner
+from ._library import BoxArray, prune_detections, overlapping_detections, best_detection
 
 import bob.io.base
 import numpy
 
-def default_cascade():
-  """Returns the :py:class:`Cascade` that is loaded from the pre-trained cascade file provided by this package."""
-  return Cascade(bob.io.base.HDF5File(pkg_resources.resource_filename("bob.ip.facedetect", "MCT_cascade.hdf5")))
+# the cascades that have been loaded already, and the lock that protects them
+_cascades = {}
+_cascades_lock = threading.Lock()
+
+def _load_cascade(cascade_file):
+  # returns the cached cascade for the given file, which is re-loaded when the file has been modified
+  key = os.path.abspath(cascade_file)
+  mtime = os.path.getmtime(key)
+  with _cascades_lock:
+    if key not in _cascades or _cascades[key][0] != mtime:
+      _cascades[key] = (mtime, Cascade(bob.io.base.HDF5File(key)))
+    return _cascades[key][1]
+
+def _get_cascade(cascade):
+  # returns the given cascade, or loads the cascade from the given file, or returns the default cascade
+  if cascade is None:
+    return default_cascade()
+  if isinstance(cascade, str):
+    return _load_cascade(cascade)
+  return cascade
 
 
-def best_detection(detections, predictions, minimum_overlap = 0.2):
-  """best_detection(detections, predictions, [minimum_overlap]) -> bounding_box, prediction
+def default_cascade(cached = True):
+  """default_cascade([cached]) -> cascade
 
-  Computes the best detection for the given detections and according predictions.
+  Returns the :py:class:`Cascade` that is loaded from the pre-trained cascade file provided by this package.
 
-  This is achieved by computing a weighted sum of detections that overlap with the best detection (the one with the highest prediction), where the weights are based on the predictions.
-  Only detections with according prediction values > 0 are considered.
+  By default, the cascade is loaded only once per process, and the same cascade is returned by all calls to this function.
+  Hence, the returned cascade must not be modified, e.g., using :py:meth:`Cascade.use_code_maps`.
+  To obtain a cascade that can be modified, set ``cached = False``.
 
   **Parameters:**
 
-  ``detections`` : [:py:class:`BoundingBox`]
-    The detected bounding boxes.
+  ``cached`` : bool
+    Return the cascade that is shared in this process? Otherwise, a new cascade is loaded.
 
-  ``predictions`` : [float]
-    The predictions for the ``detections``.
+  **Returns:**
 
-  ``minimum_overlap`` : float between 0 and 1
-    The minimum overlap (in terms of Jaccard :py:meth:`BoundingBox.similarity`) of bounding boxes with the best detection to be considered.
+  ``cascade`` : :py:class:`Cascade`
+    The default cascade
+  """
+  cascade_file = pkg_resources.resource_filename("bob.ip.facedetect", "MCT_cascade.hdf5")
+  if not cached:
+    return Cascade(bob.io.base.HDF5File(cascade_file))
+  return _load_cascade(cascade_file)
 
-  **Returns:**
 
-  ``bounding_box`` : :py:class:`BoundingBox`
-    The bounding box which has been merged from the detections
+def warm_up(cascade = None):
+  """warm_up([cascade]) -> cascade
 
-  ``prediction`` : float
-    The prediction value of the bounding box, which is a weighted sum of the predictions with minimum overlap
-  """
-  # remove all negative predictions since they harm the calculation of the weights
-  detections = [detections[i] for i in range(len(detections)) if predictions[i] > 0]
-  predictions = [predictions[i] for i in range(len(predictions)) if predictions[i] > 0]
+  Loads the given cascade file, or the :py:func:`default_cascade`, ahead of time.
 
-  if not detections:
-    raise ValueError("No detections with a prediction value > 0 have been found")
+  The loaded cascade is cached, so that :py:func:`detect_single_face`, :py:func:`detect_all_faces` and :py:func:`detect_faces_batch` do not need to load it again.
+  Cascades that are given by their file name are re-loaded, when the file has been modified.
 
-  # keep only the bounding boxes with the highest overlap
-  detections, predictions = overlapping_detections(detections, numpy.array(predictions), minimum_overlap)
+  **Parameters:**
 
-  # compute the mean of the detected bounding boxes
-  s = sum(predictions)
-  weights = [p/s for p in predictions]
-  top = sum(w * b.topleft_f[0] for w, b in zip(weights, detections))
-  left = sum(w * b.topleft_f[1] for w, b in zip(weights, detections))
-  bottom = sum(w * b.bottomright_f[0] for w, b in zip(weights, detections))
-  right = sum(w * b.bottomright_f[1] for w, b in zip(weights, detections))
+  ``cascade`` : str or ``None``
+    The file name of the cascade to load; if ``None``, the :py:func:`default_cascade` is loaded
+
+  **Returns:**
+
+  ``cascade`` : :py:class:`Cascade`
+    The loaded cascade, which must not be modified
+  """
+  return _get_cascade(cascade)
 
-  value = sum(w*p for w,p in zip(weights, predictions))
-  # as the detection value, we use the *BEST* value of all detections.
-#  value = predictions[0]
 
-  return BoundingBox((top, left), (bottom-top, right-left)), value
+def _default_sampler(cascade):
+  # the sampler used by the detection functions, when none is given
+  return Sampler(patch_size = cascade.extractor.patch_size, distance=2, scale_factor=math.pow(2.,-1./16.), lowest_scale=0.125)
 
 
-def detect_single_face(image, cascade = None, sampler = None, minimum_overlap=0.2):
-  """detect_single_face(image, [cascade], [sampler], [minimum_overlap]) -> bounding_box, quality
+def detect_single_face(image, cascade = None, sampler = None, minimum_overlap=0.2, exhaustive = True, margin = None, plan = None):
+  """detect_single_face(image, [cascade], [sampler], [minimum_overlap], [exhaustive], [margin], [plan]) -> bounding_box, quality
 
   Detects a single face in the given image, i.e., the one with the highest prediction value.
 
+  By default, the cascade is evaluated exhaustively for all sampled bounding boxes, see :py:meth:`Sampler.scan_cascade`.
+  When ``exhaustive`` is disabled, the evaluation of bounding boxes is stopped as soon as they cannot reach a positive prediction, or, if a ``margin`` is given, a prediction close to the best prediction, see :py:meth:`Sampler.search_cascade`.
+  Without ``margin``, the results are identical to the exhaustive search.
+  With ``margin``, the best bounding box is still found, but only bounding boxes with predictions of at most ``margin`` below the best prediction are merged in :py:func:`best_detection`.
+
   **Parameters:**
 
   ``image`` : array_like (2D aka gray or 3D aka RGB)
@@ -77,6 +104,7 @@ def detect_single_face(image, cascade = None, sampler = None, minimum_overlap=0.
   ``cascade`` : str or :py:class:`Cascade` or ``None``
     If given, the cascade file name or the loaded cascade to be used.
     If not given, the :py:func:`default_cascade` is used.
+    Cascade files are loaded only once, see :py:func:`warm_up`.
 
   ``sampler`` : :py:class:`Sampler` or ``None``
     The sampler that defines the sampling of bounding boxes to search for the face.
@@ -85,6 +113,17 @@ def detect_single_face(image, cascade = None, sampler = None, minimum_overlap=0.
   ``minimum_overlap`` : float between 0 and 1
     Computes the best detection using the given minimum overlap, see :py:func:`best_detection`
 
+  ``exhaustive`` : bool
+    Evaluate the cascade for all bounding boxes? Otherwise, bounding boxes that cannot contribute to the best detection are skipped.
+
+  ``margin`` : float or ``None``
+    If given and not ``exhaustive``, only bounding boxes with predictions of at most this value below the best prediction are considered
+
+  ``plan`` : :py:class:`DetectionPlan` or ``None``
+    If given, the pre-computed scales and the workspace of this plan are used, see :py:meth:`Sampler.plan`.
+    The plan must have been created for the shape of the ``image``; if no ``sampler`` is given, the sampler of the plan is used.
+    If not given, the cached plan of the ``sampler`` for the shape of the ``image`` is used, so that the buffers of its workspace are reused for subsequent images of the same shape.
+
   **Returns:**
 
   ``bounding_box`` : :py:class:`BoundingBox`
@@ -94,38 +133,47 @@ def detect_single_face(image, cascade = None, sampler = None, minimum_overlap=0.
     The quality of the detected face, a value greater than 0.
   """
 
-  if cascade is None:
-    cascade = default_cascade()
-  elif isinstance(cascade, str):
-    cascade = Cascade(bob.io.base.HDF5File(cascade))
+  cascade = _get_cascade(cascade)
 
   if sampler is None:
-    sampler = Sampler(patch_size = cascade.extractor.patch_size, distance=2, scale_factor=math.pow(2.,-1./16.), lowest_scale=0.125)
+    sampler = _default_sampler(cascade) if plan is None else plan.sampler
+  if plan is None:
+    # the cached plan for the image shape provides the scales and the workspace of the current thread
+    plan = sampler.plan(image.shape)
 
   if len(image.shape)==3:
     image = bob.ip.color.rgb_to_gray(image)
 
-  detections = []
-  predictions = []
   # get the detection scores for the image
-  for prediction, bounding_box in sampler.iterate_cascade(cascade, image, None):
-    detections.append(bounding_box)
-    predictions.append(prediction)
+  if exhaustive:
+    predictions, boxes = sampler.scan_cascade(cascade, image, None, plan=plan)
+  else:
+    predictions, boxes = sampler.search_cascade(cascade, image, margin, plan=plan)
 
-  if not detections:
+  if not len(predictions) and (exhaustive or not plan.scales):
+    # no bounding box has been sampled at all
     return None
 
+  # only positive predictions are considered by best_detection, anyways
+  positive = predictions > 0
+  predictions = predictions[positive]
+  detections = BoxArray(boxes[positive])
+
   # compute average over the best locations
   bb, quality = best_detection(detections, predictions, minimum_overlap)
 
   return bb, quality
 
 
-def detect_all_faces(image, cascade = None, sampler = None, threshold = 0, minimum_overlap = 0.2):
-  """detect_all_faces(image, [cascade], [sampler], [minimum_overlap]) -> bounding_boxes, qualities
+def detect_all_faces(image, cascade = None, sampler = None, threshold = 0, minimum_overlap = 0.2, num_threads = 1, buffer_size = None, plan = None):
+  """detect_all_faces(image, [cascade], [sampler], [threshold], [minimum_overlap], [num_threads], [buffer_size], [plan]) -> bounding_boxes, qualities
 
   Detects a single face in the given image, i.e., the one with the highest prediction value.
 
+  By default, all detections above ``threshold`` are collected before overlapping detections are pruned with :py:func:`prune_detections`.
+  When a ``buffer_size`` is given, the detections of each scale are pruned while the image is scanned, using a :py:class:`StreamingPruner`.
+  This limits the memory for images with many detections (e.g., large images with low thresholds), but slightly less detections might be returned.
+
   **Parameters:**
 
   ``image`` : array_like (2D aka gray or 3D aka RGB)
@@ -134,6 +182,7 @@ def detect_all_faces(image, cascade = None, sampler = None, threshold = 0, minim
   ``cascade`` : str or :py:class:`Cascade` or ``None``
     If given, the cascade file name or the loaded cascade to be used to classify image patches.
     If not given, the :py:func:`default_cascade` is used.
+    Cascade files are loaded only once, see :py:func:`warm_up`.
 
   ``sampler`` : :py:class:`Sampler` or ``None``
     The sampler that defines the sampling of bounding boxes to search for the face.
@@ -147,6 +196,18 @@ def detect_all_faces(image, cascade = None, sampler = None, threshold = 0, minim
   ``minimum_overlap`` : float between 0 and 1
     Computes the best detection using the given minimum overlap, see :py:func:`best_detection`
 
+  ``num_threads`` : int
+    The number of threads to scan the scales of the image in parallel, see :py:meth:`Sampler.scan_cascade`.
+    The detections do not depend on the number of threads.
+
+  ``buffer_size`` : int or ``None``
+    If given, prune the detections while scanning, whenever this number of unpruned detections has been collected, see :py:class:`StreamingPruner`.
+
+  ``plan`` : :py:class:`DetectionPlan` or ``None``
+    If given, the pre-computed scales and the workspace of this plan are used, see :py:meth:`Sampler.plan`.
+    The plan must have been created for the shape of the ``image``; if no ``sampler`` is given, the sampler of the plan is used.
+    If not given, the cached plan of the ``sampler`` for the shape of the ``image`` is used, so that the buffers of its workspace are reused for subsequent images of the same shape.
+
   **Returns:**
 
   ``bounding_boxes`` : [:py:class:`BoundingBox`]
@@ -155,28 +216,157 @@ def detect_all_faces(image, cascade = None, sampler = None, threshold = 0, minim
   ``qualities`` : [float]
     The qualities of the ``bounding_boxes``, values greater than ``threshold``.
   """
-  if cascade is None:
-    cascade = default_cascade()
-  elif isinstance(cascade, str):
-    cascade = Cascade(bob.io.base.HDF5File(cascade))
+  cascade = _get_cascade(cascade)
 
   if sampler is None:
-    sampler = Sampler(patch_size = cascade.extractor.patch_size, distance=2, scale_factor=math.pow(2.,-1./16.), lowest_scale=0.125)
+    sampler = _default_sampler(cascade) if plan is None else plan.sampler
+  if plan is None:
+    # the cached plan for the image shape provides the scales and the workspace of the current thread
+    plan = sampler.plan(image.shape)
 
   if len(image.shape)==3:
     image = bob.ip.color.rgb_to_gray(image)
 
-  detections = []
-  predictions = []
-  # get the detection scores for the image
-  for prediction, bounding_box in sampler.iterate_cascade(cascade, image, threshold):
-    detections.append(bounding_box)
-    predictions.append(prediction)
+  if buffer_size is None:
+    # get the detection scores for the image
+    predictions, boxes = sampler.scan_cascade(cascade, image, threshold, num_threads=num_threads, plan=plan)
 
-  if not detections:
-    return None
+    if not len(predictions):
+      return None
+
+    # prune overlapping detections
+    bbs, qualities = prune_detections(BoxArray(boxes), predictions, minimum_overlap)
+
+  else:
+    # prune the detections of each scale while scanning
+    pruner = StreamingPruner(minimum_overlap, buffer_size)
+    for predictions, boxes in sampler.scan_scales(cascade, image, threshold, num_threads=num_threads, plan=plan):
+      pruner.add_all(predictions, boxes)
+    bbs, qualities = pruner.result()
 
-  # prune overlapping detections
-  bbs, qualities = prune_detections(detections, predictions, minimum_overlap)
+    if not len(qualities):
+      return None
 
-  return bbs, qualities
+  return list(bbs), qualities
+
+
+# the cascade, sampler and overlap used by the worker processes of detect_faces_batch
+_batch = None
+
+def _init_batch(cascade, sampler, minimum_overlap, flags = None):
+  # loads the cascade once per worker process, and applies the settings of its extractor, which are not stored in the cascade file
+  global _batch
+  if flags is None:
+    cascade = _get_cascade(cascade)
+  else:
+    # the settings are applied to a cascade that is not shared with other callers in this process
+    cascade = Cascade(bob.io.base.HDF5File(cascade))
+    code_maps, cascade.extractor.compact, cascade.extractor.scale_blocks = flags
+    if code_maps != cascade.extractor.code_maps:
+      cascade.use_code_maps(code_maps)
+  _batch = (cascade, _default_sampler(cascade) if sampler is None else sampler, minimum_overlap)
+
+def _detect_batch(chunk):
+  # detects the faces in the given chunk of images or image file names
+  cascade, sampler, minimum_overlap = _batch
+  results = []
+  for image in chunk:
+    if isinstance(image, str):
+      image = bob.io.base.load(image)
+    # images of the same shape share the (cached) detection plan
+    results.append(detect_single_face(image, cascade, sampler, minimum_overlap, plan=sampler.plan(image.shape)))
+  return results
+
+
+def detect_faces_batch(images, cascade = None, sampler = None, workers = 1, chunksize = 16, minimum_overlap = 0.2, max_chunks = None):
+  """detect_faces_batch(images, [cascade], [sampler], [workers], [chunksize], [minimum_overlap], [max_chunks]) -> detections
+
+  Detects a single face in each of the given images using a pool of processes.
+
+  This function computes the same results as calling :py:func:`detect_single_face` for each image, but the images are distributed to ``workers`` processes in chunks of ``chunksize`` images.
+  The cascade is loaded only once per worker process, and images that are given as file names are loaded inside the workers.
+  The results are yielded in the order of the ``images``.
+
+  The ``images`` are consumed lazily, and at most ``max_chunks`` chunks are processed or waiting to be yielded at any time, so the memory stays bounded also for very long sequences of images.
+
+  **Parameters:**
+
+  ``images`` : iterable of str or array_like (2D aka gray or 3D aka RGB)
+    The images, or the file names of the images, to detect faces in.
+
+  ``cascade`` : str or :py:class:`Cascade` or ``None``
+    If given, the cascade file name or the loaded cascade to be used.
+    If not given, the :py:func:`default_cascade` is used.
+    A loaded cascade is written to a temporary file, which is read by the workers; the :py:attr:`FeatureExtractor.code_maps`, :py:attr:`FeatureExtractor.compact` and :py:attr:`FeatureExtractor.scale_blocks` settings of its extractor are applied in the workers.
+
+  ``sampler`` : :py:class:`Sampler` or ``None``
+    The sampler that defines the sampling of bounding boxes to search for the face, see :py:func:`detect_single_face`.
+
+  ``workers`` : int
+    The number of worker processes; if 1, all images are processed in the current process.
+
+  ``chunksize`` : int
+    The number of images that are sent to a worker at once.
+
+  ``minimum_overlap`` : float between 0 and 1
+    Computes the best detection using the given minimum overlap, see :py:func:`best_detection`
+
+  ``max_chunks`` : int or ``None``
+    The maximum number of chunks in flight; if ``None``, twice the number of ``workers`` is used.
+
+  **Yields:**
+
+  ``detection`` : (:py:class:`BoundingBox`, float) or ``None``
+    The result of :py:func:`detect_single_face` for the next image, i.e., the bounding box and the quality of the detected face, or ``None`` if no face was found.
+  """
+  # the arguments are checked when this function is called, not when the first detection is requested
+  if chunksize < 1:
+    raise ValueError("The chunk size %d must be positive" % chunksize)
+  if max_chunks is not None and max_chunks < 1:
+    raise ValueError("The maximum number of chunks %d must be positive" % max_chunks)
+  return _detect_faces_batch(iter(images), cascade, sampler, workers, chunksize, minimum_overlap, max_chunks)
+
+
+def _detect_faces_batch(images, cascade, sampler, workers, chunksize, minimum_overlap, max_chunks):
+  # yields the detections of detect_faces_batch
+  if workers <= 1:
+    # process all images in this process, loading the cascade only once
+    cascade = _get_cascade(cascade)
+    if sampler is None:
+      sampler = _default_sampler(cascade)
+    for image in images:
+      if isinstance(image, str):
+        image = bob.io.base.load(image)
+      yield detect_single_face(image, cascade, sampler, minimum_overlap, plan=sampler.plan(image.shape))
+    return
+
+  temporary, flags = None, None
+  if isinstance(cascade, Cascade):
+    # the workers load the cascade from file, and apply the same extractor settings
+    flags = (cascade.extractor.code_maps, cascade.extractor.compact, cascade.extractor.scale_blocks)
+    handle, temporary = tempfile.mkstemp(suffix=".hdf5")
+    os.close(handle)
+    cascade.save(bob.io.base.HDF5File(temporary, 'w'))
+    cascade = temporary
+
+  pool = multiprocessing.Pool(workers, _init_batch, (cascade, sampler, minimum_overlap, flags))
+  try:
+    pending = collections.deque()
+    max_chunks = max_chunks or 2 * workers
+    while True:
+      # keep the given number of chunks in flight
+      while len(pending) < max_chunks:
+        chunk = list(itertools.islice(images, chunksize))
+        if not chunk:
+          break
+        pending.append(pool.apply_async(_detect_batch, (chunk,)))
+      if not pending:
+        break
+      # yield the results of the oldest chunk
+      for detection in pending.popleft().get():
+        yield detection
+  finally:
+    pool.terminate()
+    pool.join()
+    if temporary is not None:
+      os.remove(temporary)
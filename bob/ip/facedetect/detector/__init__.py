@@ -1,2 +1,4 @@
 from .sampler import Sampler
 from .cascade import Cascade
+from .pruner import StreamingPruner
+from .plan import DetectionPlan
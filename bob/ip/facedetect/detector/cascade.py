@@ -1,5 +1,5 @@
 import numpy
-from .._library import FeatureExtractor
+from .._library import FeatureExtractor, CompiledCascade
 
 import bob.learn.boosting
 
@@ -37,8 +37,7 @@ class Cascade:
       self.cascade = []
       self.indices = []
       self.thresholds = []
-
-    self._indices()
+      self._indices()
 
 
   def add(self, classifier, threshold, begin=None, end=None):
@@ -92,6 +91,7 @@ class Cascade:
       self.thresholds = [classification_thresholds] * len(self.cascade)
     else:
       self.thresholds = classification_thresholds
+    self._indices()
 
 
   def generate_boosted_machine(self):
@@ -120,25 +120,139 @@ class Cascade:
     for classifier in self.cascade:
       self.indices.append(classifier.indices)
     self.feature = numpy.zeros(self.extractor.number_of_features, numpy.uint16)
+    # the classifiers have changed, so the cascade is compiled again on its next use
+    self.m_compiled = None
+    self.m_is_compiled = False
+    if self.extractor.code_maps and self.indices:
+      # compute code maps only for the LBP extractors that are used in this cascade
+      self.extractor.model_indices = numpy.unique(numpy.concatenate(self.indices)).astype(numpy.int32)
+
+
+  @property
+  def _compiled(self):
+    # the compiled cascade, which is compiled on first use after the classifiers have changed;
+    # ``None`` if this cascade cannot be compiled
+    if not self.m_is_compiled:
+      self.m_compiled = self.compile()
+      self.m_is_compiled = True
+    return self.m_compiled
+
+
+  def use_code_maps(self, enable = True):
+    """Enables or disables dense LBP code maps in the :py:attr:`FeatureExtractor.code_maps` of this cascade.
+
+    When enabled, :py:meth:`prepare` computes the LBP codes of the whole scaled image once, but only for the LBP extractors that are used by this cascade.
+    Afterward, the features of the patches are looked up in these code maps by the :py:class:`CompiledCascade`, e.g., inside :py:meth:`Sampler.scan_cascade`.
+    The predictions do not change.
+
+    .. note::
+       Each code map requires two bytes per pixel of the scaled image for each used LBP extractor.
+       Since :py:attr:`FeatureExtractor.model_indices` are overwritten, please do not share the :py:attr:`extractor` of this cascade with other classifiers.
+
+    **Parameters:**
+
+    ``enable`` : bool
+      Enable or disable the code maps?
+    """
+    self.extractor.code_maps = enable
+    self._indices()
+
+
+  def flatten(self):
+    """flatten() -> stage_ends, feature_indices, look_up_tables, thresholds
+
+    Flattens this cascade into contiguous arrays, which can be evaluated by a :py:class:`CompiledCascade` without calling any :py:class:`bob.learn.boosting.BoostedMachine`.
+
+    The look-up-tables of all weak machines of all strong classifiers are concatenated, and each of them is multiplied with the weight of its weak machine.
+    The weak machines of a strong classifier are stored in the same order as in the strong classifier, so that the :py:class:`CompiledCascade` can sum them up in exactly the same order as :py:class:`bob.learn.boosting.BoostedMachine` does.
+
+    .. note::
+       Only cascades of univariate :py:class:`bob.learn.boosting.LUTMachine`\s can be flattened.
+
+    **Returns:**
+
+    ``stage_ends`` : :py:class:`numpy.ndarray` (1D, int32)
+      For each strong classifier, the index of the first weak machine of the next strong classifier
 
+    ``feature_indices`` : :py:class:`numpy.ndarray` (1D, int32)
+      The index of the feature that each weak machine uses
 
-  def prepare(self, image, scale):
+    ``look_up_tables`` : :py:class:`numpy.ndarray` (2D, float)
+      The weighted look-up-tables of all weak machines (one row per weak machine)
+
+    ``thresholds`` : :py:class:`numpy.ndarray` (1D, float)
+      The thresholds of the strong classifiers
+
+    Or ``None``, when this cascade contains weak machines that cannot be flattened.
+    """
+    weak_machines = [(classifier.weak_machines, classifier.weights) for classifier in self.cascade]
+    for weak, weights in weak_machines:
+      if weights.shape[1] != 1 or any(not isinstance(machine, bob.learn.boosting.LUTMachine) for machine in weak):
+        return None
+
+    # the look-up-tables need to have one entry for each possible feature value
+    entries = max([self.extractor.number_of_labels] + [machine.lut.shape[0] for weak, _ in weak_machines for machine in weak])
+    stage_ends = numpy.cumsum([0] + [len(weak) for weak, _ in weak_machines])[1:].astype(numpy.int32)
+    count = int(stage_ends[-1]) if len(stage_ends) else 0
+    feature_indices = numpy.zeros(count, numpy.int32)
+    look_up_tables = numpy.zeros((count, entries))
+
+    index = 0
+    for weak, weights in weak_machines:
+      for i, machine in enumerate(weak):
+        # pre-compute the weighted predictions of the weak machine for all feature values
+        lut = machine.lut
+        look_up_tables[index, :lut.shape[0]] = weights[i,0] * lut[:,0]
+        feature_indices[index] = machine.feature_indices()[0]
+        index += 1
+
+    return stage_ends, feature_indices, look_up_tables, numpy.array(self.thresholds, numpy.float64)
+
+
+  def compile(self):
+    """compile() -> compiled
+
+    Creates a :py:class:`CompiledCascade` from this cascade, which computes exactly the same predictions as :py:meth:`__call__`, but without calling any Python function.
+
+    **Returns:**
+
+    ``compiled`` : :py:class:`CompiledCascade` or ``None``
+      The compiled cascade, or ``None`` when this cascade cannot be flattened, see :py:meth:`flatten`
+    """
+    flat = self.flatten()
+    if flat is None:
+      return None
+    return CompiledCascade(*flat)
+
+
+  def prepare(self, image, scale, workspace = None):
     """Prepares the cascade for extracting features of the given image in the given scale.
 
+    If a ``workspace`` is given, the scaled image is stored in the ``workspace`` instead of the :py:attr:`extractor`, which is left untouched.
+    Hence, the same cascade can be used with different workspaces in different threads.
+
     **Parameters:**
 
-    ``image`` : array_like (2D, float)
-      The image from which features will be extracted
+    ``image`` : array_like (2D, float) or :py:class:`ImagePyramid`
+      The image from which features will be extracted; for an image pyramid, the scaled image is computed from its nearest octave
 
     ``scale`` : float
       The scale of the image, for which features will be extracted
+
+    ``workspace`` : :py:class:`Workspace` or ``None``
+      The workspace to prepare; if ``None``, the internal workspace of the :py:attr:`extractor` is prepared
     """
+    # compile the cascade before its first use, if it has changed
+    self._compiled
     # prepare the feature extractor with the given image and scale
-    self.extractor.prepare(image, scale)
+    if workspace is None:
+      self.extractor.prepare(image, scale)
+    else:
+      self.extractor.prepare(image, scale, workspace=workspace)
 
 
-  def __call__(self, bounding_box):
-    """__call__(bounding_box) -> sum
+  def __call__(self, bounding_box, workspace = None):
+    """__call__(bounding_box, [workspace]) -> sum
 
     Computes the classification result of this cascade for the given bounding_box.
 
@@ -153,18 +267,32 @@ class Cascade:
       The bounding box for which the features should be classified.
       Please assure that the bounding box is inside the image resolution at the scale that was set by the latest call to :py:meth:`prepare`.
 
+    ``workspace`` : :py:class:`Workspace` or ``None``
+      If given, the features are extracted from the image that this workspace was prepared with in :py:meth:`prepare`
+
     **Returns:**
 
     ``sum`` : float
       The sum of the cascaded classifiers (which might have been stopped before the last classifier)
     """
 
+    if workspace is not None:
+      if self._compiled is not None:
+        return self._compiled.predict(self.extractor, bounding_box, workspace)
+      # do not share the feature vector, which might be used in another thread
+      feature = numpy.zeros(self.extractor.number_of_features, numpy.uint16)
+    else:
+      feature = self.feature
+
     # computes the classification for the given bounding box
     result = 0.
     for i in range(len(self.indices)):
       # extract the features that we need for this round
-      self.extractor.extract_indexed(bounding_box, self.feature, self.indices[i])
-      result += self.cascade[i](self.feature)
+      if workspace is None:
+        self.extractor.extract_indexed(bounding_box, feature, self.indices[i])
+      else:
+        self.extractor.extract_indexed(bounding_box, feature, self.indices[i], workspace)
+      result += self.cascade[i](feature)
       if result < self.thresholds[i]:
         # break the cascade when the patch can already be rejected
         break
@@ -0,0 +1,144 @@
+import collections
+import threading
+import multiprocessing.pool
+
+from .._library import Workspace
+
+
+class DetectionPlan:
+  """This class stores everything that can be pre-computed to detect faces in images of a fixed resolution.
+
+  For a given image shape and :py:class:`Sampler`, the scales of the image and the scaled image shapes do not depend on the image content.
+  A detection plan computes them only once, and it can be passed to the detection functions, e.g., :py:func:`detect_single_face`, or to :py:meth:`Sampler.scan_cascade`, for all images of that shape.
+  Additionally, each thread that uses the plan gets its own :py:attr:`workspace`, so that the memory to scan the images is allocated only once per thread.
+  For scanning the scales in parallel, the plan keeps a :py:meth:`pool` of threads, so that the threads and their workspaces are reused for all images of that shape.
+
+  Usually, plans are not created directly, but obtained using :py:meth:`Sampler.plan`, which caches the most recently used plans.
+
+  **Constructor Documentation:**
+
+    Creates the detection plan for images of the given shape.
+
+    **Parameters:**
+
+    ``shape`` : (int, int) or (int, int, int)
+      The shape of the images; for color images, only the last two dimensions are considered
+
+    ``sampler`` : :py:class:`Sampler`
+      The sampler that defines the scales and the sampled bounding boxes
+  """
+
+  def __init__(self, shape, sampler):
+    self.shape = tuple(shape[-2:])
+    self.sampler = sampler
+    # compute the scales as the sampler does; only the shape of the image is used
+    self.m_scales = list(sampler._scales(self.shape))
+    self.m_local = threading.local()
+    # the thread pools of this plan, by number of threads, and the workspaces of their threads
+    self.m_pools = {}
+    self.m_pool_workspaces = []
+    self.m_lock = threading.Lock()
+
+
+  def __del__(self):
+    # the threads of the pools are stopped, when the plan is no longer used
+    for pool in self.m_pools.values():
+      pool.terminate()
+
+
+  @property
+  def scales(self):
+    """The list of ``(scale, scaled_image_shape)`` tuples, as yielded by :py:meth:`Sampler.scales`"""
+    return self.m_scales
+
+
+  @property
+  def workspace(self):
+    """The :py:class:`Workspace` of the current thread, which is created on first access"""
+    if not hasattr(self.m_local, "workspace"):
+      self.m_local.workspace = Workspace()
+    return self.m_local.workspace
+
+
+  @property
+  def pool_workspaces(self):
+    """The list of the :py:attr:`workspace`\s of the threads of all :py:meth:`pool`\s of this plan"""
+    with self.m_lock:
+      return list(self.m_pool_workspaces)
+
+
+  def pool(self, num_threads):
+    """pool(num_threads) -> pool
+
+    Returns the pool with the given number of threads, which is created on first use and kept with this plan.
+
+    Each thread of the pool creates its :py:attr:`workspace` when it is started.
+    Hence, scanning several images with the same pool allocates the memory of each thread only once, see :py:meth:`Sampler.scan_scales`.
+
+    **Parameters:**
+
+    ``num_threads`` : int
+      The number of threads of the pool
+
+    **Returns:**
+
+    ``pool`` : :py:class:`multiprocessing.pool.ThreadPool`
+      The thread pool
+    """
+    with self.m_lock:
+      if num_threads not in self.m_pools:
+        # the threads must not refer to the plan, so that they can be stopped when the plan is deleted
+        self.m_pools[num_threads] = multiprocessing.pool.ThreadPool(num_threads, _init_thread, (self.m_local, self.m_lock, self.m_pool_workspaces))
+      return self.m_pools[num_threads]
+
+
+  def check(self, image, sampler = None):
+    """check(image, [sampler]) -> None
+
+    Checks that this plan can be used for the given image (and sampler), and raises a :py:class:`ValueError` otherwise.
+
+    **Parameters:**
+
+    ``image`` : array_like (2D or 3D)
+      The image to detect faces in
+
+    ``sampler`` : :py:class:`Sampler` or ``None``
+      If given, the sampler that should be used to sample the bounding boxes
+    """
+    if tuple(image.shape[-2:]) != self.shape:
+      raise ValueError("The detection plan has been created for images of shape %s, but the image has shape %s" % (self.shape, image.shape))
+    if sampler is not None and sampler is not self.sampler and _key(self.shape, sampler) != _key(self.shape, self.sampler):
+      raise ValueError("The detection plan has been created for a different sampler")
+
+
+def _init_thread(local, lock, workspaces):
+  # creates the workspace of a thread of the pool of a detection plan
+  local.workspace = Workspace()
+  with lock:
+    workspaces.append(local.workspace)
+
+
+def _key(shape, sampler):
+  # the parameters that define a detection plan
+  roi = None if sampler.m_roi is None else sampler.m_roi.topleft_f + sampler.m_roi.size_f
+  return (tuple(shape[-2:]), sampler.m_patch_box.topleft_f + sampler.m_patch_box.size_f, sampler.m_scale_factor, sampler.m_lowest_scale, sampler.m_distance, roi, sampler.m_min_face_size, sampler.m_max_face_size)
+
+
+# the most recently used detection plans
+_plans = collections.OrderedDict()
+_plans_lock = threading.Lock()
+# the maximum number of cached detection plans
+cache_size = 8
+
+def get_plan(shape, sampler):
+  """Returns the (cached) detection plan for the given shape and sampler"""
+  key = _key(shape, sampler)
+  with _plans_lock:
+    plan = _plans.pop(key, None)
+    if plan is None:
+      plan = DetectionPlan(shape, sampler)
+    # mark the plan as most recently used, and remove the least recently used ones
+    _plans[key] = plan
+    while len(_plans) > cache_size:
+      _plans.popitem(last=False)
+  return plan
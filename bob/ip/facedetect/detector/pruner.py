@@ -0,0 +1,130 @@
+import numpy
+
+from .._library import BoxArray, prune_detections
+
+
+class StreamingPruner:
+  """This class prunes overlapping detections incrementally, while they are generated.
+
+  Instead of collecting all detections of an image and calling :py:func:`prune_detections` once, detections can be added one by one (e.g., from :py:meth:`Sampler.iterate_cascade`) or in arrays (e.g., from :py:meth:`Sampler.scan_scales`).
+  Added detections are collected in a buffer, and whenever the buffer contains ``buffer_size`` detections, the buffered detections are pruned together with the detections that have been kept so far.
+  Arrays of detections are split into chunks, so that the buffer never holds more than ``buffer_size`` detections.
+  Hence, besides the added arrays themselves, only the non-suppressed detections and at most ``buffer_size`` unpruned detections are stored at any time.
+
+  .. note::
+     When all detections fit into the buffer, the result is identical to :py:func:`prune_detections`.
+     Otherwise, a detection that is suppressed by a detection, which itself is later suppressed by a better detection, is not restored.
+     Hence, slightly less detections might be kept, but the best detection is always kept, and no two kept detections overlap by more than ``minimum_overlap``.
+
+  **Constructor Documentation:**
+
+    Creates an empty pruner.
+
+    **Parameters:**
+
+    ``minimum_overlap`` : float
+      The overlap threshold (Jaccard similarity), for which detections should be pruned, see :py:func:`prune_detections`
+
+    ``buffer_size`` : int
+      The number of unpruned detections that are collected before they are pruned
+  """
+
+  def __init__(self, minimum_overlap = 0.2, buffer_size = 4096):
+    self.minimum_overlap = minimum_overlap
+    self.buffer_size = buffer_size
+    self.m_predictions = numpy.ndarray((0,), numpy.float64)
+    self.m_boxes = numpy.ndarray((0,4), numpy.float64)
+    self.m_buffer = []
+    self.m_single = []
+    self.m_buffered = 0
+
+
+  def add(self, prediction, bounding_box):
+    """add(prediction, bounding_box) -> None
+
+    Adds a single detection.
+
+    **Parameters:**
+
+    ``prediction`` : float
+      The prediction value of the detection
+
+    ``bounding_box`` : :py:class:`BoundingBox`
+      The detected bounding box
+    """
+    self.m_single.append((prediction,) + bounding_box.topleft_f + bounding_box.size_f)
+    self.m_buffered += 1
+    if self.m_buffered >= self.buffer_size:
+      self.flush()
+
+
+  def add_all(self, predictions, bounding_boxes):
+    """add_all(predictions, bounding_boxes) -> None
+
+    Adds several detections at once.
+
+    When the detections do not fit into the buffer, they are added in chunks, and the buffer is pruned whenever it is full.
+
+    **Parameters:**
+
+    ``predictions`` : array_like (1D, float)
+      The prediction values of the detections
+
+    ``bounding_boxes`` : :py:class:`BoxArray` or array_like (2D, float)
+      The detected bounding boxes, one ``(top, left, height, width)`` row per prediction
+    """
+    if isinstance(bounding_boxes, BoxArray):
+      bounding_boxes = bounding_boxes.boxes
+    predictions = numpy.asarray(predictions, numpy.float64)
+    bounding_boxes = numpy.asarray(bounding_boxes, numpy.float64).reshape(len(predictions), 4)
+    start = 0
+    while start < len(predictions):
+      # fill up the buffer, and prune it when it is full
+      end = min(len(predictions), start + max(self.buffer_size - self.m_buffered, 1))
+      self.m_buffer.append((predictions[start:end], bounding_boxes[start:end]))
+      self.m_buffered += end - start
+      start = end
+      if self.m_buffered >= self.buffer_size:
+        self.flush()
+
+
+  def flush(self):
+    """flush() -> None
+
+    Prunes the buffered detections together with the detections that have been kept so far.
+    """
+    if not self.m_buffered:
+      return
+    predictions, boxes = [self.m_predictions] + [p for p, _ in self.m_buffer], [self.m_boxes] + [b for _, b in self.m_buffer]
+    if self.m_single:
+      single = numpy.array(self.m_single, numpy.float64)
+      predictions.append(single[:,0])
+      boxes.append(single[:,1:])
+    self.m_buffer = []
+    self.m_single = []
+    self.m_buffered = 0
+
+    pruned, self.m_predictions = prune_detections(BoxArray(numpy.concatenate(boxes)), numpy.concatenate(predictions), self.minimum_overlap)
+    self.m_boxes = pruned.boxes
+
+
+  def result(self):
+    """result() -> bounding_boxes, predictions
+
+    Prunes the buffered detections and returns all detections that have been kept, sorted by descending predictions.
+
+    **Returns:**
+
+    ``bounding_boxes`` : :py:class:`BoxArray`
+      The kept bounding boxes
+
+    ``predictions`` : :py:class:`numpy.ndarray` (1D, float)
+      The according prediction values
+    """
+    self.flush()
+    return BoxArray(self.m_boxes), self.m_predictions.copy()
+
+
+  def __len__(self):
+    """Returns the number of kept and buffered detections"""
+    return len(self.m_predictions) + self.m_buffered
@@ -1,8 +1,14 @@
 
 import math
-from .._library import BoundingBox
+from .._library import BoundingBox, ImagePyramid
+from .plan import get_plan
 
-import bob.ip.base
+import numpy
+
+
+def _scaled_shape(shape, scale):
+  # the shape of the image scaled with the given scale, as computed by bob.ip.base.scaled_output_shape
+  return tuple(shape[:-2]) + tuple(int(math.floor(s * scale + 0.5)) for s in shape[-2:])
 
 
 class Sampler:
@@ -23,19 +29,32 @@ class Sampler:
       image pyramids are computed using the given scale factor between two scales
 
     ``lowest_scale`` : float or None
-      patches which will be lower than the given scale times the image resolution will not be taken into account;
+      patches which will be lower than the given scale times the image resolution (or the resolution of the region of interest) will not be taken into account;
       if 0. all possible patches will be considered
 
     ``distance`` : int
       the distance in both horizontal and vertical direction to generate samples
+
+    ``roi`` : :py:class:`BoundingBox` or ``None``
+      if given, only bounding boxes inside this region of interest of the image are sampled;
+      the image is cropped to the region before it is scaled, see :py:meth:`crop`
+
+    ``min_face_size`` : float or ``None``
+      if given, only bounding boxes with at least the given height (in pixels of the original image) are sampled
+
+    ``max_face_size`` : float or ``None``
+      if given, only bounding boxes with at most the given height (in pixels of the original image) are sampled
   """
 
-  def __init__(self, patch_size = (24,20), scale_factor = math.pow(2., -1./16.), lowest_scale = math.pow(2., -6.), distance = 2):
+  def __init__(self, patch_size = (24,20), scale_factor = math.pow(2., -1./16.), lowest_scale = math.pow(2., -6.), distance = 2, roi = None, min_face_size = None, max_face_size = None):
 
     self.m_patch_box = BoundingBox((0, 0), patch_size)
     self.m_scale_factor = scale_factor
     self.m_lowest_scale = lowest_scale
     self.m_distance = distance
+    self.m_roi = roi
+    self.m_min_face_size = min_face_size
+    self.m_max_face_size = max_face_size
 
 
   def scales(self, image):
@@ -43,9 +62,12 @@ class Sampler:
 
     Computes the all possible scales for the given image and yields a tuple of the scale and the scaled image shape as an iterator.
 
+    When a region of interest is set, the scales are computed for the region, and the yielded shapes are the ones of the scaled region, see :py:meth:`crop`.
+    Scales, in which the sampled bounding boxes would be smaller than ``min_face_size`` or larger than ``max_face_size``, are skipped.
+
     **Parameters::**
 
-    ``image`` : array_like(2D or 3D)
+    ``image`` : array_like(2D or 3D) or :py:class:`ImagePyramid`
       The image, for which the scales should be computed
 
     **Yields:**
@@ -56,8 +78,20 @@ class Sampler:
     ``shape`` : (int, int) or (int, int, int)
       The shape of the image, when scaled with the current ``scale``
     """
+    return self._scales(image.shape, image if isinstance(image, ImagePyramid) else None)
+
+
+  def _scales(self, shape, pyramid = None):
+    # computes the scales for an image of the given shape, see scales; the scaled shapes of image pyramids are computed by the pyramid
+    bounds = self._bounds(shape)
+    if bounds is not None:
+      # only the region of interest is scaled
+      shape = tuple(shape[:-2]) + (bounds[2] - bounds[0], bounds[3] - bounds[1])
+      if shape[-2] <= 0 or shape[-1] <= 0:
+        return
+
     # compute the minimum scale so that the patch size still fits into the given image
-    minimum_scale = max(self.m_patch_box.size_f[0] / image.shape[-2], self.m_patch_box.size_f[1] / image.shape[-1])
+    minimum_scale = max(self.m_patch_box.size_f[0] / shape[-2], self.m_patch_box.size_f[1] / shape[-1])
     if self.m_lowest_scale:
       maximum_scale = min(minimum_scale / self.m_lowest_scale, 1.)
     else:
@@ -72,16 +106,78 @@ class Sampler:
         # image is smaller than the requested minimum size
         break
       current_scale_power -= 1.
-      scaled_image_shape = bob.ip.base.scaled_output_shape(image, scale)
+      face_size = self.m_patch_box.size_f[0] / scale
+      if self.m_min_face_size is not None and face_size < self.m_min_face_size:
+        # the bounding boxes of all further scales are even smaller
+        break
+      if self.m_max_face_size is not None and face_size > self.m_max_face_size:
+        continue
+      if bounds is None and pyramid is not None:
+        scaled_image_shape = pyramid.scaled_shape(scale)
+      else:
+        scaled_image_shape = _scaled_shape(shape, scale)
 
       # return both the scale and the scaled image size
       yield scale, scaled_image_shape
 
 
+  def crop(self, image):
+    """crop(image) -> cropped, offset
+
+    Crops the given image to the region of interest of this sampler.
+
+    The shapes yielded by :py:meth:`scales` are the ones of the cropped image, which is the image that needs to be prepared for the scales.
+    Bounding boxes sampled in the cropped image can be shifted by the returned ``offset`` to get the bounding boxes in the original image.
+    When no region of interest is set, or the region contains the whole image, the image itself is returned.
+
+    **Parameters:**
+
+    ``image`` : array_like(2D or 3D) or :py:class:`ImagePyramid`
+      The image to crop
+
+    **Returns:**
+
+    ``cropped`` : array_like(2D or 3D) or :py:class:`ImagePyramid`
+      The region of interest of the image; for image pyramids, a new pyramid is built for the region
+
+    ``offset`` : (int, int)
+      The top-left position of the region in the ``image``
+    """
+    bounds = self._bounds(image.shape)
+    if bounds is None or bounds == (0, 0) + tuple(image.shape[-2:]):
+      return image, (0, 0)
+    top, left, bottom, right = bounds
+    if isinstance(image, ImagePyramid):
+      return ImagePyramid(numpy.ascontiguousarray(image.octave(0)[top:bottom, left:right])), (top, left)
+    return numpy.ascontiguousarray(image[..., top:bottom, left:right]), (top, left)
+
+
+  def plan(self, shape):
+    """plan(shape) -> detection_plan
+
+    Returns the detection plan for images of the given shape using this sampler.
+
+    The plan contains the scales and the sampled bounding boxes for the given image shape, see :py:class:`DetectionPlan`.
+    The most recently used plans are cached, so that the plan is computed only once, when many images of the same shape are processed.
+
+    **Parameters:**
+
+    ``shape`` : (int, int) or (int, int, int)
+      The shape of the images
+
+    **Returns:**
+
+    ``detection_plan`` : :py:class:`DetectionPlan`
+      The detection plan for the given image shape
+    """
+    return get_plan(shape, self)
+
+
   def sample_scaled(self, shape):
     """sample_scaled(shape) -> bounding_box
 
     Yields an iterator that iterates over all sampled bounding boxes in the given (scaled) image shape.
+    When a region of interest is set, the bounding boxes are relative to the (scaled) region, as are the shapes yielded by :py:meth:`scales`.
 
     **Parameters:**
 
@@ -99,6 +195,28 @@ class Sampler:
         yield self.m_patch_box.shift((y,x))
 
 
+  def sample_scaled_offsets(self, shape):
+    """sample_scaled_offsets(shape) -> tops, lefts
+
+    Returns the top-left offsets of all bounding boxes that :py:meth:`sample_scaled` yields for the given (scaled) image shape, in the same order.
+
+    In opposition to :py:meth:`sample_scaled`, no :py:class:`BoundingBox` is created, so that the sampled bounding boxes can be processed with array operations, e.g., using a :py:class:`BoxArray`.
+
+    **Parameters:**
+
+    ``shape`` : (int, int) or (int, int, int)
+      The (current) shape of the (scaled) image
+
+    **Returns:**
+
+    ``tops, lefts`` : :py:class:`numpy.ndarray` (1D, int)
+      The top and left offsets of the sampled bounding boxes
+    """
+    patch = self.m_patch_box.bottomright
+    tops, lefts = numpy.meshgrid(numpy.arange(0, shape[-2] - patch[0], self.m_distance, dtype=numpy.int32), numpy.arange(0, shape[-1] - patch[1], self.m_distance, dtype=numpy.int32), indexing='ij')
+    return tops.flatten(), lefts.flatten()
+
+
   def sample(self, image):
     """sample(image) -> bounding_box
 
@@ -114,11 +232,12 @@ class Sampler:
     ``bounding_box`` : :py:class:`BoundingBox`
       An iterator iterating over all bounding boxes for the given ``image``
     """
+    offset = self._offset(image.shape)
     for scale, scaled_image_shape in self.scales(image):
       # prepare the feature extractor to extract features from the given image
       for bb in self.sample_scaled(scaled_image_shape):
         # extract features for
-        yield bb.scale(1./scale)
+        yield self._original(bb, scale, offset)
 
 
   def iterate(self, image, feature_extractor, feature_vector):
@@ -144,17 +263,19 @@ class Sampler:
     ``bounding_box`` : :py:class:`BoundingBox`
       The bounding box for which the current features are extracted for
     """
-    for scale, scaled_image_shape in self.scales(image):
+    scales = self.scales(image)
+    image, offset = self.crop(image)
+    for scale, scaled_image_shape in scales:
       # prepare the feature extractor to extract features from the given image
       feature_extractor.prepare(image, scale)
       for bb in self.sample_scaled(scaled_image_shape):
         # extract features for
         feature_extractor.extract_indexed(bb, feature_vector)
-        yield bb.scale(1./scale)
+        yield self._original(bb, scale, offset)
 
 
-  def iterate_cascade(self, cascade, image, threshold = None):
-    """iterate_cascade(self, cascade, image, [threshold]) -> prediction, bounding_box
+  def iterate_cascade(self, cascade, image, threshold = None, workspace = None, plan = None):
+    """iterate_cascade(self, cascade, image, [threshold], [workspace], [plan]) -> prediction, bounding_box
 
     Iterates over the given image and computes the cascade of classifiers.
     This function will compute the cascaded classification result for the given ``image`` using the given ``cascade``.
@@ -170,12 +291,18 @@ class Sampler:
     ``cascade`` : :py:class:`Cascade`
       The cascade that performs the predictions
 
-    ``image`` : array_like(2D)
-      The image for which the predictions should be computed
+    ``image`` : array_like(2D) or :py:class:`ImagePyramid`
+      The image for which the predictions should be computed; if an image pyramid is given, the scaled images are computed from its octaves
 
     ``threshold`` : float
       The threshold, which limits the number of predictions
 
+    ``workspace`` : :py:class:`Workspace` or ``None``
+      If given, the scaled images are stored in this workspace, and the :py:attr:`Cascade.extractor` is not modified
+
+    ``plan`` : :py:class:`DetectionPlan` or ``None``
+      If given, the pre-computed scales of this plan are used, and its :py:attr:`DetectionPlan.workspace` is used when no ``workspace`` is given
+
     **Yields:**
 
     ``prediction`` : float
@@ -185,11 +312,268 @@ class Sampler:
       An iterator over all possible sampled bounding boxes (which exceed the prediction ``threshold``, if given)
     """
 
-    for scale, scaled_image_shape in self.scales(image):
+    scales, workspace = self._plan(image, plan, workspace)
+    image, offset = self.crop(image)
+    image = self._source(cascade, image)
+    for scale, scaled_image_shape in scales:
       # prepare the feature extractor to extract features from the given image
-      cascade.prepare(image, scale)
+      cascade.prepare(image, scale, workspace)
       for bb in self.sample_scaled(scaled_image_shape):
         # return the prediction and the bounding box, if the prediction is over threshold
-        prediction = cascade(bb)
+        prediction = cascade(bb, workspace)
         if threshold is None or prediction > threshold:
-          yield prediction, bb.scale(1./scale)
+          yield prediction, self._original(bb, scale, offset)
+
+
+  def scan_cascade(self, cascade, image, threshold = None, breadth_first = False, num_threads = 1, workspace = None, plan = None):
+    """scan_cascade(cascade, image, [threshold], [breadth_first], [num_threads], [workspace], [plan]) -> predictions, bounding_boxes
+
+    Computes the cascaded classification result for all sampled bounding boxes in the given ``image`` at once.
+    This function samples the same bounding boxes and computes the same predictions as :py:meth:`iterate_cascade`, but the patches of each scale are evaluated in C++ by :py:meth:`CompiledCascade.scan`.
+    Hence, no Python object is created for patches that are rejected, and the results are returned as arrays.
+
+    When ``breadth_first`` is enabled, the patches of each scale are not evaluated one after the other, but stage by stage: the first stage is evaluated for all patches, then the next stage is evaluated for the patches that have not been rejected, and so on.
+    Both ways compute identical predictions.
+
+    When ``num_threads`` is greater than 1, the scales are distributed over a pool of threads.
+    All threads share the :py:attr:`Cascade.extractor`, but each thread prepares the scaled images in its own :py:class:`Workspace`, and the GIL is released while preparing and scanning the scaled images.
+    The results are merged in the order of the scales, so that they are identical to the ones computed in a single thread.
+    In a single thread, the scaled images are prepared in the given ``workspace``, or in the internal workspace of the :py:attr:`Cascade.extractor`, if no ``workspace`` is given.
+
+    When the :py:attr:`FeatureExtractor.scale_blocks` of the :py:attr:`Cascade.extractor` are enabled, a given image is converted into an :py:class:`ImagePyramid` with a single octave, so that the integral image of the full resolution image is computed only once for all scales.
+    To compute the integral images of the octaves instead, pass an :py:class:`ImagePyramid`.
+    When the :py:attr:`FeatureExtractor.compact` form is enabled as well, uint8 images are not converted, and the scaled blocks are extracted from their integer integral images, which are computed for each scale.
+
+    If the ``cascade`` cannot be compiled (see :py:meth:`Cascade.compile`), :py:meth:`iterate_cascade` is used instead.
+
+    **Parameters:**
+
+    ``cascade`` : :py:class:`Cascade`
+      The cascade that performs the predictions
+
+    ``image`` : array_like(2D) or :py:class:`ImagePyramid`
+      The image for which the predictions should be computed; if an image pyramid is given, the scaled images are computed from its octaves
+
+    ``threshold`` : float
+      The threshold, which limits the number of predictions
+
+    ``breadth_first`` : bool
+      Evaluate the patches stage by stage?
+
+    ``num_threads`` : int
+      The number of threads to use to scan the scales in parallel
+
+    ``workspace`` : :py:class:`Workspace` or ``None``
+      The workspace to use when scanning in a single thread, so that the :py:attr:`Cascade.extractor` is not modified
+
+    ``plan`` : :py:class:`DetectionPlan` or ``None``
+      If given, the pre-computed scales of this plan are used, and its :py:attr:`DetectionPlan.workspace` is used when no ``workspace`` is given
+
+    **Returns:**
+
+    ``predictions`` : :py:class:`numpy.ndarray` (1D, float)
+      The prediction values of all bounding boxes (which exceed the prediction ``threshold``, if given)
+
+    ``bounding_boxes`` : :py:class:`numpy.ndarray` (2D, float)
+      The according bounding boxes in the original ``image``, one ``(top, left, height, width)`` row per prediction
+    """
+    if cascade._compiled is None:
+      detections = list(self.iterate_cascade(cascade, image, threshold, workspace, plan))
+      predictions = numpy.array([prediction for prediction, _ in detections], numpy.float64)
+      bounding_boxes = numpy.array([bb.topleft_f + bb.size_f for _, bb in detections], numpy.float64).reshape(len(detections), 4)
+      return predictions, bounding_boxes
+
+    results = list(self.scan_scales(cascade, image, threshold, breadth_first, num_threads, workspace, plan))
+    if not results:
+      return numpy.ndarray((0,), numpy.float64), numpy.ndarray((0,4), numpy.float64)
+    return numpy.concatenate([p for p, _ in results]), numpy.concatenate([b for _, b in results])
+
+
+  def scan_scales(self, cascade, image, threshold = None, breadth_first = False, num_threads = 1, workspace = None, plan = None):
+    """scan_scales(cascade, image, [threshold], [breadth_first], [num_threads], [workspace], [plan]) -> predictions, bounding_boxes
+
+    Computes the same predictions as :py:meth:`scan_cascade`, but yields the results separately for each scale of the image.
+    Hence, the results of the scales can be processed (e.g., pruned by a :py:class:`StreamingPruner`) while the image is scanned, without storing the detections of all scales at once.
+
+    When ``num_threads`` is greater than 1, the scales are scanned in parallel threads as in :py:meth:`scan_cascade`, but the results are still yielded in the order of the scales.
+    The threads are taken from the :py:meth:`DetectionPlan.pool` of the given ``plan`` (or of the cached plan for the image shape, see :py:meth:`plan`), and each thread uses its own :py:attr:`DetectionPlan.workspace`; the ``workspace`` parameter is only used in a single thread.
+    If the ``cascade`` cannot be compiled (see :py:meth:`Cascade.compile`), the bounding boxes are evaluated as in :py:meth:`iterate_cascade`.
+
+    **Parameters:**
+
+    ``cascade`` : :py:class:`Cascade`
+      The cascade that performs the predictions
+
+    ``image`` : array_like(2D) or :py:class:`ImagePyramid`
+      The image for which the predictions should be computed; if an image pyramid is given, the scaled images are computed from its octaves
+
+    ``threshold`` : float
+      The threshold, which limits the number of predictions
+
+    ``breadth_first`` : bool
+      Evaluate the patches stage by stage?
+
+    ``num_threads`` : int
+      The number of threads to use to scan the scales in parallel
+
+    ``workspace`` : :py:class:`Workspace` or ``None``
+      The workspace to use when scanning in a single thread, so that the :py:attr:`Cascade.extractor` is not modified
+
+    ``plan`` : :py:class:`DetectionPlan` or ``None``
+      If given, the pre-computed scales of this plan are used, and its :py:attr:`DetectionPlan.workspace` is used when no ``workspace`` is given
+
+    **Yields:**
+
+    ``predictions`` : :py:class:`numpy.ndarray` (1D, float)
+      The prediction values of the bounding boxes in the current scale (which exceed the prediction ``threshold``, if given)
+
+    ``bounding_boxes`` : :py:class:`numpy.ndarray` (2D, float)
+      The according bounding boxes in the original ``image``, one ``(top, left, height, width)`` row per prediction
+    """
+    scales, workspace = self._plan(image, plan, workspace)
+    if num_threads > 1 and plan is None:
+      # the threads and their workspaces are kept with the (cached) plan for this image shape
+      plan = self.plan(image.shape)
+    image, offset = self.crop(image)
+    image = self._source(cascade, image)
+    if cascade._compiled is None:
+      for scale, scaled_image_shape in scales:
+        cascade.prepare(image, scale, workspace)
+        predictions, bounding_boxes = [], []
+        for bb in self.sample_scaled(scaled_image_shape):
+          prediction = cascade(bb, workspace)
+          if threshold is None or prediction > threshold:
+            bb = self._original(bb, scale, offset)
+            predictions.append(prediction)
+            bounding_boxes.append(bb.topleft_f + bb.size_f)
+        yield numpy.array(predictions, numpy.float64), numpy.array(bounding_boxes, numpy.float64).reshape(len(predictions), 4)
+      return
+
+    scales = [scale for scale, _ in scales]
+
+    if num_threads > 1 and len(scales) > 1:
+      # the extractor is shared, but each thread of the pool of the plan uses its own workspace to store the prepared image
+      def _scan(scale):
+        return self._scan_scale(cascade._compiled, cascade.extractor, image, scale, threshold, breadth_first, plan.workspace, offset)
+      # the results are returned in the order of the scales
+      for result in plan.pool(min(num_threads, len(scales))).imap(_scan, scales, 1):
+        yield result
+    else:
+      for scale in scales:
+        yield self._scan_scale(cascade._compiled, cascade.extractor, image, scale, threshold, breadth_first, workspace, offset)
+
+
+  def search_cascade(self, cascade, image, margin = None, workspace = None, plan = None):
+    """search_cascade(cascade, image, [margin], [workspace], [plan]) -> predictions, bounding_boxes
+
+    Computes the bounding boxes with the highest predictions of the cascade in the given ``image``.
+
+    This function samples the same bounding boxes as :py:meth:`scan_cascade`, but it returns only bounding boxes with a prediction above ``max(0, best - margin)``, where ``best`` is the highest prediction in the ``image``.
+    While scanning, the best prediction so far is tracked, and the evaluation of a bounding box is stopped as soon as its prediction cannot reach this value anymore, see :py:meth:`CompiledCascade.scan_best`.
+    Hence, the predictions of the returned bounding boxes are identical to the ones of :py:meth:`scan_cascade`, but much less cascade stages need to be evaluated.
+
+    When ``margin`` is ``None``, all bounding boxes with positive predictions are returned, i.e., the ones that are used by :py:func:`best_detection`.
+
+    If the ``cascade`` cannot be compiled (see :py:meth:`Cascade.compile`), :py:meth:`scan_cascade` is used, and the results are filtered accordingly.
+
+    **Parameters:**
+
+    ``cascade`` : :py:class:`Cascade`
+      The cascade that performs the predictions
+
+    ``image`` : array_like(2D) or :py:class:`ImagePyramid`
+      The image for which the predictions should be computed; if an image pyramid is given, the scaled images are computed from its octaves
+
+    ``margin`` : float or ``None``
+      Only bounding boxes with a prediction of at most this value below the best prediction are returned
+
+    ``workspace`` : :py:class:`Workspace` or ``None``
+      The workspace to use, so that the :py:attr:`Cascade.extractor` is not modified
+
+    ``plan`` : :py:class:`DetectionPlan` or ``None``
+      If given, the pre-computed scales of this plan are used, and its :py:attr:`DetectionPlan.workspace` is used when no ``workspace`` is given
+
+    **Returns:**
+
+    ``predictions`` : :py:class:`numpy.ndarray` (1D, float)
+      The prediction values of the returned bounding boxes
+
+    ``bounding_boxes`` : :py:class:`numpy.ndarray` (2D, float)
+      The according bounding boxes in the original ``image``, one ``(top, left, height, width)`` row per prediction
+    """
+    if cascade._compiled is None:
+      predictions, bounding_boxes = self.scan_cascade(cascade, image, 0, workspace=workspace, plan=plan)
+    else:
+      scales, workspace = self._plan(image, plan, workspace)
+      image, offset = self.crop(image)
+      image = self._source(cascade, image)
+      best = None
+      results = []
+      for scale, _ in scales:
+        if workspace is None:
+          cascade.extractor.prepare(image, scale)
+        else:
+          cascade.extractor.prepare(image, scale, workspace=workspace)
+        predictions, tops, lefts, best = cascade._compiled.scan_best(cascade.extractor, scale, self.m_patch_box.bottomright, self.m_distance, margin, best, workspace)
+        sizes = numpy.tile(self.m_patch_box.scale(1./scale).size_f, (len(predictions), 1))
+        results.append((predictions, numpy.hstack((tops[:,None] + offset[0], lefts[:,None] + offset[1], sizes))))
+      if not results:
+        return numpy.ndarray((0,), numpy.float64), numpy.ndarray((0,4), numpy.float64)
+      predictions, bounding_boxes = numpy.concatenate([p for p, _ in results]), numpy.concatenate([b for _, b in results])
+
+    if margin is not None and len(predictions):
+      # remove the bounding boxes that have been found before the best one
+      keep = predictions > max(0., predictions.max() - margin)
+      predictions, bounding_boxes = predictions[keep], bounding_boxes[keep]
+    return predictions, bounding_boxes
+
+
+  def _bounds(self, shape):
+    # the top, left, bottom and right of the region of interest inside an image of the given shape
+    if self.m_roi is None:
+      return None
+    top, left = self.m_roi.topleft
+    bottom, right = self.m_roi.bottomright
+    return max(top, 0), max(left, 0), min(bottom, shape[-2]), min(right, shape[-1])
+
+
+  def _offset(self, shape):
+    # the offset of the region of interest in an image of the given shape
+    bounds = self._bounds(shape)
+    return (0, 0) if bounds is None else bounds[:2]
+
+
+  def _original(self, bounding_box, scale, offset):
+    # transforms the bounding box sampled in the scaled region into the original image
+    bounding_box = bounding_box.scale(1./scale)
+    return bounding_box.shift(offset) if offset != (0, 0) else bounding_box
+
+
+  def _source(self, cascade, image):
+    # when the blocks of the LBP extractors are scaled, the integral image of the full resolution image is computed only once;
+    # compact uint8 images are kept, so that their integer integral images are used instead
+    if cascade.extractor.scale_blocks and not isinstance(image, ImagePyramid):
+      if cascade.extractor.compact and numpy.asarray(image).dtype == numpy.uint8:
+        return image
+      return ImagePyramid(image, 1)
+    return image
+
+
+  def _plan(self, image, plan, workspace):
+    # returns the scales of the image and the workspace to use
+    if plan is None:
+      return self.scales(image), workspace
+    plan.check(image, self)
+    return plan.scales, plan.workspace if workspace is None else workspace
+
+
+  def _scan_scale(self, compiled, extractor, image, scale, threshold, breadth_first, workspace = None, offset = (0, 0)):
+    # scans the given image in the given scale and returns the predictions and bounding boxes
+    if workspace is None:
+      extractor.prepare(image, scale)
+      predictions, tops, lefts = compiled.scan(extractor, scale, self.m_patch_box.bottomright, self.m_distance, threshold, breadth_first)
+    else:
+      extractor.prepare(image, scale, workspace=workspace)
+      predictions, tops, lefts = compiled.scan(extractor, scale, self.m_patch_box.bottomright, self.m_distance, threshold, breadth_first, workspace)
+    sizes = numpy.tile(self.m_patch_box.scale(1./scale).size_f, (len(predictions), 1))
+    return predictions, numpy.hstack((tops[:,None] + offset[0], lefts[:,None] + offset[1], sizes))
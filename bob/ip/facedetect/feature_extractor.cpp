@@ -28,7 +28,7 @@ static auto FeatureExtractor_doc = bob::extension::ClassDoc(
     "Please use the :py:meth:`append` function to add LBP extractors.\n"
     "* In the second constructor, a given list of LBP extractors is specified.\n"
     "* The third constructor initializes a tight set of LBP extractors for different :py:attr:`bob.ip.base.LBP.radii`, by adding all possible combinations of x- and y- radii, until the ``patch_size`` is too small, or ``min_size`` (start) or ``max_size`` (end) is reached.\n"
-    "* The fourth constructor copies all LBP extractors from the given :py:class:`FeatureExtractor`\n"
+    "* The fourth constructor copies all LBP extractors from the given :py:class:`FeatureExtractor`; the copy shares no memory with ``other``, so both can be used in different threads\n"
     "* The last constructor read the configuration from the given :py:class:`bob.io.base.HDF5File`.",
     true
   )
@@ -150,12 +150,16 @@ PyObject* FeatureExtractor_Str(FeatureExtractorObject* self) {
 
 static auto image = bob::extension::VariableDoc(
   "image",
-  "array_like <2D, uint8>",
-  "The (prepared) image the next features will be extracted from, read access only"
+  "array_like <2D, float or uint8>",
+  "The (prepared) image the next features will be extracted from, read access only",
+  "A copy of the image is returned, since the memory is reused by the next call to :py:meth:`prepare`. "
+  "When the blocks of the LBP extractors are scaled (see :py:attr:`scale_blocks`), this is the unscaled image (or the octave of the image pyramid) that the features are extracted from. "
+  "When the image has been prepared in :py:attr:`compact` form, the image is of type uint8."
 );
 PyObject* PyBobIpFacedetectFeatureExtractor_image(PyBobIpFacedetectFeatureExtractorObject* self, void*){
   BOB_TRY
-  return PyBlitzArrayCxx_AsConstNumpy(self->cxx->getImage());
+  if (self->cxx->getWorkspace().isCompact()) return PyBlitzArrayCxx_AsNumpy(self->cxx->getWorkspace().getCompactImage().copy());
+  return PyBlitzArrayCxx_AsNumpy(self->cxx->getImage().copy());
   BOB_CATCH_MEMBER("image could not be read", 0)
 }
 
@@ -226,6 +230,84 @@ PyObject* PyBobIpFacedetectFeatureExtractor_extractors(PyBobIpFacedetectFeatureE
   BOB_CATCH_MEMBER("extractors could not be read", 0)
 }
 
+static auto code_maps = bob::extension::VariableDoc(
+  "code_maps",
+  "bool",
+  "Should dense LBP code maps be computed in :py:meth:`prepare`? read and write access",
+  "When enabled, :py:meth:`prepare` computes the LBP codes for all pixels of the prepared image, once for each LBP extractor that is used by :py:attr:`model_indices` (or for all extractors, when no :py:attr:`model_indices` are set). "
+  "Afterward, the features used by the :py:class:`CompiledCascade` are simple look-ups into these code maps, instead of being re-computed for each overlapping patch. "
+  "The codes are identical to the ones extracted without code maps. "
+  "For rectangular (not circular) LBP's with 4 or 8 neighbors, the codes of whole image rows are computed at once, using the vector instructions of the CPU where possible.\n\n"
+  ".. note:: Each code map requires two bytes per pixel of the prepared image, for each used LBP extractor."
+);
+PyObject* PyBobIpFacedetectFeatureExtractor_get_code_maps(PyBobIpFacedetectFeatureExtractorObject* self, void*){
+  BOB_TRY
+  if (self->cxx->getUseCodeMaps()) Py_RETURN_TRUE;
+  Py_RETURN_FALSE;
+  BOB_CATCH_MEMBER("code_maps could not be read", 0)
+}
+int PyBobIpFacedetectFeatureExtractor_set_code_maps(PyBobIpFacedetectFeatureExtractorObject* self, PyObject* value, void*){
+  BOB_TRY
+  int r = PyObject_IsTrue(value);
+  if (r < 0) return -1;
+  self->cxx->setUseCodeMaps(r > 0);
+  return 0;
+  BOB_CATCH_MEMBER("code_maps could not be set", -1)
+}
+
+static auto scale_blocks = bob::extension::VariableDoc(
+  "scale_blocks",
+  "bool",
+  "Should the blocks of multi-block LBP extractors be scaled instead of the image? read and write access",
+  "When enabled, :py:meth:`prepare` does not scale the image for scales smaller than 1. "
+  "Instead, the integral image is computed for the image itself, or, when an :py:class:`ImagePyramid` is prepared, for the smallest octave that is at least as large as the scaled image. "
+  "The integral image of an octave is computed only once, when the following scales use the same octave. "
+  "Features are extracted by scaling the positions, block sizes and block overlaps of the LBP extractors from the requested scale to the prepared image, where block sizes are rounded to full pixels. "
+  "Hence, the extracted features (and the predictions of a cascade) only approximate the ones of the scaled image; use the ``benchmark_block_scaling.py`` script to compare both on your images.\n\n"
+  ".. note:: Only multi-block LBP extractors can be scaled. "
+  "Images are still scaled for scales of 1 and above, when :py:attr:`code_maps` are enabled, and when the integral square image is requested in :py:meth:`prepare`."
+);
+PyObject* PyBobIpFacedetectFeatureExtractor_get_scale_blocks(PyBobIpFacedetectFeatureExtractorObject* self, void*){
+  BOB_TRY
+  if (self->cxx->getScaleBlocks()) Py_RETURN_TRUE;
+  Py_RETURN_FALSE;
+  BOB_CATCH_MEMBER("scale_blocks could not be read", 0)
+}
+int PyBobIpFacedetectFeatureExtractor_set_scale_blocks(PyBobIpFacedetectFeatureExtractorObject* self, PyObject* value, void*){
+  BOB_TRY
+  int r = PyObject_IsTrue(value);
+  if (r < 0) return -1;
+  self->cxx->setScaleBlocks(r > 0);
+  return 0;
+  BOB_CATCH_MEMBER("scale_blocks could not be set", -1)
+}
+
+static auto compact = bob::extension::VariableDoc(
+  "compact",
+  "bool",
+  "Should uint8 images be prepared in compact form? read and write access",
+  "When enabled, :py:meth:`prepare` does not convert uint8 images to double precision, when they are prepared in scale 1. "
+  "Instead, the image is kept as uint8, and the integral image and the integral square image are computed as uint32 and uint64, respectively, which reduces the memory by a factor of 4 to 8. "
+  "Since all sums are exact, the LBP codes are identical to the ones extracted in double precision.\n\n"
+  "When the LBP blocks are scaled (see :py:attr:`scale_blocks`), the image is kept in full resolution, so it is prepared in compact form in any scale, and the scaled blocks are extracted from the uint32 integral image.\n\n"
+  ".. note:: Otherwise, only scale 1 is prepared in compact form, since scaled images would need to be rounded to uint8, which would change the LBP codes. "
+  "Images in other scales, images of other types, image pyramids and images with more than 16 million pixels are always prepared in double precision."
+);
+PyObject* PyBobIpFacedetectFeatureExtractor_get_compact(PyBobIpFacedetectFeatureExtractorObject* self, void*){
+  BOB_TRY
+  if (self->cxx->getCompact()) Py_RETURN_TRUE;
+  Py_RETURN_FALSE;
+  BOB_CATCH_MEMBER("compact could not be read", 0)
+}
+int PyBobIpFacedetectFeatureExtractor_set_compact(PyBobIpFacedetectFeatureExtractorObject* self, PyObject* value, void*){
+  BOB_TRY
+  int r = PyObject_IsTrue(value);
+  if (r < 0) return -1;
+  self->cxx->setCompact(r > 0);
+  return 0;
+  BOB_CATCH_MEMBER("compact could not be set", -1)
+}
+
 static auto patch_size = bob::extension::VariableDoc(
   "patch_size",
   "(int, int)",
@@ -274,6 +356,27 @@ static PyGetSetDef PyBobIpFacedetectFeatureExtractor_getseters[] = {
       extractors.doc(),
       0
     },
+    {
+      code_maps.name(),
+      (getter)PyBobIpFacedetectFeatureExtractor_get_code_maps,
+      (setter)PyBobIpFacedetectFeatureExtractor_set_code_maps,
+      code_maps.doc(),
+      0
+    },
+    {
+      scale_blocks.name(),
+      (getter)PyBobIpFacedetectFeatureExtractor_get_scale_blocks,
+      (setter)PyBobIpFacedetectFeatureExtractor_set_scale_blocks,
+      scale_blocks.doc(),
+      0
+    },
+    {
+      compact.name(),
+      (getter)PyBobIpFacedetectFeatureExtractor_get_compact,
+      (setter)PyBobIpFacedetectFeatureExtractor_set_compact,
+      compact.doc(),
+      0
+    },
     {
       patch_size.name(),
       (getter)PyBobIpFacedetectFeatureExtractor_patch_size,
@@ -381,36 +484,76 @@ static auto prepare = bob::extension::FunctionDoc(
   "prepare",
   "Take the given image to perform the next extraction steps for the given scale",
   "If ``compute_integral_square_image`` is enabled, the (internally stored) integral square image is computed as well. "
-  "This image is required to compute the variance of the pixels in a given patch, see :py:func:`mean_variance`",
+  "This image is required to compute the variance of the pixels in a given patch, see :py:func:`mean_variance`. "
+  "The GIL is released during the preparation, so that different extractors can be prepared in different threads",
   true
 )
-.add_prototype("image, scale, [compute_integral_square_image]")
-.add_parameter("image", "array_like <2D, uint8 or float>", "The image that should be used in the next extraction step")
+.add_prototype("image, scale, [compute_integral_square_image], [workspace]")
+.add_parameter("image", "array_like <2D, uint8 or float> or :py:class:`ImagePyramid`", "The image that should be used in the next extraction step; if an image pyramid is given, the scaled image is computed from its nearest octave; uint8 images are kept in uint8, when :py:attr:`compact` is enabled")
 .add_parameter("scale", "float", "The scale of the image to extract")
 .add_parameter("compute_integral_square_image", "bool", "[Default: ``False``] : Enable the computation of the integral square image")
+.add_parameter("workspace", ":py:class:`Workspace`", "[Default: ``None``] : If given, the given workspace is prepared instead of the internal one; this extractor is not modified")
 ;
 static PyObject* PyBobIpFacedetectFeatureExtractor_prepare(PyBobIpFacedetectFeatureExtractorObject* self, PyObject* args, PyObject* kwargs) {
   BOB_TRY
   char** kwlist = prepare.kwlist();
 
-  PyBlitzArrayObject* image;
+  PyObject* object;
   double scale;
   PyObject* cisi = 0;
-  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O&d|O!", kwlist, &PyBlitzArray_Converter, &image, &scale, &PyBool_Type, &cisi)){
+  PyBobIpFacedetectWorkspaceObject* workspace = 0;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "Od|O!O!", kwlist, &object, &scale, &PyBool_Type, &cisi, &PyBobIpFacedetectWorkspace_Type, &workspace)){
+    return 0;
+  }
+  // the image pyramid, or the image
+  PyBobIpFacedetectImagePyramidObject* pyramid = 0;
+  PyBlitzArrayObject* image = 0;
+  if (PyBobIpFacedetectImagePyramid_Check(object)){
+    pyramid = reinterpret_cast<PyBobIpFacedetectImagePyramidObject*>(object);
+  } else if (!PyBlitzArray_Converter(object, &image)){
     return 0;
   }
-  auto image_ = make_safe(image);
-  if (image->ndim != 2){
+  auto image_ = make_xsafe(image);
+  if (image && image->ndim != 2){
     PyErr_Format(PyExc_TypeError, "%s : The input image must be 2D, not %dD", Py_TYPE(self)->tp_name, (int)image->ndim);
     return 0;
   }
-  switch (image->type_num){
-    case NPY_UINT8: self->cxx->prepare(*PyBlitzArrayCxx_AsBlitz<uint8_t,2>(image), scale, f(cisi)); Py_RETURN_NONE;
-    case NPY_FLOAT64: self->cxx->prepare(*PyBlitzArrayCxx_AsBlitz<double,2>(image), scale, f(cisi)); Py_RETURN_NONE;
-    default:
-      PyErr_Format(PyExc_TypeError, "%s : The input image must be of type uint8 or float", Py_TYPE(self)->tp_name);
-      return 0;
+  if (image && image->type_num != NPY_UINT8 && image->type_num != NPY_FLOAT64){
+    PyErr_Format(PyExc_TypeError, "%s : The input image must be of type uint8 or float", Py_TYPE(self)->tp_name);
+    return 0;
   }
+  // release the GIL, so that several extractors can be prepared in parallel
+  bool compute_square = f(cisi);
+  std::string error;
+  Py_BEGIN_ALLOW_THREADS
+  try {
+    if (pyramid){
+      if (workspace){
+        const bob::ip::facedetect::FeatureExtractor& extractor = *self->cxx;
+        extractor.prepare(*pyramid->cxx, scale, compute_square, *workspace->cxx);
+      } else {
+        self->cxx->prepare(*pyramid->cxx, scale, compute_square);
+      }
+    } else if (workspace){
+      const bob::ip::facedetect::FeatureExtractor& extractor = *self->cxx;
+      switch (image->type_num){
+        case NPY_UINT8: extractor.prepare(*PyBlitzArrayCxx_AsBlitz<uint8_t,2>(image), scale, compute_square, *workspace->cxx); break;
+        case NPY_FLOAT64: extractor.prepare(*PyBlitzArrayCxx_AsBlitz<double,2>(image), scale, compute_square, *workspace->cxx); break;
+      }
+    } else {
+      switch (image->type_num){
+        case NPY_UINT8: self->cxx->prepare(*PyBlitzArrayCxx_AsBlitz<uint8_t,2>(image), scale, compute_square); break;
+        case NPY_FLOAT64: self->cxx->prepare(*PyBlitzArrayCxx_AsBlitz<double,2>(image), scale, compute_square); break;
+      }
+    }
+  } catch (std::exception& e) {
+    error = e.what();
+  } catch (...) {
+    error = "unknown exception";
+  }
+  Py_END_ALLOW_THREADS
+  if (!error.empty()) throw std::runtime_error(error);
+  Py_RETURN_NONE;
   BOB_CATCH_MEMBER("cannot prepare image", 0)
 }
 
@@ -445,16 +588,47 @@ static PyObject* PyBobIpFacedetectFeatureExtractor_extract_all(PyBobIpFacedetect
   BOB_CATCH_MEMBER("cannot extract all features", 0)
 }
 
+static auto extract_all_batch = bob::extension::FunctionDoc(
+  "extract_all_batch",
+  "Extracts all features of several bounding boxes into the given dataset of (training) features",
+  "This function computes the same features as calling :py:meth:`extract_all` for each of the bounding boxes, where the features of the i-th bounding box are written to the i-th row of the ``dataset``. "
+  "Instead of extracting the LBP codes of each bounding box separately, the LBP codes of all extractors are computed only once for the whole prepared image (see :py:attr:`code_maps`), and the features of the bounding boxes are gathered from these codes. "
+  "The codes are kept until the next call to :py:meth:`prepare`, so that several calls for the same prepared image compute the codes only once.\n\n"
+  ".. note:: The LBP codes require two bytes per pixel of the prepared image, for each LBP extractor.",
+  true
+)
+.add_prototype("boxes, dataset")
+.add_parameter("boxes", ":py:class:`BoxArray`", "The bounding boxes, for which the features should be extracted")
+.add_parameter("dataset", "array_like <2D, uint16>", "The (training) dataset, into which the features should be extracted; must be of shape (#boxes or more, :py:attr:`number_of_features`)")
+;
+static PyObject* PyBobIpFacedetectFeatureExtractor_extract_all_batch(PyBobIpFacedetectFeatureExtractorObject* self, PyObject* args, PyObject* kwargs) {
+  BOB_TRY
+  char** kwlist = extract_all_batch.kwlist();
+
+  PyBobIpFacedetectBoxArrayObject* boxes;
+  PyBlitzArrayObject* dataset;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O!O&", kwlist, &PyBobIpFacedetectBoxArray_Type, &boxes, &PyBlitzArray_OutputConverter, &dataset)){
+    return 0;
+  }
+  auto dataset_ = make_safe(dataset);
+  auto ds = PyBlitzArrayCxx_AsBlitz<uint16_t, 2>(dataset, "dataset");
+  if (!ds) return 0;
+  self->cxx->extractAllBatch(*boxes->cxx, *ds);
+  Py_RETURN_NONE;
+  BOB_CATCH_MEMBER("cannot extract all features of the bounding boxes", 0)
+}
+
 static auto extract_indexed = bob::extension::FunctionDoc(
   "extract_indexed",
   "Extracts the features only at the required locations, which defaults to :py:attr:`model_indices`",
   0,
   true
 )
-.add_prototype("bounding_box, feature_vector, [indices]")
+.add_prototype("bounding_box, feature_vector, [indices], [workspace]")
 .add_parameter("bounding_box", ":py:class:`BoundingBox`", "The bounding box for which the features should be extracted")
 .add_parameter("feature_vector", "array_like <1D, uint16>", "The feature vector, into which the features should be extracted; must be of size :py:attr:`number_of_features`")
 .add_parameter("indices", "array_like<1D,int32>", "The indices, for which the features should be extracted; if not given, :py:attr:`model_indices` is used (must be set beforehands)")
+.add_parameter("workspace", ":py:class:`Workspace`", "If given, the features are extracted from the image that the given workspace has been prepared with, otherwise the internal workspace is used")
 ;
 static PyObject* PyBobIpFacedetectFeatureExtractor_extract_indexed(PyBobIpFacedetectFeatureExtractorObject* self, PyObject* args, PyObject* kwargs) {
   BOB_TRY
@@ -462,8 +636,9 @@ static PyObject* PyBobIpFacedetectFeatureExtractor_extract_indexed(PyBobIpFacede
 
   PyBobIpFacedetectBoundingBoxObject* bb;
   PyBlitzArrayObject* fv, *indices = 0;
+  PyBobIpFacedetectWorkspaceObject* workspace = 0;
   // by shape
-  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O!O&|O&", kwlist, &PyBobIpFacedetectBoundingBox_Type, &bb, &PyBlitzArray_OutputConverter, &fv, &PyBlitzArray_Converter, &indices)){
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O!O&|O&O!", kwlist, &PyBobIpFacedetectBoundingBox_Type, &bb, &PyBlitzArray_OutputConverter, &fv, &PyBlitzArray_Converter, &indices, &PyBobIpFacedetectWorkspace_Type, &workspace)){
     return 0;
   }
   auto fv_ = make_safe(fv);
@@ -474,9 +649,15 @@ static PyObject* PyBobIpFacedetectFeatureExtractor_extract_indexed(PyBobIpFacede
   if (indices){
     auto i = PyBlitzArrayCxx_AsBlitz<int32_t, 1>(indices, "indices");
     if (!i) return 0;
-    self->cxx->extractIndexed(*bb->cxx, *f, *i);
+    if (workspace)
+      self->cxx->extractIndexed(*bb->cxx, *f, *i, *workspace->cxx);
+    else
+      self->cxx->extractIndexed(*bb->cxx, *f, *i);
   } else {
-    self->cxx->extractSome(*bb->cxx, *f);
+    if (workspace)
+      self->cxx->extractSome(*bb->cxx, *f, *workspace->cxx);
+    else
+      self->cxx->extractSome(*bb->cxx, *f);
   }
   Py_RETURN_NONE;
   BOB_CATCH_MEMBER("cannot extract indexed features", 0)
@@ -592,6 +773,12 @@ static PyMethodDef PyBobIpFacedetectFeatureExtractor_methods[] = {
     METH_VARARGS|METH_KEYWORDS,
     extract_all.doc()
   },
+  {
+    extract_all_batch.name(),
+    (PyCFunction)PyBobIpFacedetectFeatureExtractor_extract_all_batch,
+    METH_VARARGS|METH_KEYWORDS,
+    extract_all_batch.doc()
+  },
   {
     extract_indexed.name(),
     (PyCFunction)PyBobIpFacedetectFeatureExtractor_extract_indexed,
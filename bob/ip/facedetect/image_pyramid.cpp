@@ -0,0 +1,277 @@
+/**
+ * @brief Binds the ImagePyramid class to python
+ *
+ * Copyright (C) 2011-2014 Idiap Research Institute, Martigny, Switzerland
+ */
+
+#include "main.h"
+
+/******************************************************************/
+/************ Constructor Section *********************************/
+/******************************************************************/
+
+static auto ImagePyramid_doc = bob::extension::ClassDoc(
+  BOB_EXT_MODULE_PREFIX ".ImagePyramid",
+  "An image pyramid, in which each octave is computed by averaging blocks of 2x2 pixels of the previous octave",
+  "The first octave is the image itself, and each further octave has half the resolution of the previous one. "
+  "An image of any scale is computed by scaling the smallest octave that is at least as large as the scaled image. "
+  "Hence, each scaled image is interpolated from an image that is at most twice as large, instead of interpolating it from the full resolution image.\n\n"
+  "An image pyramid can be used instead of the image in :py:meth:`FeatureExtractor.prepare`, :py:meth:`Cascade.prepare` and the scan functions of the :py:class:`Sampler`. "
+  "The scaled images have the same shapes as when scaling the image directly, but the pixel values differ slightly, since the octaves are smoothed by averaging.\n\n"
+  "The pyramid can be re-built for other images using :py:meth:`build`, which re-uses the memory of the octaves for images of the same size."
+).add_constructor(
+  bob::extension::FunctionDoc(
+    "__init__",
+    "Creates the image pyramid for the given image, or an empty pyramid",
+    0,
+    true
+  )
+  .add_prototype("[image], [maximum_octaves]", "")
+  .add_parameter("image", "array_like <2D, uint8 or float>", "The gray image to compute the pyramid for")
+  .add_parameter("maximum_octaves", "int", "[Default: ``0``] The maximum number of octaves to compute, including the image itself; if ``0``, octaves are computed until the image cannot be halved anymore")
+);
+
+
+static int PyBobIpFacedetectImagePyramid_build_(bob::ip::facedetect::ImagePyramid& pyramid, PyBlitzArrayObject* image, int maximum_octaves){
+  if (image->ndim != 2){
+    PyErr_Format(PyExc_TypeError, "ImagePyramid : The input image must be 2D, not %dD", (int)image->ndim);
+    return -1;
+  }
+  switch (image->type_num){
+    case NPY_UINT8: pyramid.build(*PyBlitzArrayCxx_AsBlitz<uint8_t,2>(image), maximum_octaves); return 0;
+    case NPY_FLOAT64: pyramid.build(*PyBlitzArrayCxx_AsBlitz<double,2>(image), maximum_octaves); return 0;
+    default:
+      PyErr_Format(PyExc_TypeError, "ImagePyramid : The input image must be of type uint8 or float");
+      return -1;
+  }
+}
+
+static int PyBobIpFacedetectImagePyramid_init(PyBobIpFacedetectImagePyramidObject* self, PyObject* args, PyObject* kwargs) {
+  BOB_TRY
+
+  char** kwlist = ImagePyramid_doc.kwlist(0);
+  PyBlitzArrayObject* image = 0;
+  int maximum_octaves = 0;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|O&i", kwlist, &PyBlitzArray_Converter, &image, &maximum_octaves)) return -1;
+  auto image_ = make_xsafe(image);
+
+  self->cxx.reset(new bob::ip::facedetect::ImagePyramid());
+  if (image) return PyBobIpFacedetectImagePyramid_build_(*self->cxx, image, maximum_octaves);
+  return 0;
+
+  BOB_CATCH_MEMBER("cannot create ImagePyramid", -1)
+}
+
+static void PyBobIpFacedetectImagePyramid_delete(PyBobIpFacedetectImagePyramidObject* self) {
+  self->cxx.reset();
+  Py_TYPE(self)->tp_free((PyObject*)self);
+}
+
+int PyBobIpFacedetectImagePyramid_Check(PyObject* o) {
+  return PyObject_IsInstance(o, reinterpret_cast<PyObject*>(&PyBobIpFacedetectImagePyramid_Type));
+}
+
+
+/******************************************************************/
+/************ Variables Section ***********************************/
+/******************************************************************/
+
+static auto shape = bob::extension::VariableDoc(
+  "shape",
+  "(int, int)",
+  "The shape of the image, for which the pyramid has been built, read access only"
+);
+PyObject* PyBobIpFacedetectImagePyramid_shape(PyBobIpFacedetectImagePyramidObject* self, void*){
+  BOB_TRY
+  auto shape = self->cxx->shape();
+  return Py_BuildValue("ii", shape[0], shape[1]);
+  BOB_CATCH_MEMBER("shape could not be read", 0)
+}
+
+static auto octaves = bob::extension::VariableDoc(
+  "octaves",
+  "int",
+  "The number of octaves of the pyramid, including the image itself, read access only"
+);
+PyObject* PyBobIpFacedetectImagePyramid_octaves(PyBobIpFacedetectImagePyramidObject* self, void*){
+  BOB_TRY
+  return Py_BuildValue("i", self->cxx->numberOfOctaves());
+  BOB_CATCH_MEMBER("octaves could not be read", 0)
+}
+
+static PyGetSetDef PyBobIpFacedetectImagePyramid_getseters[] = {
+    {
+      shape.name(),
+      (getter)PyBobIpFacedetectImagePyramid_shape,
+      0,
+      shape.doc(),
+      0
+    },
+    {
+      octaves.name(),
+      (getter)PyBobIpFacedetectImagePyramid_octaves,
+      0,
+      octaves.doc(),
+      0
+    },
+    {0}  /* Sentinel */
+};
+
+
+/******************************************************************/
+/************ Functions Section ***********************************/
+/******************************************************************/
+
+static auto build = bob::extension::FunctionDoc(
+  "build",
+  "Computes the octaves of the given image",
+  "The memory of the octaves is re-used, when the image has the same size as the previous one.",
+  true
+)
+.add_prototype("image, [maximum_octaves]")
+.add_parameter("image", "array_like <2D, uint8 or float>", "The gray image to compute the pyramid for")
+.add_parameter("maximum_octaves", "int", "[Default: ``0``] The maximum number of octaves to compute, including the image itself; if ``0``, octaves are computed until the image cannot be halved anymore")
+;
+static PyObject* PyBobIpFacedetectImagePyramid_build(PyBobIpFacedetectImagePyramidObject* self, PyObject* args, PyObject* kwargs) {
+  BOB_TRY
+  char** kwlist = build.kwlist();
+
+  PyBlitzArrayObject* image;
+  int maximum_octaves = 0;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O&|i", kwlist, &PyBlitzArray_Converter, &image, &maximum_octaves)) return 0;
+  auto image_ = make_safe(image);
+  if (PyBobIpFacedetectImagePyramid_build_(*self->cxx, image, maximum_octaves) < 0) return 0;
+  Py_RETURN_NONE;
+  BOB_CATCH_MEMBER("cannot build image pyramid", 0)
+}
+
+static auto octave = bob::extension::FunctionDoc(
+  "octave",
+  "Returns the octave with the given index",
+  0,
+  true
+)
+.add_prototype("index", "octave")
+.add_parameter("index", "int", "The index of the octave, where 0 is the image itself")
+.add_return("octave", "array_like <2D, float>", "A copy of the octave")
+;
+static PyObject* PyBobIpFacedetectImagePyramid_octave(PyBobIpFacedetectImagePyramidObject* self, PyObject* args, PyObject* kwargs) {
+  BOB_TRY
+  char** kwlist = octave.kwlist();
+
+  int index;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "i", kwlist, &index)) return 0;
+  if (index < 0 || index >= self->cxx->numberOfOctaves()){
+    PyErr_Format(PyExc_IndexError, "%s : the octave index %d is out of range [0, %d[", Py_TYPE(self)->tp_name, index, self->cxx->numberOfOctaves());
+    return 0;
+  }
+  return PyBlitzArrayCxx_AsNumpy(self->cxx->getOctave(index).copy());
+  BOB_CATCH_MEMBER("cannot get octave", 0)
+}
+
+static auto scale = bob::extension::FunctionDoc(
+  "scale",
+  "Returns the image scaled with the given scale",
+  "The scaled image is interpolated from the smallest octave that is at least as large as the scaled image. "
+  "It has the same shape as the image scaled with :py:func:`bob.ip.base.scale`.",
+  true
+)
+.add_prototype("scale", "scaled")
+.add_parameter("scale", "float", "The scale of the image")
+.add_return("scaled", "array_like <2D, float>", "The scaled image")
+;
+static PyObject* PyBobIpFacedetectImagePyramid_scale(PyBobIpFacedetectImagePyramidObject* self, PyObject* args, PyObject* kwargs) {
+  BOB_TRY
+  char** kwlist = scale.kwlist();
+
+  double s;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "d", kwlist, &s)) return 0;
+  blitz::Array<double,2> scaled(self->cxx->scaledShape(s));
+  self->cxx->scale(scaled);
+  return PyBlitzArrayCxx_AsNumpy(scaled);
+  BOB_CATCH_MEMBER("cannot scale image", 0)
+}
+
+static auto scaled_shape = bob::extension::FunctionDoc(
+  "scaled_shape",
+  "Returns the shape of the image scaled with the given scale",
+  0,
+  true
+)
+.add_prototype("scale", "shape")
+.add_parameter("scale", "float", "The scale of the image")
+.add_return("shape", "(int, int)", "The shape of the scaled image")
+;
+static PyObject* PyBobIpFacedetectImagePyramid_scaledShape(PyBobIpFacedetectImagePyramidObject* self, PyObject* args, PyObject* kwargs) {
+  BOB_TRY
+  char** kwlist = scaled_shape.kwlist();
+
+  double s;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "d", kwlist, &s)) return 0;
+  auto shape = self->cxx->scaledShape(s);
+  return Py_BuildValue("ii", shape[0], shape[1]);
+  BOB_CATCH_MEMBER("cannot compute scaled shape", 0)
+}
+
+static PyMethodDef PyBobIpFacedetectImagePyramid_methods[] = {
+  {
+    build.name(),
+    (PyCFunction)PyBobIpFacedetectImagePyramid_build,
+    METH_VARARGS|METH_KEYWORDS,
+    build.doc()
+  },
+  {
+    octave.name(),
+    (PyCFunction)PyBobIpFacedetectImagePyramid_octave,
+    METH_VARARGS|METH_KEYWORDS,
+    octave.doc()
+  },
+  {
+    scale.name(),
+    (PyCFunction)PyBobIpFacedetectImagePyramid_scale,
+    METH_VARARGS|METH_KEYWORDS,
+    scale.doc()
+  },
+  {
+    scaled_shape.name(),
+    (PyCFunction)PyBobIpFacedetectImagePyramid_scaledShape,
+    METH_VARARGS|METH_KEYWORDS,
+    scaled_shape.doc()
+  },
+  {0} /* Sentinel */
+};
+
+
+/******************************************************************/
+/************ Module Section **************************************/
+/******************************************************************/
+
+// Define the ImagePyramid type struct; will be initialized later
+PyTypeObject PyBobIpFacedetectImagePyramid_Type = {
+  PyVarObject_HEAD_INIT(0,0)
+  0
+};
+
+bool init_BobIpFacedetectImagePyramid(PyObject* module)
+{
+  // initialize the type struct
+  PyBobIpFacedetectImagePyramid_Type.tp_name = ImagePyramid_doc.name();
+  PyBobIpFacedetectImagePyramid_Type.tp_basicsize = sizeof(PyBobIpFacedetectImagePyramidObject);
+  PyBobIpFacedetectImagePyramid_Type.tp_flags = Py_TPFLAGS_DEFAULT;
+  PyBobIpFacedetectImagePyramid_Type.tp_doc = ImagePyramid_doc.doc();
+
+  // set the functions
+  PyBobIpFacedetectImagePyramid_Type.tp_new = PyType_GenericNew;
+  PyBobIpFacedetectImagePyramid_Type.tp_init = reinterpret_cast<initproc>(PyBobIpFacedetectImagePyramid_init);
+  PyBobIpFacedetectImagePyramid_Type.tp_dealloc = reinterpret_cast<destructor>(PyBobIpFacedetectImagePyramid_delete);
+  PyBobIpFacedetectImagePyramid_Type.tp_methods = PyBobIpFacedetectImagePyramid_methods;
+  PyBobIpFacedetectImagePyramid_Type.tp_getset = PyBobIpFacedetectImagePyramid_getseters;
+
+  // check that everything is fine
+  if (PyType_Ready(&PyBobIpFacedetectImagePyramid_Type) < 0)
+    return false;
+
+  // add the type to the module
+  Py_INCREF(&PyBobIpFacedetectImagePyramid_Type);
+  return PyModule_AddObject(module, "ImagePyramid", (PyObject*)&PyBobIpFacedetectImagePyramid_Type) >= 0;
+}
@@ -16,11 +16,11 @@ bob::extension::FunctionDoc prune_detections_doc = bob::extension::FunctionDoc(
   "For threshold >= 1., all detections will be returned (i.e., no pruning is performed), but the list will be sorted with descendingly predictions."
 )
 .add_prototype("detections, predictions, threshold, [number_of_detections]", "pruned_detections, pruned_predictions")
-.add_parameter("detections", "[:py:class:`BoundingBox`]", "A list of detected bouding boxes")
+.add_parameter("detections", "[:py:class:`BoundingBox`] or :py:class:`BoxArray`", "A list or an array of detected bouding boxes")
 .add_parameter("predictions", "array_like <1D, float>", "The prediction (quality, weight, ...) values for the detections")
 .add_parameter("threshold", "float", "The overlap threshold (Jaccard similarity), for which detections should be pruned")
 .add_parameter("number_of_detections", "int", "[default: MAX_INT] The number of detections that should be returned")
-.add_return("pruned_detections", "[:py:class:`BoundingBox`]", "The list of pruned bounding boxes")
+.add_return("pruned_detections", "[:py:class:`BoundingBox`] or :py:class:`BoxArray`", "The list of pruned bounding boxes; a :py:class:`BoxArray`, if ``detections`` is a :py:class:`BoxArray`")
 .add_return("pruned_predictions", "array_like <float, 1D>", "The according predictions (qualities, weights, ...)")
 ;
 PyObject* PyBobIpFacedetect_PruneDetections(PyObject*, PyObject* args, PyObject* kwargs) {
@@ -32,11 +32,26 @@ PyObject* PyBobIpFacedetect_PruneDetections(PyObject*, PyObject* args, PyObject*
   double threshold;
   int number_of_detections = std::numeric_limits<int>::max();
 
-  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O!O&d|i", kwlist, &PyList_Type, &list, &PyBlitzArray_Converter, &predictions, &threshold, &number_of_detections)) return 0;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO&d|i", kwlist, &list, &PyBlitzArray_Converter, &predictions, &threshold, &number_of_detections)) return 0;
   auto predictions_ = make_safe(predictions);
   auto p = PyBlitzArrayCxx_AsBlitz<double,1>(predictions, "predictions");
   if (!p) return 0;
 
+  if (PyBobIpFacedetectBoxArray_Check(list)){
+    // perform pruning on the box array
+    const bob::ip::facedetect::BoxArray& boxes = *reinterpret_cast<PyBobIpFacedetectBoxArrayObject*>(list)->cxx;
+    std::vector<int32_t> indices;
+    bob::ip::facedetect::pruneDetections(boxes, *p, threshold, indices, number_of_detections);
+    blitz::Array<double,1> pruned_predictions(indices.size());
+    for (int i = 0; i < pruned_predictions.extent(0); ++i)
+      pruned_predictions(i) = (*p)(indices[i]);
+    return Py_BuildValue("NN", PyBobIpFacedetectBoxArray_New(boxes.select(indices)), PyBlitzArrayCxx_AsNumpy(pruned_predictions));
+  }
+  if (!PyList_Check(list)){
+    PyErr_Format(PyExc_TypeError, "prune_detections : expected a list of BoundingBox objects or a BoxArray, but got an object of type `%s'", Py_TYPE(list)->tp_name);
+    return 0;
+  }
+
   // get bounding box list
   std::vector<boost::shared_ptr<bob::ip::facedetect::BoundingBox>> boxes(PyList_GET_SIZE(list)), pruned_boxes;
   for (Py_ssize_t i = 0; i < PyList_GET_SIZE(list); ++i){
@@ -74,10 +89,10 @@ bob::extension::FunctionDoc overlapping_detections_doc = bob::extension::Functio
   "For threshold >= 1., all detections will be returned (i.e., no pruning is performed), but the list will be sorted with descendingly predictions."
 )
 .add_prototype("detections, predictions, threshold", "overlapped_detections, overlapped_predictions")
-.add_parameter("detections", "[:py:class:`BoundingBox`]", "A list of detected bouding boxes")
+.add_parameter("detections", "[:py:class:`BoundingBox`] or :py:class:`BoxArray`", "A list or an array of detected bouding boxes")
 .add_parameter("predictions", "array_like <1D, float>", "The prediction (quality, weight, ...) values for the detections")
 .add_parameter("threshold", "float", "The overlap threshold (Jaccard similarity) which should be considered")
-.add_return("overlapped_detections", "[:py:class:`BoundingBox`]", "The list of overlapping bounding boxes")
+.add_return("overlapped_detections", "[:py:class:`BoundingBox`] or :py:class:`BoxArray`", "The list of overlapping bounding boxes; a :py:class:`BoxArray`, if ``detections`` is a :py:class:`BoxArray`")
 .add_return("overlapped_predictions", "array_like <float, 1D>", "The according predictions (qualities, weights, ...)")
 ;
 PyObject* PyBobIpFacedetect_OverlappingDetections(PyObject*, PyObject* args, PyObject* kwargs) {
@@ -88,11 +103,26 @@ PyObject* PyBobIpFacedetect_OverlappingDetections(PyObject*, PyObject* args, PyO
   PyBlitzArrayObject* predictions;
   double threshold;
 
-  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O!O&d", kwlist, &PyList_Type, &list, &PyBlitzArray_Converter, &predictions, &threshold)) return 0;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO&d", kwlist, &list, &PyBlitzArray_Converter, &predictions, &threshold)) return 0;
   auto predictions_ = make_safe(predictions);
   auto p = PyBlitzArrayCxx_AsBlitz<double,1>(predictions, "predictions");
   if (!p) return 0;
 
+  if (PyBobIpFacedetectBoxArray_Check(list)){
+    // compute the overlap on the box array
+    const bob::ip::facedetect::BoxArray& boxes = *reinterpret_cast<PyBobIpFacedetectBoxArrayObject*>(list)->cxx;
+    std::vector<int32_t> indices;
+    bob::ip::facedetect::bestOverlap(boxes, *p, threshold, indices);
+    blitz::Array<double,1> overlapped_predictions(indices.size());
+    for (int i = 0; i < overlapped_predictions.extent(0); ++i)
+      overlapped_predictions(i) = (*p)(indices[i]);
+    return Py_BuildValue("NN", PyBobIpFacedetectBoxArray_New(boxes.select(indices)), PyBlitzArrayCxx_AsNumpy(overlapped_predictions));
+  }
+  if (!PyList_Check(list)){
+    PyErr_Format(PyExc_TypeError, "overlapping_detections : expected a list of BoundingBox objects or a BoxArray, but got an object of type `%s'", Py_TYPE(list)->tp_name);
+    return 0;
+  }
+
   // get bounding box list
   std::vector<boost::shared_ptr<bob::ip::facedetect::BoundingBox>> boxes(PyList_GET_SIZE(list)), overlapped_boxes;
   for (Py_ssize_t i = 0; i < PyList_GET_SIZE(list); ++i){
@@ -124,6 +154,73 @@ PyObject* PyBobIpFacedetect_OverlappingDetections(PyObject*, PyObject* args, PyO
 }
 
 
+bob::extension::FunctionDoc best_detection_doc = bob::extension::FunctionDoc(
+  "best_detection",
+  "Computes the best detection for the given detections and according predictions",
+  "This is achieved by computing a weighted sum of detections that overlap with the best detection (the one with the highest prediction), where the weights are based on the predictions. "
+  "Only detections with according prediction values > 0 are considered.\n\n"
+  ".. note:: Since version 2.0.5, the weighted sums are computed in C++: the weighted coordinates and predictions are summed up first and divided by the sum of the weights afterward, while the previous Python implementation normalized each weight first. "
+  "Hence, the returned bounding box and prediction might differ from previously stored results in the last digits, i.e., they should be compared with a tolerance (e.g., using :py:func:`numpy.allclose`)."
+)
+.add_prototype("detections, predictions, [minimum_overlap]", "bounding_box, prediction")
+.add_parameter("detections", "[:py:class:`BoundingBox`] or :py:class:`BoxArray`", "The detected bounding boxes")
+.add_parameter("predictions", "array_like <1D, float>", "The predictions for the ``detections``")
+.add_parameter("minimum_overlap", "float", "[default: 0.2] The minimum overlap (in terms of Jaccard :py:meth:`BoundingBox.similarity`) of bounding boxes with the best detection to be considered")
+.add_return("bounding_box", ":py:class:`BoundingBox`", "The bounding box which has been merged from the detections")
+.add_return("prediction", "float", "The prediction value of the bounding box, which is a weighted sum of the predictions with minimum overlap")
+;
+PyObject* PyBobIpFacedetect_BestDetection(PyObject*, PyObject* args, PyObject* kwargs) {
+  BOB_TRY
+  char** kwlist = best_detection_doc.kwlist();
+
+  PyObject* list;
+  PyBlitzArrayObject* predictions;
+  double threshold = 0.2;
+
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO&|d", kwlist, &list, &PyBlitzArray_Converter, &predictions, &threshold)) return 0;
+  auto predictions_ = make_safe(predictions);
+  auto p = PyBlitzArrayCxx_AsBlitz<double,1>(predictions, "predictions");
+  if (!p) return 0;
+
+  boost::shared_ptr<bob::ip::facedetect::BoxArray> boxes;
+  if (PyBobIpFacedetectBoxArray_Check(list)){
+    boxes = reinterpret_cast<PyBobIpFacedetectBoxArrayObject*>(list)->cxx;
+  } else if (PyList_Check(list)){
+    std::vector<boost::shared_ptr<bob::ip::facedetect::BoundingBox>> detections(PyList_GET_SIZE(list));
+    for (Py_ssize_t i = 0; i < PyList_GET_SIZE(list); ++i){
+      PyObject* v = PyList_GET_ITEM(list, i);
+      if (!PyBobIpFacedetectBoundingBox_Check(v)){
+        PyErr_Format(PyExc_TypeError, "best_detection : expected a list of BoundingBox objects, but object number %d is of type `%s'", (int)i, Py_TYPE(v)->tp_name);
+        return 0;
+      }
+      detections[i] = ((PyBobIpFacedetectBoundingBoxObject*)v)->cxx;
+    }
+    boxes.reset(new bob::ip::facedetect::BoxArray(detections));
+  } else {
+    PyErr_Format(PyExc_TypeError, "best_detection : expected a list of BoundingBox objects or a BoxArray, but got an object of type `%s'", Py_TYPE(list)->tp_name);
+    return 0;
+  }
+
+  if (boxes->size() != p->extent(0)){
+    PyErr_Format(PyExc_ValueError, "best_detection : the number of detections %d and predictions %d differ", boxes->size(), p->extent(0));
+    return 0;
+  }
+  if (!blitz::any(*p > 0.)){
+    PyErr_Format(PyExc_ValueError, "No detections with a prediction value > 0 have been found");
+    return 0;
+  }
+
+  // merge the detections
+  double value;
+  PyBobIpFacedetectBoundingBoxObject* bb = reinterpret_cast<PyBobIpFacedetectBoundingBoxObject*>(PyBobIpFacedetectBoundingBox_Type.tp_alloc(&PyBobIpFacedetectBoundingBox_Type, 0));
+  bb->cxx = bob::ip::facedetect::bestDetection(*boxes, *p, threshold, value);
+
+  return Py_BuildValue("Nd", bb, value);
+
+  BOB_CATCH_FUNCTION("in best_detection", 0)
+}
+
+
 static PyMethodDef module_methods[] = {
   {
     prune_detections_doc.name(),
@@ -137,6 +234,12 @@ static PyMethodDef module_methods[] = {
     METH_VARARGS|METH_KEYWORDS,
     overlapping_detections_doc.doc()
   },
+  {
+    best_detection_doc.name(),
+    (PyCFunction)PyBobIpFacedetect_BestDetection,
+    METH_VARARGS|METH_KEYWORDS,
+    best_detection_doc.doc()
+  },
   {0}  // Sentinel
 };
 
@@ -167,7 +270,11 @@ static PyObject* create_module (void) {
   if (!module) return 0;
 
   if (!init_BobIpFacedetectBoundingBox(module)) return 0;
+  if (!init_BobIpFacedetectBoxArray(module)) return 0;
   if (!init_BobIpFacedetectFeatureExtractor(module)) return 0;
+  if (!init_BobIpFacedetectWorkspace(module)) return 0;
+  if (!init_BobIpFacedetectImagePyramid(module)) return 0;
+  if (!init_BobIpFacedetectCompiledCascade(module)) return 0;
 
   /* imports bob.blitz C-API + dependencies */
   if (import_bob_blitz() < 0) return 0;
@@ -29,6 +29,17 @@ extern PyTypeObject PyBobIpFacedetectBoundingBox_Type;
 bool init_BobIpFacedetectBoundingBox(PyObject* module);
 int PyBobIpFacedetectBoundingBox_Check(PyObject* o);
 
+// BoxArray
+typedef struct {
+  PyObject_HEAD
+  boost::shared_ptr<bob::ip::facedetect::BoxArray> cxx;
+} PyBobIpFacedetectBoxArrayObject;
+
+extern PyTypeObject PyBobIpFacedetectBoxArray_Type;
+bool init_BobIpFacedetectBoxArray(PyObject* module);
+int PyBobIpFacedetectBoxArray_Check(PyObject* o);
+PyObject* PyBobIpFacedetectBoxArray_New(boost::shared_ptr<bob::ip::facedetect::BoxArray> boxes);
+
 // Feature extractor
 typedef struct {
   PyObject_HEAD
@@ -39,6 +50,36 @@ extern PyTypeObject PyBobIpFacedetectFeatureExtractor_Type;
 bool init_BobIpFacedetectFeatureExtractor(PyObject* module);
 int PyBobIpFacedetectFeatureExtractor_Check(PyObject* o);
 
+// Workspace
+typedef struct {
+  PyObject_HEAD
+  boost::shared_ptr<bob::ip::facedetect::Workspace> cxx;
+} PyBobIpFacedetectWorkspaceObject;
+
+extern PyTypeObject PyBobIpFacedetectWorkspace_Type;
+bool init_BobIpFacedetectWorkspace(PyObject* module);
+int PyBobIpFacedetectWorkspace_Check(PyObject* o);
+
+// ImagePyramid
+typedef struct {
+  PyObject_HEAD
+  boost::shared_ptr<bob::ip::facedetect::ImagePyramid> cxx;
+} PyBobIpFacedetectImagePyramidObject;
+
+extern PyTypeObject PyBobIpFacedetectImagePyramid_Type;
+bool init_BobIpFacedetectImagePyramid(PyObject* module);
+int PyBobIpFacedetectImagePyramid_Check(PyObject* o);
+
+// Compiled cascade
+typedef struct {
+  PyObject_HEAD
+  boost::shared_ptr<bob::ip::facedetect::CompiledCascade> cxx;
+} PyBobIpFacedetectCompiledCascadeObject;
+
+extern PyTypeObject PyBobIpFacedetectCompiledCascade_Type;
+bool init_BobIpFacedetectCompiledCascade(PyObject* module);
+int PyBobIpFacedetectCompiledCascade_Check(PyObject* o);
+
 // Functions
 PyObject* PyBobIpFacedetect_PruneDetections(PyObject*, PyObject*, PyObject*);
 extern bob::extension::FunctionDoc prune_detections_doc;
@@ -0,0 +1,112 @@
+#!ipython
+
+"""Compares the accuracy and the speed of face detection when scaling the blocks of the multi-block LBP extractors instead of scaling the image.
+
+Three variants are compared for each image: scaling the image to each scale (the default), scaling the LBP blocks while computing the integral image only once for the full resolution image, and scaling the LBP blocks while computing the integral image once for each octave of an :py:class:`bob.ip.facedetect.ImagePyramid`.
+For each variant, the average detection time is reported.
+The predictions of all sampled bounding boxes are compared with the ones of the scaled images, by their mean absolute difference and by the fraction of bounding boxes, for which both predictions are positive or both are not.
+Finally, the Jaccard similarity of the detected face with the face detected in the scaled images and, if annotation files exist, with the annotated face is reported.
+"""
+
+import argparse
+import math
+import numpy
+import os
+import time
+
+import bob.io.base
+import bob.ip.color
+import pkg_resources
+
+import bob.ip.facedetect
+import bob.core
+logger = bob.core.log.setup("bob.ip.facedetect")
+
+def command_line_options(command_line_arguments):
+
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+  parser.add_argument('--test-images', '-i', nargs='+', default = [pkg_resources.resource_filename('bob.ip.facedetect', 'data/testimage.jpg')], help = "Select the images to detect faces in.")
+  parser.add_argument('--annotation-extension', '-a', default = '.pos', help = "The annotations of each image are read from the file with the same name and this extension, if it exists.")
+  parser.add_argument('--annotation-type', '-t', default = 'named', help = "The type of the annotation files, see bob.ip.facedetect.read_annotation_file.")
+  parser.add_argument('--cascade-file', '-r', help = "The file to read the cascade from; if not given, the default cascade is used.")
+  parser.add_argument('--distance', '-s', type=int, default=2, help = "The distance with which the image should be scanned.")
+  parser.add_argument('--scale-factor', '-S', type=float, default = math.pow(2.,-1./16.), help = "The logarithmic distance between two scales (should be between 0 and 1).")
+  parser.add_argument('--lowest-scale', '-f', type=float, default = 0.125, help = "Faces which will be lower than the given scale times the image resolution will not be found.")
+  parser.add_argument('--repetitions', '-n', type=int, default = 3, help = "The number of times the detection is repeated to measure the time.")
+
+  bob.core.log.add_command_line_option(parser)
+  args = parser.parse_args(command_line_arguments)
+  bob.core.log.set_verbosity_level(logger, args.verbose)
+
+  return args
+
+
+def _detect(cascade, sampler, image, repetitions):
+  """Detects the best face in the given image (or image pyramid) and returns the predictions of all sampled bounding boxes"""
+  start = time.time()
+  for _ in range(repetitions):
+    detection = bob.ip.facedetect.detect_single_face(image, cascade, sampler)
+  duration = (time.time() - start) / repetitions
+  predictions, _ = sampler.scan_cascade(cascade, image, workspace=bob.ip.facedetect.Workspace())
+  return detection, predictions, duration
+
+
+def main(command_line_arguments = None):
+  args = command_line_options(command_line_arguments)
+
+  if args.cascade_file is None:
+    cascade = bob.ip.facedetect.default_cascade(cached = False)
+  else:
+    cascade = bob.ip.facedetect.Cascade(bob.io.base.HDF5File(args.cascade_file))
+  if not cascade.extractor.extractors[0].is_multi_block_lbp:
+    logger.error("The blocks of the cascade can only be scaled for multi-block LBP extractors")
+    return 1
+  sampler = bob.ip.facedetect.Sampler(patch_size = cascade.extractor.patch_size, distance=args.distance, scale_factor=args.scale_factor, lowest_scale=args.lowest_scale)
+
+  variants = ("scaled images", "scaled blocks, full resolution", "scaled blocks, octaves")
+  durations = numpy.zeros(len(variants))
+  differences = numpy.zeros(len(variants))
+  agreements = numpy.zeros(len(variants))
+  similarities = numpy.zeros(len(variants))
+  annotated = numpy.zeros(len(variants))
+  annotations = 0
+
+  for filename in args.test_images:
+    image = bob.io.base.load(filename)
+    if image.ndim == 3:
+      image = bob.ip.color.rgb_to_gray(image)
+
+    # read the annotated face, if any
+    ground_truth = None
+    annotation_file = os.path.splitext(filename)[0] + args.annotation_extension
+    if os.path.exists(annotation_file):
+      faces = bob.ip.facedetect.read_annotation_file(annotation_file, args.annotation_type)
+      if faces and faces[0]:
+        ground_truth = bob.ip.facedetect.bounding_box_from_annotation(**faces[0])
+        annotations += 1
+
+    results = []
+    for v, source in enumerate((image, image, bob.ip.facedetect.ImagePyramid(image))):
+      cascade.extractor.scale_blocks = v > 0
+      detection, predictions, duration = _detect(cascade, sampler, source, args.repetitions)
+      results.append((detection, predictions))
+      durations[v] += duration
+
+      # compare with the detection in the scaled images
+      reference, reference_predictions = results[0]
+      if len(predictions):
+        differences[v] += numpy.mean(numpy.abs(predictions - reference_predictions))
+        agreements[v] += numpy.mean((predictions > 0) == (reference_predictions > 0))
+      if detection is not None and reference is not None:
+        similarities[v] += detection[0].similarity(reference[0])
+      if detection is not None and ground_truth is not None:
+        annotated[v] += detection[0].similarity(ground_truth)
+      logger.info("%s: detected %s with quality %s in %3.3f seconds", filename, detection[0] if detection else None, detection[1] if detection else None, duration)
+
+  count = len(args.test_images)
+  print("%-32s%12s%12s%12s%12s%12s" % ("Variant", "Time", "Difference", "Agreement", "Similarity", "Annotated"))
+  for v, variant in enumerate(variants):
+    print("%-32s%12.3f%12.4f%12.4f%12.4f%12s" % (variant, durations[v] / count, differences[v] / count, agreements[v] / count, similarities[v] / count, "%.4f" % (annotated[v] / annotations) if annotations else "-"))
+
+  return 0
@@ -0,0 +1,84 @@
+#!ipython
+
+"""Measures the memory/speed trade-off of the dense LBP code maps of the feature extractor.
+
+The faces in the given image are detected with the cascade, once extracting the LBP features of each sampled bounding box separately, and once looking up the features in dense LBP code maps, see :py:meth:`bob.ip.facedetect.Cascade.use_code_maps`.
+For both variants, the average time to detect the face is reported, as well as the memory that the code maps require for the largest scale of the image, which is the memory that is held while scanning the image.
+Finally, the predictions of both variants are compared, which need to be identical.
+"""
+
+import argparse
+import math
+import numpy
+import time
+
+import bob.io.base
+import bob.ip.color
+import pkg_resources
+
+import bob.ip.facedetect
+import bob.core
+logger = bob.core.log.setup("bob.ip.facedetect")
+
+def command_line_options(command_line_arguments):
+
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+  parser.add_argument('--test-image', '-i', default = pkg_resources.resource_filename('bob.ip.facedetect', 'data/testimage.jpg'), help = "Select the image to detect the face in.")
+  parser.add_argument('--cascade-file', '-r', help = "The file to read the cascade from; if not given, the default cascade is used.")
+  parser.add_argument('--distance', '-s', type=int, default=2, help = "The distance with which the image should be scanned.")
+  parser.add_argument('--scale-factor', '-S', type=float, default = math.pow(2.,-1./16.), help = "The logarithmic distance between two scales (should be between 0 and 1).")
+  parser.add_argument('--lowest-scale', '-f', type=float, default = 0.125, help = "Faces which will be lower than the given scale times the image resolution will not be found.")
+  parser.add_argument('--repetitions', '-n', type=int, default = 5, help = "The number of times the detection is repeated to measure the time.")
+
+  bob.core.log.add_command_line_option(parser)
+  args = parser.parse_args(command_line_arguments)
+  bob.core.log.set_verbosity_level(logger, args.verbose)
+
+  return args
+
+
+def _detect(cascade, sampler, image, repetitions):
+  """Detects the best face in the given image and returns the detection, the predictions of all sampled bounding boxes and the average detection time"""
+  workspace = bob.ip.facedetect.Workspace()
+  start = time.time()
+  for _ in range(repetitions):
+    predictions, boxes = sampler.scan_cascade(cascade, image, workspace=workspace)
+  duration = (time.time() - start) / repetitions
+  positive = predictions > 0
+  detection = bob.ip.facedetect.best_detection(bob.ip.facedetect.BoxArray(boxes[positive]), predictions[positive]) if positive.any() else None
+  return detection, predictions, duration
+
+
+def main(command_line_arguments = None):
+  args = command_line_options(command_line_arguments)
+
+  if args.cascade_file is None:
+    cascade = bob.ip.facedetect.default_cascade(cached = False)
+  else:
+    cascade = bob.ip.facedetect.Cascade(bob.io.base.HDF5File(args.cascade_file))
+  sampler = bob.ip.facedetect.Sampler(patch_size = cascade.extractor.patch_size, distance=args.distance, scale_factor=args.scale_factor, lowest_scale=args.lowest_scale)
+
+  image = bob.io.base.load(args.test_image)
+  if image.ndim == 3:
+    image = bob.ip.color.rgb_to_gray(image)
+
+  # the memory of the code maps of the largest scale: two bytes per pixel for each LBP extractor used by the cascade
+  shapes = [shape for _, shape in sampler.scales(image)]
+  used = [cascade.extractor.extractor(int(i)) for i in numpy.unique(numpy.concatenate(cascade.indices))]
+  extractors = len(set((lbp.radii, lbp.block_size, lbp.block_overlap) for lbp in used))
+  largest = max(shapes, key = lambda shape: shape[0] * shape[1])
+  memory = largest[0] * largest[1] * 2 * extractors
+
+  results = []
+  for code_maps in (False, True):
+    cascade.use_code_maps(code_maps)
+    results.append(_detect(cascade, sampler, image, args.repetitions))
+
+  print("Image of shape %s with %d scales; the cascade uses %d of %d LBP extractors" % (image.shape, len(shapes), extractors, len(cascade.extractor.extractors)))
+  print("%-24s%12s%16s%12s" % ("Variant", "Time", "Memory", "Quality"))
+  for name, (detection, _, duration), size in zip(("per-patch features", "dense code maps"), results, (0, memory)):
+    print("%-24s%12.3f%13.1f KB%12s" % (name, duration, size / 1024., "%.4f" % detection[1] if detection else "-"))
+  print("Identical predictions: %s" % numpy.array_equal(results[0][1], results[1][1]))
+
+  return 0
@@ -0,0 +1,73 @@
+#!ipython
+
+"""Measures the throughput of reading training features, either from the HDF5 feature files or from the memory-mapped feature matrices.
+
+The features in the given feature directory are converted into feature matrices in a temporary directory (unless the --matrix-directory already contains them).
+Then, the times to sample the given numbers of positive and negative features and to read all features (as done during hard negative mining) are reported for both formats.
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import bob.ip.facedetect
+import bob.core
+logger = bob.core.log.setup("bob.ip.facedetect")
+
+def command_line_options(command_line_arguments):
+
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+  parser.add_argument('--feature-directory', '-d', required = True, help = "The directory, where the features have been extracted to by extract_training_features.py.")
+  parser.add_argument('--matrix-directory', '-m', help = "The directory containing the feature matrices; if not given, the features are converted into a temporary directory.")
+  parser.add_argument('--data-type', '-t', choices = ('uint16', 'uint8'), default = 'uint16', help = "The data type of the feature matrices, when converting the features.")
+  parser.add_argument('--examples', '-e', type=int, nargs=2, default = [5000, 5000], help = "The number of positive and negative features to sample.")
+  parser.add_argument('--repetitions', '-n', type=int, default = 3, help = "The number of times the reading is repeated.")
+
+  bob.core.log.add_command_line_option(parser)
+  args = parser.parse_args(command_line_arguments)
+  bob.core.log.set_verbosity_level(logger, args.verbose)
+
+  return args
+
+
+def _read(train_set, examples, repetitions):
+  """Returns the average time to sample the given number of features, the average time to read all features and the number of bytes of all features"""
+  start = time.time()
+  for _ in range(repetitions):
+    train_set.positive_indices, train_set.negative_indices = set(), set()
+    train_set.sample(maximum_number_of_positives = examples[0], maximum_number_of_negatives = examples[1])
+  sample = (time.time() - start) / repetitions
+
+  start = time.time()
+  size = 0
+  for _ in range(repetitions):
+    size = 0
+    for _, _, blocks in train_set._feature_sources():
+      for _, _, read in blocks():
+        size += read().nbytes
+  full = (time.time() - start) / repetitions
+  return sample, full, size
+
+
+def main(command_line_arguments = None):
+  args = command_line_options(command_line_arguments)
+
+  if os.path.exists(os.path.join(args.feature_directory, "Matrix.hdf5")):
+    raise ValueError("The feature directory %s contains feature matrices, so that the HDF5 feature files would not be read" % args.feature_directory)
+
+  temp_dir = None
+  if args.matrix_directory is None:
+    temp_dir = tempfile.mkdtemp(prefix="FD_")
+    args.matrix_directory = temp_dir
+    bob.ip.facedetect.train.TrainingSet(args.feature_directory).convert(matrix_directory = args.matrix_directory, data_type = args.data_type)
+
+  try:
+    for name, directory in (("HDF5 feature files", args.feature_directory), ("feature matrices", args.matrix_directory)):
+      sample, full, size = _read(bob.ip.facedetect.train.TrainingSet(directory), args.examples, args.repetitions)
+      print("%s: sampling %d + %d features in %3.3f seconds, reading all features (%d MB) in %3.3f seconds (%3.1f MB/s)" % (name, args.examples[0], args.examples[1], sample, size // 2**20, full, size / 2.**20 / full))
+  finally:
+    if temp_dir is not None:
+      shutil.rmtree(temp_dir)
@@ -0,0 +1,87 @@
+#!ipython
+
+"""Measures the time of the pruning of overlapping detections for an increasing number of detections.
+
+Random bounding boxes are generated in an image of the given size, and the time of :py:func:`bob.ip.facedetect.prune_detections` is reported for each number of detections.
+For small numbers of detections, the result is compared to the straightforward pruning, which compares each detection with all detections that were kept before.
+"""
+
+import argparse
+import numpy
+import time
+
+import bob.ip.facedetect
+import bob.core
+logger = bob.core.log.setup("bob.ip.facedetect")
+
+def command_line_options(command_line_arguments):
+
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+  parser.add_argument('--numbers', '-n', type=int, nargs='+', default = [1000, 10000, 100000, 1000000], help = "The numbers of detections to prune.")
+  parser.add_argument('--thresholds', '-t', type=float, nargs='+', default = [0.2, 0.5], help = "The overlap thresholds used for pruning.")
+  parser.add_argument('--image-size', '-i', type=int, nargs=2, default = [1080, 1920], help = "The size of the image in which the boxes are generated.")
+  parser.add_argument('--box-sizes', '-b', type=float, nargs=2, default = [20., 200.], help = "The minimum and maximum size of the generated boxes.")
+  parser.add_argument('--verify', '-c', type=int, default = 10000, help = "Compare the results with the straightforward pruning up to the given number of detections.")
+  parser.add_argument('--seed', '-s', type=int, default = 42, help = "The seed for the random number generator.")
+
+  bob.core.log.add_command_line_option(parser)
+  args = parser.parse_args(command_line_arguments)
+  bob.core.log.set_verbosity_level(logger, args.verbose)
+
+  return args
+
+
+def _random_boxes(count, image_size, box_sizes):
+  """Generates random boxes with aspect ratio 5:4 inside the image"""
+  sizes = numpy.random.uniform(box_sizes[0], box_sizes[1], count)
+  boxes = numpy.ndarray((count, 4), numpy.float64)
+  boxes[:,2] = sizes * 1.25
+  boxes[:,3] = sizes
+  boxes[:,0] = numpy.random.uniform(0., 1., count) * numpy.maximum(image_size[0] - boxes[:,2], 0.)
+  boxes[:,1] = numpy.random.uniform(0., 1., count) * numpy.maximum(image_size[1] - boxes[:,3], 0.)
+  return boxes
+
+
+def _quadratic_pruning(boxes, predictions, threshold):
+  """Prunes the detections by comparing each detection with all kept detections"""
+  bottom, right = boxes[:,0] + boxes[:,2], boxes[:,1] + boxes[:,3]
+  area = boxes[:,2] * boxes[:,3]
+  kept = []
+  for index in numpy.argsort(-predictions, kind='mergesort'):
+    if kept:
+      k = numpy.array(kept)
+      h = numpy.minimum(bottom[k], bottom[index]) - numpy.maximum(boxes[k,0], boxes[index,0])
+      w = numpy.minimum(right[k], right[index]) - numpy.maximum(boxes[k,1], boxes[index,1])
+      intersection = numpy.where((h > 0) & (w > 0), h * w, 0.)
+      if (intersection / (area[k] + area[index] - intersection) > threshold).any():
+        continue
+    kept.append(index)
+  return kept
+
+
+def main(command_line_arguments = None):
+  args = command_line_options(command_line_arguments)
+
+  numpy.random.seed(args.seed)
+  for count in args.numbers:
+    boxes = _random_boxes(count, args.image_size, args.box_sizes)
+    # use distinct predictions, so that the order of the detections is well-defined
+    predictions = numpy.random.permutation(count).astype(numpy.float64)
+    array = bob.ip.facedetect.BoxArray(boxes)
+
+    for threshold in args.thresholds:
+      start = time.time()
+      pruned, values = bob.ip.facedetect.prune_detections(array, predictions, threshold)
+      duration = time.time() - start
+      print("%8d detections, threshold %1.2f: %8.3f seconds, %6d detections kept" % (count, threshold, duration, len(pruned)))
+
+      if count <= args.verify:
+        start = time.time()
+        kept = _quadratic_pruning(boxes, predictions, threshold)
+        logger.info("The straightforward pruning took %3.3f seconds", time.time() - start)
+        if len(pruned) != len(kept) or (pruned.boxes != boxes[kept]).any():
+          logger.error("The pruned detections differ from the straightforward pruning")
+          return 1
+
+  return 0
@@ -0,0 +1,72 @@
+#!ipython
+
+"""Measures the time to prepare all scales of an image, either directly from the full resolution image, or from an image pyramid.
+
+For each scale that the sampler generates, the feature extractor of the cascade is prepared with the scaled image.
+The times of scaling each image from the full resolution image and of computing the scaled images from the nearest octave of an :py:class:`bob.ip.facedetect.ImagePyramid` (including the construction of the pyramid) are reported.
+"""
+
+import argparse
+import math
+import time
+
+import bob.io.base
+import bob.ip.base
+import bob.ip.color
+import pkg_resources
+
+import bob.ip.facedetect
+import bob.core
+logger = bob.core.log.setup("bob.ip.facedetect")
+
+def command_line_options(command_line_arguments):
+
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+  parser.add_argument('--test-image', '-i', default = pkg_resources.resource_filename('bob.ip.facedetect', 'data/testimage.jpg'), help = "Select the image to prepare.")
+  parser.add_argument('--resize', '-r', type=float, nargs='+', default = [1., 4., 8.], help = "The image is resized with the given factors, to simulate images of different resolutions.")
+  parser.add_argument('--scale-factor', '-S', type=float, default = math.pow(2.,-1./16.), help = "The logarithmic distance between two scales (should be between 0 and 1).")
+  parser.add_argument('--lowest-scale', '-f', type=float, default = 0.125, help = "Faces which will be lower than the given scale times the image resolution will not be found.")
+  parser.add_argument('--repetitions', '-n', type=int, default = 5, help = "The number of times the preparation is repeated.")
+
+  bob.core.log.add_command_line_option(parser)
+  args = parser.parse_args(command_line_arguments)
+  bob.core.log.set_verbosity_level(logger, args.verbose)
+
+  return args
+
+
+def _prepare(cascade, sampler, image, workspace):
+  """Prepares all scales of the given image (or image pyramid)"""
+  for scale, _ in sampler.scales(image):
+    cascade.prepare(image, scale, workspace)
+
+
+def main(command_line_arguments = None):
+  args = command_line_options(command_line_arguments)
+
+  cascade = bob.ip.facedetect.default_cascade()
+  sampler = bob.ip.facedetect.Sampler(patch_size = cascade.extractor.patch_size, distance=2, scale_factor=args.scale_factor, lowest_scale=args.lowest_scale)
+  workspace = bob.ip.facedetect.Workspace()
+
+  image = bob.io.base.load(args.test_image)
+  if image.ndim == 3:
+    image = bob.ip.color.rgb_to_gray(image)
+
+  for resize in args.resize:
+    resized = bob.ip.base.scale(image, resize) if resize != 1. else image.astype('float64')
+    scales = len(list(sampler.scales(resized)))
+
+    start = time.time()
+    for _ in range(args.repetitions):
+      _prepare(cascade, sampler, resized, workspace)
+    direct = (time.time() - start) / args.repetitions
+
+    pyramid = bob.ip.facedetect.ImagePyramid()
+    start = time.time()
+    for _ in range(args.repetitions):
+      pyramid.build(resized)
+      _prepare(cascade, sampler, pyramid, workspace)
+    octaves = (time.time() - start) / args.repetitions
+
+    print("Image of shape %s with %d scales: %3.3f seconds directly, %3.3f seconds with %d octaves" % (resized.shape, scales, direct, octaves, pyramid.octaves))
@@ -0,0 +1,32 @@
+"""Converts the training features extracted by extract_training_features.py into feature matrices, which can be memory-mapped during training.
+
+Features that have been extracted into feature matrices (see the --data-type option of extract_training_features.py) are combined into one feature matrix.
+Existing feature matrices are overwritten; run this script again after the features have been extracted again."""
+
+import argparse
+import bob.ip.facedetect
+
+import bob.core
+logger = bob.core.log.setup('bob.ip.facedetect')
+
+
+def command_line_options(command_line_arguments):
+
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+  parser.add_argument('--feature-directory', '-d', default = "features", help = "The directory, where the features have been extracted to")
+  parser.add_argument('--matrix-directory', '-m', help = "The directory to write the feature matrices into; if not given, the --feature-directory is used")
+  parser.add_argument('--data-type', '-t', choices = ('uint16', 'uint8'), default = 'uint16', help = "The data type to store the features with; uint8 can only be used for features smaller than 256")
+
+  bob.core.log.add_command_line_option(parser)
+  args = parser.parse_args(command_line_arguments)
+  bob.core.log.set_verbosity_level(logger, args.verbose)
+
+  return args
+
+
+def main(command_line_arguments = None):
+  args = command_line_options(command_line_arguments)
+
+  train_set = bob.ip.facedetect.train.TrainingSet(feature_directory = args.feature_directory)
+  train_set.convert(matrix_directory = args.matrix_directory, data_type = args.data_type)
@@ -28,6 +28,8 @@ def command_line_options(command_line_arguments):
   parser.add_argument('--file-lists', '-i', nargs='+', help = "Select the training lists to extract features for.")
   parser.add_argument('--feature-directory', '-d', default = "features", help = "The output directory, where features will be stores")
   parser.add_argument('--parallel', '-P', type=int, help = "Use this option to run the script in parallel in the SGE grid, using the given number of parallel processes")
+  parser.add_argument('--workers', '-W', type=int, help = "Use this option to run the script in the given number of local processes, which write the same feature files as the according number of --parallel grid jobs")
+  parser.add_argument('--data-type', '-T', choices = ('uint16', 'uint8'), help = "If given, the features are appended to memory-mappable feature matrices of the given data type instead of HDF5 datasets")
 
   parser.add_argument('--patch-size', '-p', type=int, nargs=2, default=(24,20), help = "The size of the patch for the image in y and x.")
   parser.add_argument('--distance', '-s', type=int, default=2, help = "The distance with which the image should be scanned.")
@@ -81,4 +83,4 @@ def main(command_line_arguments = None):
   sampler = bob.ip.facedetect.detector.Sampler(patch_size=args.patch_size, scale_factor=args.scale_base, lowest_scale=args.lowest_scale, distance=args.distance)
 
   # extract features
-  train_set.extract(sampler, feature_extractor, number_of_examples_per_scale = args.examples_per_image_scale, similarity_thresholds = args.similarity_thresholds, parallel = args.parallel, mirror = not args.no_mirror_samples, use_every_nth_negative_scale = args.negative_examples_every)
+  train_set.extract(sampler, feature_extractor, number_of_examples_per_scale = args.examples_per_image_scale, similarity_thresholds = args.similarity_thresholds, parallel = args.parallel, workers = args.workers, mirror = not args.no_mirror_samples, use_every_nth_negative_scale = args.negative_examples_every, data_type = args.data_type)
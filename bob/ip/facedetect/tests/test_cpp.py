@@ -1,5 +1,7 @@
 import unittest
 import math
+import pickle
+import nose.tools
 from nose.plugins.skip import SkipTest
 
 import numpy
@@ -93,3 +95,123 @@ def test_pruning():
 
   assert len(bb) == 145
   assert len(val) == 145
+
+
+def test_box_array():
+  # tests that the box array computes the same as the bounding boxes
+  predictions = bob.io.base.load(bob.io.base.test_utils.datafile("detections.hdf5", 'bob.ip.facedetect'))
+  boxes = bob.io.base.load(bob.io.base.test_utils.datafile("boxes.hdf5", 'bob.ip.facedetect')).astype(numpy.float64)
+  detections = [fd.BoundingBox(boxes[i,0:2], boxes[i,2:4]) for i in range(boxes.shape[0])]
+
+  array = fd.BoxArray(boxes)
+  assert len(array) == len(detections)
+  assert (fd.BoxArray(detections).boxes == boxes).all()
+  assert array[10] == detections[10]
+  assert numpy.allclose(array.area, [bb.area for bb in detections])
+
+  # transformations
+  assert [bb.topleft_f + bb.size_f for bb in array.scale(0.5)] == [bb.scale(0.5).topleft_f + bb.scale(0.5).size_f for bb in detections]
+  assert [bb.topleft_f + bb.size_f for bb in array.scale(2., True)] == [bb.scale(2., True).topleft_f + bb.scale(2., True).size_f for bb in detections]
+  assert [bb.topleft_f + bb.size_f for bb in array.shift((3., -2.))] == [bb.shift((3., -2.)).topleft_f + bb.shift((3., -2.)).size_f for bb in detections]
+  assert [bb.topleft_f + bb.size_f for bb in array.mirror_x(300)] == [bb.mirror_x(300).topleft_f + bb.mirror_x(300).size_f for bb in detections]
+  assert (array.is_valid_for((200, 200)) == [bb.is_valid_for((200, 200)) for bb in detections]).all()
+
+  # similarities
+  assert (array.similarity(detections[0]) == [bb.similarity(detections[0]) for bb in detections]).all()
+  matrix = array.similarity(fd.BoxArray(boxes[:5]))
+  assert matrix.shape == (len(detections), 5)
+  assert (matrix[:,3] == [bb.similarity(detections[3]) for bb in detections]).all()
+
+  # pruning gives the same results
+  bb, val = fd.prune_detections(detections, predictions, 0.3)
+  bb_array, val_array = fd.prune_detections(array, predictions, 0.3)
+  assert isinstance(bb_array, fd.BoxArray)
+  assert list(bb_array) == bb
+  assert (val_array == val).all()
+
+  bb, val = fd.overlapping_detections(detections, predictions, 0.3)
+  bb_array, val_array = fd.overlapping_detections(array, predictions, 0.3)
+  assert list(bb_array) == bb
+  assert (val_array == val).all()
+
+  # pickling
+  assert (pickle.loads(pickle.dumps(array)).boxes == boxes).all()
+
+
+def _greedy_pruning(array, predictions, threshold, number_of_detections):
+  # the straightforward greedy pruning, comparing each box with all kept boxes
+  kept = []
+  for index in sorted(range(len(array)), key = lambda i : -predictions[i]):
+    if all(array[k].similarity(array[index]) <= threshold for k in kept):
+      kept.append(index)
+      if len(kept) == number_of_detections:
+        break
+  return kept
+
+def test_grid_pruning():
+  # tests that the spatial index in the pruning does not change the results
+  numpy.random.seed(42)
+  sizes = numpy.random.uniform(2., 60., (500, 1))
+  boxes = numpy.hstack((numpy.random.uniform(-20., 300., (500, 2)), sizes, sizes * numpy.random.uniform(0.5, 2., (500, 1))))
+  # a few large boxes, which span several cells
+  boxes[:5,2:] = 250.
+  predictions = numpy.random.uniform(size=500)
+  array = fd.BoxArray(boxes)
+
+  for threshold in (-0.5, 0., 0.1, 0.3, 0.7, 0.99, 1.):
+    for number_of_detections in (0, 1, 20):
+      pruned, values = fd.prune_detections(array, predictions, threshold, number_of_detections)
+      if threshold < 1.:
+        kept = _greedy_pruning(array, predictions, threshold, number_of_detections)
+        assert list(pruned) == [array[k] for k in kept]
+        assert (values == predictions[kept]).all()
+      else:
+        assert len(pruned) == 500
+
+  # tiny boxes, which are spread far apart, and which are partially identical
+  tiny = numpy.hstack((numpy.random.uniform(0., 1e6, (200, 2)), numpy.full((200, 2), 0.5)))
+  tiny[100:] = tiny[:100]
+  array = fd.BoxArray(tiny)
+  pruned, values = fd.prune_detections(array, predictions[:200], 0.3)
+  kept = _greedy_pruning(array, predictions[:200], 0.3, 0)
+  assert list(pruned) == [array[k] for k in kept]
+  assert len(kept) == 100
+
+
+def test_best_detection():
+  # tests that the clustering of overlapping detections and the merging of the best detection are not altered by the spatial index
+  numpy.random.seed(42)
+  sizes = numpy.random.uniform(10., 60., (300, 1))
+  boxes = numpy.hstack((numpy.random.uniform(0., 200., (300, 2)), sizes, sizes))
+  predictions = numpy.random.normal(size=300)
+  array = fd.BoxArray(boxes)
+
+  for threshold in (-0.5, 0., 0.2, 0.5, 1.):
+    # cluster each detection to the first cluster whose head overlaps
+    clusters = []
+    for index in sorted(range(len(array)), key = lambda i : -predictions[i]):
+      for cluster in clusters:
+        if array[cluster[0]].similarity(array[index]) > threshold:
+          cluster.append(index)
+          break
+      else:
+        clusters.append([index])
+    best = max(clusters, key = lambda c : sum(predictions[c]))
+    overlapping, values = fd.overlapping_detections(array, predictions, threshold)
+    assert list(overlapping) == [array[i] for i in best]
+    assert (values == predictions[best]).all()
+
+  # compute the merged detection in python
+  positive = predictions > 0
+  detections, values = fd.overlapping_detections(fd.BoxArray(boxes[positive]), predictions[positive], 0.2)
+  weights = values / values.sum()
+  top, left = weights.dot(detections.boxes[:,0]), weights.dot(detections.boxes[:,1])
+  bottom, right = weights.dot(detections.boxes[:,0] + detections.boxes[:,2]), weights.dot(detections.boxes[:,1] + detections.boxes[:,3])
+
+  for d in (array, list(array)):
+    bb, value = fd.best_detection(d, predictions, 0.2)
+    assert numpy.allclose(bb.topleft_f + bb.bottomright_f, (top, left, bottom, right))
+    assert abs(value - weights.dot(values)) < 1e-8
+
+  # no positive detections
+  nose.tools.assert_raises(ValueError, fd.best_detection, array, -numpy.abs(predictions))
@@ -1,3 +1,4 @@
+import nose.tools
 import numpy
 
 import bob.io.base
@@ -82,3 +83,100 @@ def test02_multiple_LBP():
         extractor.extract_indexed(bb, some, numpy.array(indices, numpy.int32))
         for i in indices:
           assert some[i] == feature[0,i]
+
+
+def test03_compact():
+  # checks that uint8 images prepared in compact form result in identical LBP codes
+  bb = bob.ip.facedetect.BoundingBox((10, 10), (24, 20))
+  test_image = bob.ip.color.rgb_to_gray(bob.io.base.load(bob.io.base.test_utils.datafile("testimage.jpg", 'bob.ip.facedetect')))
+  assert test_image.dtype == numpy.uint8
+
+  for lbp in (bob.ip.base.LBP(8, to_average=True, add_average_bit=True), bob.ip.base.LBP(8, 2., circular=True), bob.ip.base.LBP(8, (2,2)), bob.ip.base.LBP(8, (3,2), to_average=True, add_average_bit=True)):
+    extractor = bob.ip.facedetect.FeatureExtractor(patch_size = (24,20), extractors = [lbp])
+    reference = numpy.ndarray((1, extractor.number_of_features), numpy.uint16)
+    feature = numpy.ndarray((1, extractor.number_of_features), numpy.uint16)
+
+    # in the original scale, the codes are identical
+    extractor.prepare(test_image, 1, True)
+    extractor.extract_all(bb, reference, 0)
+    mean_variance = extractor.mean_variance(bb, True)
+    extractor.compact = True
+    extractor.prepare(test_image, 1, True)
+    assert extractor.image.dtype == numpy.uint8
+    assert (extractor.image == test_image).all()
+    extractor.extract_all(bb, feature, 0)
+    assert (feature == reference).all()
+    assert numpy.allclose(extractor.mean_variance(bb, True), mean_variance)
+
+    # other scales are prepared in double precision
+    extractor.prepare(test_image, 0.5)
+    assert extractor.image.dtype == numpy.float64
+    assert numpy.allclose(extractor.image, bob.ip.base.scale(test_image, 0.5))
+
+    # the compact form is also used with code maps and workspaces
+    extractor.code_maps = True
+    workspace = bob.ip.facedetect.Workspace()
+    extractor.prepare(test_image, 1, workspace=workspace)
+    assert workspace.image.dtype == numpy.uint8
+    some = numpy.zeros(extractor.number_of_features, dtype=numpy.uint16)
+    indices = numpy.array([20, 53, 66], numpy.int32)
+    extractor.extract_indexed(bb, some, indices, workspace)
+    assert (some[indices] == reference[0,indices]).all()
+
+
+def test04_dense_codes():
+  # checks that the LBP codes of the code maps, which are computed row by row, are identical to the extracted ones
+  test_image = bob.ip.color.rgb_to_gray(bob.io.base.load(bob.io.base.test_utils.datafile("testimage.jpg", 'bob.ip.facedetect')))
+  # images with many identical pixel values, and with almost identical pixel values that are compared with a tolerance
+  tie_image = (test_image // 64).astype(numpy.uint8)
+  flat_image = tie_image.astype(numpy.float64) * (1. + 1e-7 * (numpy.arange(test_image.size) % 3).reshape(test_image.shape))
+  # the bounding boxes in the given scale, including the last one in the scaled image
+  boxes = lambda scale: [bob.ip.facedetect.BoundingBox((y, x), (24, 20)) for y, x in ((0, 0), (10, 10), (37, 81), (int(test_image.shape[0] * scale + 0.5) - 24, int(test_image.shape[1] * scale + 0.5) - 20))]
+
+  variants = [{}, {'uniform' : True}, {'rotation_invariant' : True}, {'uniform' : True, 'rotation_invariant' : True}, {'to_average' : True}, {'to_average' : True, 'add_average_bit' : True}, {'elbp_type' : 'transitional'}, {'elbp_type' : 'direction-coded'}, {'to_average' : True, 'elbp_type' : 'direction-coded'}, {'to_average' : True, 'add_average_bit' : True, 'elbp_type' : 'transitional'}]
+  for variant in variants:
+    for lbp in (bob.ip.base.LBP(8, **variant), bob.ip.base.LBP(8, circular=True, **variant), bob.ip.base.LBP(4, 2., **variant), bob.ip.base.LBP(4, 1., circular=True, **variant), bob.ip.base.LBP(8, 2., 1., **variant), bob.ip.base.LBP(8, 2., 1., circular=True, **variant)):
+      extractor = bob.ip.facedetect.FeatureExtractor(patch_size = (24,20), extractors = [lbp])
+      indices = numpy.arange(extractor.number_of_features, dtype=numpy.int32)
+      reference = numpy.ndarray((1, extractor.number_of_features), numpy.uint16)
+      feature = numpy.zeros(extractor.number_of_features, numpy.uint16)
+      for image, scale, compact in ((test_image, 1, False), (test_image, 1, True), (test_image, 0.5, False), (tie_image, 1, False), (tie_image, 1, True), (flat_image, 1, False)):
+        extractor.compact = compact
+        extractor.code_maps = False
+        extractor.prepare(image, scale)
+        extractor.code_maps = True
+        workspace = bob.ip.facedetect.Workspace()
+        extractor.prepare(image, scale, workspace=workspace)
+        for bb in boxes(scale):
+          extractor.extract_all(bb, reference, 0)
+          extractor.extract_indexed(bb, feature, indices, workspace)
+          assert (feature == reference[0]).all(), (variant, scale, compact)
+
+
+def test05_batch():
+  # checks that the features of several bounding boxes extracted at once are identical to the ones extracted one by one
+  test_image = bob.ip.color.rgb_to_gray(bob.io.base.load(bob.io.base.test_utils.datafile("testimage.jpg", 'bob.ip.facedetect')))
+  boxes = [bob.ip.facedetect.BoundingBox((y, x), (24, 20)) for y, x in ((0, 0), (10, 10), (37, 81), (50, 12))]
+  box_array = bob.ip.facedetect.BoxArray(boxes)
+
+  for extractors in ([bob.ip.base.LBP(8), bob.ip.base.LBP(8, 2., circular=True)], [bob.ip.base.LBP(8, (2,2)), bob.ip.base.LBP(8, (3,2), to_average=True, add_average_bit=True)]):
+    extractor = bob.ip.facedetect.FeatureExtractor(patch_size = (24,20), extractors = extractors)
+    reference = numpy.ndarray((len(boxes), extractor.number_of_features), numpy.uint16)
+    features = numpy.zeros((len(boxes) + 1, extractor.number_of_features), numpy.uint16)
+    for compact in (False, True):
+      extractor.compact = compact
+      extractor.prepare(test_image, 0.5)
+      for i, bb in enumerate(boxes):
+        extractor.extract_all(bb, reference, i)
+      extractor.extract_all_batch(box_array, features)
+      assert (features[:len(boxes)] == reference).all()
+      assert (features[len(boxes)] == 0).all()
+
+      # the codes are reused for the same prepared image
+      extractor.extract_all_batch(bob.ip.facedetect.BoxArray(boxes[::-1]), features)
+      assert (features[:len(boxes)] == reference[::-1]).all()
+
+      # bounding boxes outside of the prepared image are rejected
+      outside = bob.ip.facedetect.BoxArray([bob.ip.facedetect.BoundingBox((test_image.shape[0], 0), (24, 20))])
+      nose.tools.assert_raises(RuntimeError, extractor.extract_all_batch, outside, features)
+      nose.tools.assert_raises(RuntimeError, extractor.extract_all_batch, box_array, features[:2])
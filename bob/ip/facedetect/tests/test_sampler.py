@@ -1,5 +1,10 @@
 import unittest
 import math
+import itertools
+import pickle
+import os
+import tempfile
+import nose.tools
 from nose.plugins.skip import SkipTest
 
 import numpy
@@ -28,7 +33,7 @@ def test_detection():
   # test that the detection works as expected
   test_image = bob.ip.color.rgb_to_gray(bob.io.base.load(bob.io.base.test_utils.datafile("testimage.jpg", 'bob.ip.facedetect')))
 
-  cascade = fd.default_cascade()
+  cascade = fd.default_cascade(cached=False)
   classifier = cascade.generate_boosted_machine()
   extractor = cascade.extractor
   extractor.model_indices = classifier.indices
@@ -86,3 +91,484 @@ def test_cascade():
   reference_file = bob.io.base.test_utils.datafile("boxes.hdf5", 'bob.ip.facedetect')
   reference = bob.io.base.load(reference_file)
   assert numpy.count_nonzero(boxes != reference) == 0
+
+
+def test_scan():
+  # test that the native scan computes the same detections as the cascade
+  test_image = bob.ip.color.rgb_to_gray(bob.io.base.load(bob.io.base.test_utils.datafile("testimage.jpg", 'bob.ip.facedetect')))
+
+  cascade = fd.default_cascade()
+  sampler = fd.detector.Sampler(distance=2, scale_factor=math.pow(2.,-1./4.), lowest_scale=0.125)
+
+  detections = list(sampler.iterate_cascade(cascade, test_image))
+  predictions, boxes = sampler.scan_cascade(cascade, test_image)
+  assert len(predictions) == 14493
+  assert boxes.shape == (14493, 4)
+
+  # predictions need to be identical, not only close
+  assert numpy.count_nonzero(predictions != numpy.array([d[0] for d in detections])) == 0
+  assert numpy.count_nonzero(boxes != numpy.array([d[1].topleft_f + d[1].size_f for d in detections])) == 0
+
+  # check that the threshold is applied
+  predictions, boxes = sampler.scan_cascade(cascade, test_image, threshold=0)
+  assert len(predictions) == len([d for d in detections if d[0] > 0])
+  assert numpy.all(predictions > 0)
+
+
+def test_compiled_cascade():
+  # test that the compiled cascade computes identical predictions as the cascade
+  test_image = bob.ip.color.rgb_to_gray(bob.io.base.load(bob.io.base.test_utils.datafile("testimage.jpg", 'bob.ip.facedetect')))
+
+  cascade = fd.default_cascade()
+  compiled = cascade.compile()
+  assert isinstance(compiled, fd.CompiledCascade)
+  assert compiled.number_of_stages == len(cascade.cascade)
+  assert compiled.look_up_tables.shape[0] == sum(len(machine.weak_machines) for machine in cascade.cascade)
+
+  sampler = fd.detector.Sampler(distance=4, scale_factor=math.pow(2.,-1./2.), lowest_scale=0.125)
+  count = 0
+  for scale, shape in sampler.scales(test_image):
+    cascade.prepare(test_image, scale)
+    for bb in sampler.sample_scaled(shape):
+      assert cascade(bb) == compiled(cascade.extractor, bb)
+      count += 1
+  assert count > 0
+
+  # test that adding classifiers does not compile the cascade, but its first use does
+  staged = fd.detector.Cascade(feature_extractor=cascade.extractor)
+  for machine, threshold in zip(cascade.cascade, cascade.thresholds):
+    staged.add(machine, threshold)
+    assert not staged.m_is_compiled
+  staged.prepare(test_image, 1.)
+  assert staged.m_is_compiled
+  compiled = staged._compiled
+  assert staged._compiled is compiled
+  assert compiled.number_of_stages == len(cascade.cascade)
+  staged.add(cascade.cascade[0], cascade.thresholds[0])
+  assert not staged.m_is_compiled
+  assert staged._compiled.number_of_stages == len(cascade.cascade) + 1
+
+
+def test_code_maps():
+  # test that dense code maps do not change the predictions
+  test_image = bob.ip.color.rgb_to_gray(bob.io.base.load(bob.io.base.test_utils.datafile("testimage.jpg", 'bob.ip.facedetect')))
+
+  cascade = fd.default_cascade(cached=False)
+  sampler = fd.detector.Sampler(distance=2, scale_factor=math.pow(2.,-1./4.), lowest_scale=0.125)
+  predictions, boxes = sampler.scan_cascade(cascade, test_image)
+
+  cascade.use_code_maps()
+  assert cascade.extractor.code_maps
+  mapped_predictions, mapped_boxes = sampler.scan_cascade(cascade, test_image)
+  assert numpy.count_nonzero(predictions != mapped_predictions) == 0
+  assert numpy.count_nonzero(boxes != mapped_boxes) == 0
+
+  cascade.use_code_maps(False)
+  assert not cascade.extractor.code_maps
+
+
+def test_breadth_first():
+  # test that the stage-by-stage evaluation gives the same detections
+  test_image = bob.ip.color.rgb_to_gray(bob.io.base.load(bob.io.base.test_utils.datafile("testimage.jpg", 'bob.ip.facedetect')))
+
+  cascade = fd.default_cascade()
+  sampler = fd.detector.Sampler(distance=2, scale_factor=math.pow(2.,-1./4.), lowest_scale=0.125)
+
+  for threshold in (None, 0.):
+    predictions, boxes = sampler.scan_cascade(cascade, test_image, threshold)
+    bf_predictions, bf_boxes = sampler.scan_cascade(cascade, test_image, threshold, breadth_first=True)
+    assert numpy.count_nonzero(predictions != bf_predictions) == 0
+    assert numpy.count_nonzero(boxes != bf_boxes) == 0
+
+
+def test_threads():
+  # test that scanning the scales in parallel gives the same detections
+  test_image = bob.ip.color.rgb_to_gray(bob.io.base.load(bob.io.base.test_utils.datafile("testimage.jpg", 'bob.ip.facedetect')))
+
+  cascade = fd.default_cascade()
+  sampler = fd.detector.Sampler(distance=2, scale_factor=math.pow(2.,-1./4.), lowest_scale=0.125)
+
+  predictions, boxes = sampler.scan_cascade(cascade, test_image)
+  parallel_predictions, parallel_boxes = sampler.scan_cascade(cascade, test_image, num_threads=4)
+  assert numpy.count_nonzero(predictions != parallel_predictions) == 0
+  assert numpy.count_nonzero(boxes != parallel_boxes) == 0
+
+  serial = fd.detect_all_faces(test_image, cascade, threshold=20)
+  parallel = fd.detect_all_faces(test_image, cascade, threshold=20, num_threads=4)
+  assert [bb.topleft_f + bb.size_f for bb in serial[0]] == [bb.topleft_f + bb.size_f for bb in parallel[0]]
+  assert numpy.count_nonzero(serial[1] != parallel[1]) == 0
+
+
+def test_workspace():
+  # test that preparing an external workspace gives the same predictions as the internal one
+  test_image = bob.ip.color.rgb_to_gray(bob.io.base.load(bob.io.base.test_utils.datafile("testimage.jpg", 'bob.ip.facedetect')))
+
+  cascade = fd.default_cascade()
+  sampler = fd.detector.Sampler(distance=2, scale_factor=math.pow(2.,-1./4.), lowest_scale=0.125)
+  workspace = fd.Workspace()
+
+  scale = 0.25
+  cascade.prepare(test_image, scale)
+  cascade.prepare(test_image, scale, workspace)
+  assert workspace.image.shape == cascade.extractor.image.shape
+  assert numpy.allclose(workspace.image, cascade.extractor.image)
+  for bb in itertools.islice(sampler.sample_scaled(workspace.image.shape), 0, None, 50):
+    assert cascade(bb, workspace) == cascade(bb)
+
+  # the extractor is not modified when preparing the workspace with another scale
+  cascade.prepare(test_image, 0.5, workspace)
+  assert cascade.extractor.image.shape != workspace.image.shape
+
+  predictions, boxes = sampler.scan_cascade(cascade, test_image)
+  detections = list(sampler.iterate_cascade(cascade, test_image, workspace=workspace))
+  assert numpy.allclose(predictions, [prediction for prediction, _ in detections])
+  assert numpy.allclose(boxes, [bb.topleft_f + bb.size_f for _, bb in detections])
+
+
+def test_batch():
+  # test that the batch detection gives the same results as detecting the faces one by one
+  image_file = bob.io.base.test_utils.datafile("testimage.jpg", 'bob.ip.facedetect')
+  test_image = bob.io.base.load(image_file)
+
+  cascade = fd.default_cascade()
+  sampler = fd.detector.Sampler(distance=2, scale_factor=math.pow(2.,-1./4.), lowest_scale=0.125)
+  bb, quality = fd.detect_single_face(test_image, cascade, sampler)
+
+  # bounding boxes can be sent between processes
+  assert pickle.loads(pickle.dumps(bb)) == bb
+
+  images = [image_file, test_image, numpy.zeros((10, 10)), image_file, test_image]
+  for workers in (1, 2):
+    detections = list(fd.detect_faces_batch(images, cascade, sampler, workers=workers, chunksize=2, max_chunks=2))
+    assert len(detections) == len(images)
+    assert detections[2] is None
+    for detection in detections[:2] + detections[3:]:
+      assert detection[0] == bb
+      assert abs(detection[1] - quality) < 1e-8
+
+  # invalid arguments are reported immediately
+  nose.tools.assert_raises(ValueError, fd.detect_faces_batch, images, cascade, sampler, chunksize=0)
+  nose.tools.assert_raises(ValueError, fd.detect_faces_batch, images, cascade, sampler, max_chunks=0)
+
+  # the workers use the same extractor settings as the given cascade
+  cascade = fd.default_cascade(cached=False)
+  cascade.use_code_maps()
+  cascade.extractor.compact = True
+  detections = list(fd.detect_faces_batch(images, cascade, sampler, workers=2, chunksize=2))
+  assert detections[0][0] == bb
+  handle, cascade_file = tempfile.mkstemp(suffix=".hdf5")
+  os.close(handle)
+  try:
+    cascade.save(bob.io.base.HDF5File(cascade_file, 'w'))
+    fd.detect._init_batch(cascade_file, sampler, 0.2, (True, True, False))
+    extractor = fd.detect._batch[0].extractor
+    assert extractor.code_maps and extractor.compact and not extractor.scale_blocks
+    # the cached cascade of the file is not modified
+    cached = fd.warm_up(cascade_file)
+    assert cached is not fd.detect._batch[0]
+    assert not cached.extractor.code_maps and not cached.extractor.compact
+  finally:
+    os.remove(cascade_file)
+
+
+def test_cached_cascade():
+  # test that the default cascade and cascade files are loaded only once
+  cascade = fd.default_cascade()
+  assert fd.default_cascade() is cascade
+  assert fd.warm_up() is cascade
+  assert fd.default_cascade(cached=False) is not cascade
+
+  cascade_file = pkg_resources.resource_filename("bob.ip.facedetect", "MCT_cascade.hdf5")
+  assert fd.warm_up(cascade_file) is cascade
+
+
+def test_search():
+  # test that the search for the best detection gives the same results as the exhaustive scan
+  test_image = bob.ip.color.rgb_to_gray(bob.io.base.load(bob.io.base.test_utils.datafile("testimage.jpg", 'bob.ip.facedetect')))
+
+  cascade = fd.default_cascade()
+  sampler = fd.detector.Sampler(distance=2, scale_factor=math.pow(2.,-1./4.), lowest_scale=0.125)
+
+  predictions, boxes = sampler.scan_cascade(cascade, test_image)
+  assert cascade._compiled.upper_bounds[0] >= predictions.max()
+
+  # without margin, all positive predictions are returned
+  positive = predictions > 0
+  best_predictions, best_boxes = sampler.search_cascade(cascade, test_image)
+  assert numpy.count_nonzero(predictions[positive] != best_predictions) == 0
+  assert numpy.count_nonzero(boxes[positive] != best_boxes) == 0
+
+  # with margin, only the predictions close to the best are returned
+  close = predictions > max(0., predictions.max() - 5.)
+  best_predictions, best_boxes = sampler.search_cascade(cascade, test_image, margin=5.)
+  assert numpy.count_nonzero(predictions[close] != best_predictions) == 0
+  assert numpy.count_nonzero(boxes[close] != best_boxes) == 0
+
+  bb, quality = fd.detect_single_face(test_image, cascade, sampler)
+  best_bb, best_quality = fd.detect_single_face(test_image, cascade, sampler, exhaustive=False)
+  assert best_bb == bb
+  assert best_quality == quality
+
+
+def test_streaming_pruner():
+  # test that pruning the detections while scanning keeps the best detections
+  test_image = bob.ip.color.rgb_to_gray(bob.io.base.load(bob.io.base.test_utils.datafile("testimage.jpg", 'bob.ip.facedetect')))
+
+  cascade = fd.default_cascade()
+  sampler = fd.detector.Sampler(distance=2, scale_factor=math.pow(2.,-1./4.), lowest_scale=0.125)
+
+  predictions, boxes = sampler.scan_cascade(cascade, test_image, 0)
+  scales = list(sampler.scan_scales(cascade, test_image, 0))
+  assert (numpy.concatenate([p for p, _ in scales]) == predictions).all()
+  assert (numpy.concatenate([b for _, b in scales]) == boxes).all()
+  pruned, pruned_predictions = fd.prune_detections(fd.BoxArray(boxes), predictions, 0.2)
+
+  # when everything fits into the buffer, the results are identical
+  pruner = fd.StreamingPruner(0.2, len(predictions))
+  for prediction, bb in zip(predictions, fd.BoxArray(boxes)):
+    pruner.add(prediction, bb)
+  streamed, streamed_predictions = pruner.result()
+  assert (streamed.boxes == pruned.boxes).all()
+  assert (streamed_predictions == pruned_predictions).all()
+
+  # arrays of detections are added in chunks, which do not exceed the buffer
+  pruner = fd.StreamingPruner(0.2, 10)
+  pruner.add_all(predictions, boxes)
+  assert pruner.m_buffered < 10
+  assert pruner.result()[1][0] == pruned_predictions[0]
+
+  # with a small buffer, the best detection is kept, and the kept detections do not overlap
+  all_faces, qualities = fd.detect_all_faces(test_image, cascade, sampler, buffer_size=10)
+  assert all_faces[0] == pruned[0]
+  assert qualities[0] == pruned_predictions[0]
+  assert len(all_faces) <= len(pruned)
+  assert (numpy.diff(qualities) <= 0).all()
+  for i in range(len(all_faces)):
+    for j in range(i):
+      assert all_faces[i].similarity(all_faces[j]) <= 0.2
+
+
+def test_allocations():
+  # test that scanning an image of the same size again does not enlarge the buffers of the workspace
+  test_image = bob.ip.color.rgb_to_gray(bob.io.base.load(bob.io.base.test_utils.datafile("testimage.jpg", 'bob.ip.facedetect')))
+
+  cascade = fd.default_cascade()
+  sampler = fd.detector.Sampler(distance=2, scale_factor=math.pow(2.,-1./4.), lowest_scale=0.125)
+  workspace = fd.Workspace()
+  assert workspace.allocations == 0
+
+  predictions, boxes = sampler.scan_cascade(cascade, test_image, breadth_first=True, workspace=workspace)
+  allocations = workspace.allocations
+  assert allocations > 0
+
+  # the second scan of the same image and a scan of a smaller image reuse the memory, including the buffers for the results
+  for image, breadth_first in ((test_image, True), (test_image, False), (test_image[:200,:300].copy(), True)):
+    p, b = sampler.scan_cascade(cascade, image, breadth_first=breadth_first, workspace=workspace)
+    assert workspace.allocations == allocations
+  sampler.search_cascade(cascade, test_image, workspace=workspace)
+  assert workspace.allocations == allocations
+  assert (p == sampler.scan_cascade(cascade, test_image[:200,:300].copy(), workspace=fd.Workspace())[0]).all()
+
+  # the threads of the plan and their workspaces are reused for all images
+  plan = sampler.plan(test_image.shape)
+  threaded = sampler.scan_cascade(cascade, test_image, num_threads=2, plan=plan)
+  assert (threaded[0] == predictions).all()
+  pool = plan.pool(2)
+  assert len(plan.pool_workspaces) == 2
+  # .. each workspace is enlarged at most until it has scanned the largest scale
+  for thread_workspace in plan.pool_workspaces:
+    sampler.scan_cascade(cascade, test_image, workspace=thread_workspace, plan=plan)
+  thread_allocations = sum(w.allocations for w in plan.pool_workspaces)
+  for _ in range(3):
+    assert (sampler.scan_cascade(cascade, test_image, num_threads=2)[0] == predictions).all()
+  assert plan.pool(2) is pool
+  assert len(plan.pool_workspaces) == 2
+  assert sum(w.allocations for w in plan.pool_workspaces) == thread_allocations
+
+  # the returned image is not modified by preparing another image
+  cascade.prepare(test_image, 0.5, workspace)
+  image = workspace.image
+  cascade.prepare(test_image, 0.25, workspace)
+  assert image.shape != workspace.image.shape
+  assert workspace.allocations == allocations
+
+
+def test_plan():
+  # test that detection plans give the same results and are cached
+  test_image = bob.ip.color.rgb_to_gray(bob.io.base.load(bob.io.base.test_utils.datafile("testimage.jpg", 'bob.ip.facedetect')))
+
+  cascade = fd.default_cascade()
+  sampler = fd.detector.Sampler(distance=2, scale_factor=math.pow(2.,-1./4.), lowest_scale=0.125)
+
+  plan = sampler.plan(test_image.shape)
+  assert isinstance(plan, fd.DetectionPlan)
+  assert plan.scales == list(sampler.scales(test_image))
+  # the scaled shapes are computed from the shape only, in the same way as bob.ip.base scales images
+  for scale, shape in plan.scales:
+    assert shape == bob.ip.base.scaled_output_shape(test_image, scale)
+  # the cached plan is returned for the same parameters, also for color images and other samplers
+  assert sampler.plan((3,) + test_image.shape) is plan
+  assert fd.detector.Sampler(distance=2, scale_factor=math.pow(2.,-1./4.), lowest_scale=0.125).plan(test_image.shape) is plan
+  assert sampler.plan((100, 100)) is not plan
+  assert fd.detector.Sampler(distance=4, scale_factor=math.pow(2.,-1./4.), lowest_scale=0.125).plan(test_image.shape) is not plan
+
+  # the plan gives the same predictions
+  predictions, boxes = sampler.scan_cascade(cascade, test_image)
+  plan_predictions, plan_boxes = sampler.scan_cascade(cascade, test_image, plan=plan)
+  assert (predictions == plan_predictions).all()
+  assert (boxes == plan_boxes).all()
+  allocations = plan.workspace.allocations
+  assert fd.detect_single_face(test_image, cascade, sampler) == fd.detect_single_face(test_image, cascade, plan=plan)
+  assert plan.workspace.allocations == allocations
+  # without plan, the detection functions use the workspace of the cached plan
+  fd.detect_all_faces(test_image, cascade, sampler)
+  assert plan.workspace.allocations == allocations
+
+  # the plan cannot be used for other images
+  nose.tools.assert_raises(ValueError, sampler.scan_cascade, cascade, test_image[:100,:100].copy(), plan=plan)
+
+
+def test_pyramid():
+  # test that the image pyramid computes the same scales and finds the same face
+  test_image = bob.ip.color.rgb_to_gray(bob.io.base.load(bob.io.base.test_utils.datafile("testimage.jpg", 'bob.ip.facedetect')))
+
+  pyramid = fd.ImagePyramid(test_image)
+  assert pyramid.shape == test_image.shape
+  assert pyramid.octaves == int(math.log(min(test_image.shape), 2)) + 1
+  assert numpy.allclose(pyramid.octave(0), test_image)
+  # each octave averages 2x2 blocks of the previous one
+  octave = pyramid.octave(1)
+  h, w = octave.shape
+  assert numpy.allclose(octave, test_image[:2*h,:2*w].astype(numpy.float64).reshape(h, 2, w, 2).mean(axis=(1,3)))
+  # the scaled images have the same shapes as the directly scaled images
+  for scale in (1., 0.7, 0.5, 0.3, 0.1):
+    assert pyramid.scaled_shape(scale) == bob.ip.base.scaled_output_shape(test_image, scale)
+    assert pyramid.scale(scale).shape == pyramid.scaled_shape(scale)
+
+  cascade = fd.default_cascade()
+  sampler = fd.detector.Sampler(distance=2, scale_factor=math.pow(2.,-1./4.), lowest_scale=0.125)
+  assert list(sampler.scales(pyramid)) == list(sampler.scales(test_image))
+  cascade.prepare(pyramid, 0.25, fd.Workspace())
+
+  bb, quality = fd.detect_single_face(test_image, cascade, sampler)
+  pyramid_bb, pyramid_quality = fd.detect_single_face(pyramid, cascade, sampler)
+  assert pyramid_bb.similarity(bb) > 0.7
+
+  # re-building the pyramid with another image
+  pyramid.build(test_image[:100,:50].copy())
+  assert pyramid.shape == (100, 50)
+  assert pyramid.octaves == 6
+
+
+def test_block_scaling():
+  test_image = bob.ip.color.rgb_to_gray(bob.io.base.load(bob.io.base.test_utils.datafile("testimage.jpg", 'bob.ip.facedetect')))
+
+  # an image that is twice as large, where each pixel is duplicated, has exactly the twice as large MB-LBP blocks
+  small = test_image[:100,:120].astype(numpy.float64)
+  large = numpy.kron(small, numpy.ones((2,2)))
+  for lbp in (bob.ip.base.LBP(8, (1,1)), bob.ip.base.LBP(8, (2,3), to_average=True, add_average_bit=True), bob.ip.base.LBP(8, (3,3), (1,1))):
+    extractor = fd.FeatureExtractor(patch_size = (24,20), extractors = [lbp])
+    scaled = numpy.ndarray((1, extractor.number_of_features), numpy.uint16)
+    features = numpy.ndarray((1, extractor.number_of_features), numpy.uint16)
+    for bb in (fd.BoundingBox((0, 0), (24, 20)), fd.BoundingBox((10, 30), (24, 20)), fd.BoundingBox((75, 99), (24, 20))):
+      extractor.scale_blocks = False
+      extractor.prepare(small, 1.)
+      extractor.extract_all(bb, features, 0)
+      extractor.scale_blocks = True
+      extractor.prepare(large, 0.5)
+      assert extractor.image.shape == large.shape
+      extractor.extract_all(bb, scaled, 0)
+      assert (scaled == features).all()
+      # in compact form, the scaled blocks are extracted from the integer integral image of the full resolution image
+      extractor.compact = True
+      extractor.prepare(large.astype(numpy.uint8), 0.5)
+      assert extractor.image.dtype == numpy.uint8
+      assert extractor.image.shape == large.shape
+      extractor.extract_all(bb, scaled, 0)
+      assert (scaled == features).all()
+      extractor.compact = False
+
+  cascade = fd.default_cascade(cached = False)
+  if not cascade.extractor.extractors[0].is_multi_block_lbp:
+    raise SkipTest("The default cascade does not use multi-block LBP's")
+  cascade.extractor.scale_blocks = True
+  sampler = fd.detector.Sampler(distance=2, scale_factor=math.pow(2.,-1./4.), lowest_scale=0.125)
+
+  # blocks are only scaled for scales smaller than 1
+  workspace = fd.Workspace()
+  cascade.prepare(test_image, 1., workspace)
+  assert not workspace.scaled_blocks
+  assert workspace.shape == test_image.shape
+  cascade.prepare(test_image, 0.5, workspace)
+  assert workspace.scaled_blocks
+  assert workspace.shape == bob.ip.base.scaled_output_shape(test_image, 0.5)
+  assert workspace.image.shape == test_image.shape
+
+  # with an image pyramid, the nearest octave is used
+  pyramid = fd.ImagePyramid(test_image)
+  cascade.prepare(pyramid, 0.3, workspace)
+  assert workspace.image.shape == pyramid.octave(1).shape
+  assert fd.ImagePyramid(test_image, 1).octaves == 1
+
+  # the same bounding boxes are sampled, with approximated predictions
+  predictions, boxes = sampler.scan_cascade(cascade, test_image)
+  assert fd.detect_single_face(pyramid, cascade, sampler) is not None
+
+  # compact uint8 images give identical predictions with scaled blocks
+  cascade.extractor.compact = True
+  cascade.prepare(test_image, 0.5, workspace)
+  assert workspace.scaled_blocks
+  assert workspace.image.dtype == numpy.uint8
+  assert workspace.image.shape == test_image.shape
+  compact_predictions, compact_boxes = sampler.scan_cascade(cascade, test_image)
+  assert numpy.count_nonzero(compact_predictions != predictions) == 0
+  assert numpy.count_nonzero(compact_boxes != boxes) == 0
+  cascade.extractor.compact = False
+
+  cascade.extractor.scale_blocks = False
+  reference_predictions, reference_boxes = sampler.scan_cascade(cascade, test_image)
+  assert predictions.shape == reference_predictions.shape
+  assert numpy.allclose(boxes, reference_boxes)
+
+
+def test_region():
+  test_image = bob.ip.color.rgb_to_gray(bob.io.base.load(bob.io.base.test_utils.datafile("testimage.jpg", 'bob.ip.facedetect')))
+  cascade = fd.default_cascade()
+  roi = fd.BoundingBox((20, 30), (100, 120))
+  sampler = fd.detector.Sampler(distance=2, scale_factor=math.pow(2.,-1./4.), lowest_scale=0.125, roi=roi, min_face_size=30, max_face_size=80)
+  sizes = fd.detector.Sampler(distance=2, scale_factor=math.pow(2.,-1./4.), lowest_scale=0.125, min_face_size=30, max_face_size=80)
+  full = fd.detector.Sampler(distance=2, scale_factor=math.pow(2.,-1./4.), lowest_scale=0.125)
+
+  # the image is cropped to the region of interest
+  cropped, offset = sampler.crop(test_image)
+  assert offset == (20, 30)
+  assert (cropped == test_image[20:120, 30:150]).all()
+  assert full.crop(test_image)[0] is test_image
+
+  # only scales with the requested face sizes are used
+  scales = list(sampler.scales(test_image))
+  assert scales
+  assert scales == list(sizes.scales(cropped))
+  color_image = numpy.array([test_image] * 3)
+  assert list(sampler.scales(color_image)) == list(sizes.scales(color_image[:, 20:120, 30:150].copy()))
+  assert set(scale for scale, _ in scales) < set(scale for scale, _ in full.scales(cropped))
+  for scale, _ in scales:
+    assert 30 <= 24. / scale <= 80
+
+  # all bounding boxes are inside the region of interest
+  for bb in sampler.sample(test_image):
+    assert bb.top_f >= 20 and bb.left_f >= 30 and bb.bottom_f <= 120 and bb.right_f <= 150
+    assert 30 <= bb.size_f[0] <= 80
+
+  # the detections are the ones in the cropped image, shifted by the offset
+  detections = list(sampler.iterate_cascade(cascade, test_image))
+  reference = list(sizes.iterate_cascade(cascade, cropped))
+  assert len(detections) == len(reference)
+  assert numpy.allclose([p for p, _ in detections], [p for p, _ in reference])
+  assert numpy.allclose([bb.topleft_f for _, bb in detections], [(bb.top_f + 20, bb.left_f + 30) for _, bb in reference])
+
+  # scanning the image results in the same detections
+  predictions, boxes = sampler.scan_cascade(cascade, test_image, plan=sampler.plan(test_image.shape))
+  assert numpy.allclose(predictions, [p for p, _ in detections])
+  assert numpy.allclose(boxes, [bb.topleft_f + bb.size_f for _, bb in detections])
+  assert sampler.plan(test_image.shape) is not full.plan(test_image.shape)
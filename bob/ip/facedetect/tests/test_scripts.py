@@ -94,6 +94,12 @@ def test_extraction():
     assert hdf5.get("TotalPositives") == 9 # yes, an odd number makes sense, even if we have mirrored images. The Sampler is the reason
     assert hdf5.get("TotalNegatives") == 1262
 
+    index = hdf5.get("Index")
+    assert sum(index[index[:,0] == 1, 4]) == 9
+    assert sum(index[index[:,0] == -1, 4]) == 1262
+    for label, image, mirrored, scale, size in index:
+      assert hdf5.get("/Image-%d/%s-%s-%.5f" % (image, "Positives" if label > 0 else "Negatives", "om"[int(mirrored)], scale)).shape[0] == size
+
     assert hdf5.has_group("Image-0")
     hdf5.cd("Image-0")
     for k in hdf5.keys(relative=True):
@@ -11,6 +11,7 @@ import bob.io.base.test_utils
 import bob.io.image
 import bob.ip.base
 import bob.ip.color
+import bob.learn.boosting
 
 
 import bob.ip.facedetect as fd
@@ -97,3 +98,185 @@ def test_extraction():
   finally:
     if os.path.exists(temp_dir):
       shutil.rmtree(temp_dir)
+
+
+def test_extraction_workers():
+  # Test that features extracted in local processes are identical to the ones extracted in grid jobs
+
+  temp_dir = tempfile.mkdtemp(prefix="FD_")
+
+  try:
+    annotations = fd.train.read_annotation_file(bob.io.base.test_utils.datafile("testimage.pos", 'bob.ip.facedetect'), 'named')
+    sampler = fd.detector.Sampler(distance=2, scale_factor=math.pow(2.,-1./4.), lowest_scale=0.125)
+    extractor = fd.FeatureExtractor(patch_size = (24,20), extractors = [bob.ip.base.LBP(8)])
+
+    train_sets = [fd.train.TrainingSet(os.path.join(temp_dir, d)) for d in ("grid", "workers")]
+    for train_set in train_sets:
+      for _ in range(3):
+        train_set.add_image(bob.io.base.test_utils.datafile("testimage.jpg", 'bob.ip.facedetect'), annotations)
+
+    # extract features as two grid jobs would do
+    try:
+      for task_id in ("1", "2"):
+        os.environ["SGE_TASK_ID"] = task_id
+        train_sets[0].extract(sampler, extractor, number_of_examples_per_scale=(10, 10), parallel=2, mirror=True)
+    finally:
+      del os.environ["SGE_TASK_ID"]
+
+    # extract features in two local processes
+    train_sets[1].extract(sampler, extractor, number_of_examples_per_scale=(10, 10), mirror=True, workers=2)
+    nose.tools.assert_raises(ValueError, train_sets[1].extract, sampler, extractor, parallel=3, workers=2)
+
+    for name in ("Features_01.hdf5", "Features_02.hdf5"):
+      grid, workers = [bob.io.base.HDF5File(os.path.join(temp_dir, d, name)) for d in ("grid", "workers")]
+      assert grid.sub_groups(relative=True) == workers.sub_groups(relative=True)
+      assert grid.keys() == workers.keys()
+      for key in grid.keys():
+        assert (grid.get(key) == workers.get(key)).all()
+    assert not os.path.exists(os.path.join(temp_dir, "workers", "Features_00.hdf5"))
+
+    # the sampled features are identical
+    grid_features, grid_labels = train_sets[0].sample(maximum_number_of_positives=20, maximum_number_of_negatives=50)
+    features, labels = train_sets[1].sample(maximum_number_of_positives=20, maximum_number_of_negatives=50)
+    assert (features == grid_features).all()
+    assert (labels == grid_labels).all()
+  finally:
+    if os.path.exists(temp_dir):
+      shutil.rmtree(temp_dir)
+
+
+def test_labelling():
+  # Test that the vectorized labelling of the sampled bounding boxes is identical to comparing each bounding box with the ground truth
+  from bob.ip.facedetect.train.TrainingSet import _label
+  sampler = fd.detector.Sampler(distance=2, scale_factor=math.pow(2.,-1./4.), lowest_scale=0.125)
+  ground_truth = [fd.BoundingBox((20, 30), (60, 50)), fd.BoundingBox((25, 40), (48, 40)), fd.BoundingBox((100, 110), (30, 25))]
+  thresholds = (0.3, 0.7)
+  for scale, shape in sampler.scales(numpy.ndarray((160, 200), numpy.uint8)):
+    tops, lefts = sampler.sample_scaled_offsets(shape)
+    boxes = list(sampler.sample_scaled(shape))
+    assert [bb.topleft for bb in boxes] == list(zip(tops, lefts))
+    positive, negative = _label(tops, lefts, sampler.m_patch_box.size_f, ground_truth, scale, thresholds)
+    for i, bb in enumerate(boxes):
+      similarities = [bb.similarity(gt.scale(scale)) for gt in ground_truth]
+      first = next((s for s in similarities if s > thresholds[0]), None)
+      assert positive[i] == (first is not None and first > thresholds[1])
+      assert negative[i] == (first is None)
+
+
+def test_indexed_sample():
+  # Test that sampling only the requested features from the indexed feature files is identical to sampling from all features
+
+  temp_dir = tempfile.mkdtemp(prefix="FD_")
+
+  try:
+    annotations = fd.train.read_annotation_file(bob.io.base.test_utils.datafile("testimage.pos", 'bob.ip.facedetect'), 'named')
+    sampler = fd.detector.Sampler(distance=2, scale_factor=math.pow(2.,-1./4.), lowest_scale=0.125)
+    extractor = fd.FeatureExtractor(patch_size = (24,20), extractors = [bob.ip.base.LBP(8)])
+
+    train_set = fd.train.TrainingSet(os.path.join(temp_dir, "indexed"))
+    for _ in range(3):
+      train_set.add_image(bob.io.base.test_utils.datafile("testimage.jpg", 'bob.ip.facedetect'), annotations)
+    train_set.extract(sampler, extractor, number_of_examples_per_scale=(10, 10), mirror=True, workers=2)
+
+    # write the same features without index, as older versions did
+    old_set = fd.train.TrainingSet(os.path.join(temp_dir, "old"))
+    os.makedirs(old_set.feature_directory)
+    for name in ("Features_01.hdf5", "Features_02.hdf5"):
+      indexed = bob.io.base.HDF5File(os.path.join(train_set.feature_directory, name))
+      old = bob.io.base.HDF5File(os.path.join(old_set.feature_directory, name), 'w')
+      for image in indexed.sub_groups(recursive=False, relative=True):
+        indexed.cd(image)
+        old.create_group(image)
+        old.cd(image)
+        for scale in indexed.keys(relative=True):
+          old.set(scale, indexed.get(scale))
+        indexed.cd("..")
+        old.cd("..")
+      old.set("TotalPositives", indexed.get("TotalPositives"))
+      old.set("TotalNegatives", indexed.get("TotalNegatives"))
+      del indexed, old
+
+    # sample all features
+    positive_count, negative_count = 0, 0
+    for name in ("Features_01.hdf5", "Features_02.hdf5"):
+      hdf5 = bob.io.base.HDF5File(os.path.join(train_set.feature_directory, name))
+      positive_count += hdf5.get("TotalPositives")
+      negative_count += hdf5.get("TotalNegatives")
+    all_features, all_labels = fd.train.TrainingSet(train_set.feature_directory).sample(positive_indices=set(range(positive_count)), negative_indices=set(range(negative_count)))
+    assert len(all_features) == positive_count + negative_count
+
+    # sample some features
+    positive_indices, negative_indices = set(range(1, positive_count, 3)), set(range(0, negative_count, 7))
+    features, labels = train_set.sample(positive_indices=positive_indices, negative_indices=negative_indices)
+    assert (features[labels == 1] == all_features[all_labels == 1][sorted(positive_indices)]).all()
+    assert (features[labels == -1] == all_features[all_labels == -1][sorted(negative_indices)]).all()
+
+    # the features of older feature files are sampled in the same order
+    old_features, old_labels = old_set.sample(positive_indices=positive_indices, negative_indices=negative_indices)
+    assert (old_features == features).all()
+    assert (old_labels == labels).all()
+  finally:
+    if os.path.exists(temp_dir):
+      shutil.rmtree(temp_dir)
+
+
+def test_feature_matrix():
+  # Test that features sampled from the memory-mapped feature matrices are identical to the ones from the feature files
+
+  temp_dir = tempfile.mkdtemp(prefix="FD_")
+
+  try:
+    annotations = fd.train.read_annotation_file(bob.io.base.test_utils.datafile("testimage.pos", 'bob.ip.facedetect'), 'named')
+    sampler = fd.detector.Sampler(distance=2, scale_factor=math.pow(2.,-1./4.), lowest_scale=0.125)
+    extractor = fd.FeatureExtractor(patch_size = (24,20), extractors = [bob.ip.base.LBP(8)])
+
+    train_set = fd.train.TrainingSet(os.path.join(temp_dir, "features"))
+    for _ in range(2):
+      train_set.add_image(bob.io.base.test_utils.datafile("testimage.jpg", 'bob.ip.facedetect'), annotations)
+    train_set.extract(sampler, extractor, number_of_examples_per_scale=(10, 10), mirror=True, workers=2)
+    features, labels = fd.train.TrainingSet(train_set.feature_directory).sample(maximum_number_of_positives=20, maximum_number_of_negatives=50)
+
+    for data_type in ('uint16', 'uint8'):
+      matrix_directory = os.path.join(temp_dir, data_type)
+      train_set.convert(matrix_directory, data_type)
+      assert os.path.exists(os.path.join(matrix_directory, "Extractor.hdf5"))
+      matrix_features, matrix_labels = fd.train.TrainingSet(matrix_directory).sample(maximum_number_of_positives=20, maximum_number_of_negatives=50)
+      assert matrix_features.dtype == numpy.uint16
+      assert (matrix_features == features).all()
+      assert (matrix_labels == labels).all()
+
+    # the worst features are identical, when the worst ones are collected in a single pass through the matrix
+    model = bob.learn.boosting.BoostedMachine()
+    model.add_weak_machine(bob.learn.boosting.LUTMachine(numpy.linspace(-1., 1., 256), 5), 1.)
+    worst_features, worst_labels = fd.train.TrainingSet(train_set.feature_directory).sample(model, 3, 7)
+    for data_type in ('uint16', 'uint8'):
+      matrix_features, matrix_labels = fd.train.TrainingSet(os.path.join(temp_dir, data_type)).sample(model, 3, 7)
+      assert (matrix_features == worst_features).all()
+      assert (matrix_labels == worst_labels).all()
+
+    # features can be extracted into feature matrices directly, which can also be converted into one matrix
+    matrix_set = fd.train.TrainingSet(os.path.join(temp_dir, "extracted"))
+    matrix_set.image_paths, matrix_set.bounding_boxes = train_set.image_paths, train_set.bounding_boxes
+    matrix_set.extract(sampler, extractor, number_of_examples_per_scale=(10, 10), mirror=True, workers=2, data_type='uint8')
+    assert os.path.exists(os.path.join(matrix_set.feature_directory, "Features_01-Negatives.bin"))
+    for directory in (matrix_set.feature_directory, os.path.join(temp_dir, "combined")):
+      if directory != matrix_set.feature_directory:
+        matrix_set.convert(directory)
+      matrix_features, matrix_labels = fd.train.TrainingSet(directory).sample(maximum_number_of_positives=20, maximum_number_of_negatives=50)
+      assert (matrix_features == features).all()
+      assert (matrix_labels == labels).all()
+      matrix_features, matrix_labels = fd.train.TrainingSet(directory).sample(model, 3, 7)
+      assert (matrix_features == worst_features).all()
+      assert (matrix_labels == worst_labels).all()
+
+    nose.tools.assert_raises(ValueError, train_set.convert, os.path.join(temp_dir, "float"), 'float64')
+    nose.tools.assert_raises(ValueError, matrix_set.extract, sampler, extractor, data_type='float64')
+
+    # extracting features again removes the outdated feature matrix
+    train_set.convert()
+    assert os.path.exists(os.path.join(train_set.feature_directory, "Matrix.hdf5"))
+    train_set.extract(sampler, extractor, number_of_examples_per_scale=(10, 10), mirror=True, workers=2)
+    assert not os.path.exists(os.path.join(train_set.feature_directory, "Matrix.hdf5"))
+  finally:
+    if os.path.exists(temp_dir):
+      shutil.rmtree(temp_dir)
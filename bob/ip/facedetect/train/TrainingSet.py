@@ -6,12 +6,14 @@ import bob.ip.color
 import numpy
 
 import os
+import shutil
 import collections
+import multiprocessing
 import logging
 logger = logging.getLogger('bob.ip.facedetect')
 
 from .utils import bounding_box_from_annotation, parallel_part, quasi_random_indices
-from .._library import BoundingBox, FeatureExtractor
+from .._library import BoundingBox, BoxArray, FeatureExtractor
 
 class TrainingSet:
   """A set of images including bounding boxes that are used as a training set
@@ -149,12 +151,45 @@ class TrainingSet:
       index = 0 if parallel is None or "SGE_TASK_ID" not in os.environ else int(os.environ["SGE_TASK_ID"])
     return os.path.join(self.feature_directory, "Features_%02d.hdf5" % index)
 
+  def _feature_sources(self, use_matrix = True):
+    """Returns the number of positives and negatives, and a function returning an iterator over the blocks of features, for all feature files, or for the feature matrix written by :py:meth:`convert`."""
+    metadata_file = os.path.join(self.feature_directory, "Matrix.hdf5")
+    if use_matrix and os.path.exists(metadata_file):
+      logger.debug(".. Loading feature matrix %s", metadata_file)
+      hdf5 = bob.io.base.HDF5File(metadata_file)
+      return [(hdf5.get("TotalPositives"), hdf5.get("TotalNegatives"), lambda: _matrix_blocks(metadata_file))]
+
+    # get all existing feature files
+    feature_file = self._feature_file(index = 0)
+    if os.path.exists(feature_file):
+      feature_files = [feature_file]
+    else:
+      feature_files = []
+      i = 1
+      while True:
+        feature_file = self._feature_file(index = i)
+        if not os.path.exists(feature_file):
+          break
+        feature_files.append(feature_file)
+        i += 1
+
+    sources = []
+    for feature_file in feature_files:
+      logger.debug(".. Loading file %s", feature_file)
+      hdf5 = bob.io.base.HDF5File(feature_file)
+      if hdf5.has_key("DataType"):
+        # the features of this part have been appended to feature matrices
+        sources.append((hdf5.get("TotalPositives"), hdf5.get("TotalNegatives"), lambda feature_file=feature_file: _matrix_blocks(feature_file)))
+      else:
+        sources.append((hdf5.get("TotalPositives"), hdf5.get("TotalNegatives"), lambda feature_file=feature_file: _blocks(bob.io.base.HDF5File(feature_file))))
+    return sources
+
   def __len__(self):
     """Returns the number of files stored inside this training set."""
     return len(self.image_paths)
 
 
-  def extract(self, sampler, feature_extractor, number_of_examples_per_scale = (100, 100), similarity_thresholds = (0.5, 0.8), parallel = None, mirror = False, use_every_nth_negative_scale = 1):
+  def extract(self, sampler, feature_extractor, number_of_examples_per_scale = (100, 100), similarity_thresholds = (0.5, 0.8), parallel = None, mirror = False, use_every_nth_negative_scale = 1, workers = None, data_type = None):
     """Extracts features from **all** images in **all** scales and writes them to file.
 
     This function iterates over all images that are present in the internally stored list, and extracts features using the given ``feature_extractor`` for every image patch that the given ``sampler`` returns.
@@ -174,6 +209,18 @@ class TrainingSet:
     Each of the processes will run on a particular subset of the images, which is defined by the ``SGE_TASK_ID`` environment variable.
     The ``parallel`` parameter defines the total number of parallel processes that are used.
 
+    Alternatively, the images can be distributed to ``workers`` local processes, e.g., on a single machine with many cores.
+    The images are split into parts in the same way as for ``parallel = workers`` grid jobs, and each worker writes the feature file of its part.
+    Hence, the feature files are identical to the ones that are written by the according grid jobs, and :py:meth:`sample` can be used in the same way.
+
+    In each feature file, the positive and negative features of each image and scale are written into one dataset each, which is grouped by image.
+    Additionally, an ``Index`` is stored, which lists the label, the image index, whether the image is mirrored, the scale and the number of rows of each of these datasets, in the order in which the features are numbered by :py:meth:`sample`.
+    Hence, the dataset that contains a given feature can be found without reading any other dataset.
+
+    When a ``data_type`` is given, the features are instead appended to two flat binary feature matrices per feature file, e.g., ``Features_01-Positives.bin`` and ``Features_01-Negatives.bin``, which are memory-mapped by :py:meth:`sample`.
+    Then, the feature file only contains the metadata of the matrices, i.e., the data type, the number of features, the totals and an ``Index`` that lists the label, the first row in the matrix and the number of rows of each image and scale.
+    It is written after all features of the part are appended, so that incomplete matrices are not used.
+
     **Parameters:**
 
     ``sampler`` : :py:class:`Sampler`
@@ -199,97 +246,147 @@ class TrainingSet:
 
       .. note::
          The ``scale_counter`` is not reset between images, so that we might get features from different scales in subsequent images.
+
+    ``workers`` : int or ``None``
+      If given, the number of local processes, which are used to extract the features; ``parallel`` must be ``None`` or identical to ``workers``
+
+    ``data_type`` : :py:class:`numpy.dtype` or str or ``None``
+      If given, the features are appended to memory-mappable feature matrices of this data type, either ``uint16`` or ``uint8``, instead of being written into HDF5 datasets; see :py:meth:`convert` for details on the data types
     """
+    if workers is not None and parallel is not None and parallel != workers:
+      raise ValueError("The number of workers %d differs from the number of parallel jobs %d" % (workers, parallel))
+    if data_type is not None:
+      data_type = _check_data_type(data_type)
 
-    feature_file = self._feature_file(parallel)
     bob.io.base.create_directories_safe(self.feature_directory)
+    extractor_file = os.path.join(self.feature_directory, "Extractor.hdf5")
 
-    if parallel is None or "SGE_TASK_ID" not in os.environ or os.environ["SGE_TASK_ID"] == '1':
-      extractor_file = os.path.join(self.feature_directory, "Extractor.hdf5")
+    if workers is not None or parallel is None or "SGE_TASK_ID" not in os.environ or os.environ["SGE_TASK_ID"] == '1':
       hdf5 = bob.io.base.HDF5File(extractor_file, "w")
       feature_extractor.save(hdf5)
       del hdf5
-
-    total_positives, total_negatives = 0, 0
-
-    indices = parallel_part(range(len(self)), parallel)
+      # a feature matrix of previously extracted features is outdated
+      metadata_file = os.path.join(self.feature_directory, "Matrix.hdf5")
+      if os.path.exists(metadata_file):
+        os.remove(metadata_file)
+
+    options = (number_of_examples_per_scale, similarity_thresholds, mirror, use_every_nth_negative_scale, data_type)
+    if workers is None:
+      task_id = None if parallel is None or "SGE_TASK_ID" not in os.environ else int(os.environ["SGE_TASK_ID"])
+      self._extract_part(sampler, feature_extractor, options, parallel, task_id)
+      return
+
+    # the workers read the feature extractor from file, and write one feature file each
+    flags = (feature_extractor.compact, feature_extractor.scale_blocks)
+    pool = multiprocessing.Pool(workers)
+    try:
+      pool.map(_extract_part, [(self, sampler, extractor_file, flags, options, workers, task_id) for task_id in range(1, workers+1)], 1)
+    finally:
+      pool.terminate()
+      pool.join()
+
+
+  def _extract_part(self, sampler, feature_extractor, options, parallel, task_id):
+    """Extracts the features of the given (1-based) part of the images, see :py:meth:`extract`."""
+    number_of_examples_per_scale, similarity_thresholds, mirror, use_every_nth_negative_scale, data_type = options
+    feature_file = self._feature_file(index = task_id or 0)
+    totals = {1 : 0, -1 : 0}
+
+    indices = parallel_part(range(len(self)), parallel, task_id)
     if not indices:
       logger.warning("The index range for the current parallel thread is empty.")
     else:
       logger.info("Extracting features for images in range %d - %d of %d", indices[0], indices[-1], len(self))
 
-    hdf5 = bob.io.base.HDF5File(feature_file, "w")
-    for index in indices:
-      hdf5.create_group("Image-%d" % index)
-      hdf5.cd("Image-%d" % index)
-
-      logger.debug("Processing file %d of %d: %s", index+1, indices[-1]+1, self.image_paths[index])
-
-      # load image
-      image = bob.io.base.load(self.image_paths[index])
-      if image.ndim == 3:
-        image = bob.ip.color.rgb_to_gray(image)
-      # get ground_truth bounding boxes
-      ground_truth = self.bounding_boxes[index]
-
-      # collect image and GT for originally and mirrored image
-      images = [image] if not mirror else [image, bob.ip.base.flop(image)]
-      ground_truths = [ground_truth] if not mirror else [ground_truth, [gt.mirror_x(image.shape[1]) for gt in ground_truth]]
-      parts = "om"
-
-      # now, sample
-      scale_counter = -1
-      for image, ground_truth, part in zip(images, ground_truths, parts):
-        for scale, scaled_image_shape in sampler.scales(image):
-          scale_counter += 1
-          scaled_gt = [gt.scale(scale) for gt in ground_truth]
-          positives = []
-          negatives = []
-          # iterate over all possible positions in the image
-          for bb in sampler.sample_scaled(scaled_image_shape):
-            # check if the patch is a positive example
-            positive = False
-            negative = True
-            for gt in scaled_gt:
-              similarity = bb.similarity(gt)
-              if similarity > similarity_thresholds[1]:
-                positive = True
-                break
-              if similarity > similarity_thresholds[0]:
-                negative = False
-                break
-
-            if positive:
-              positives.append(bb)
-            elif negative and scale_counter % use_every_nth_negative_scale == 0:
-              negatives.append(bb)
-
-          # per scale, limit the number of positive and negative samples
-          positives = [positives[i] for i in quasi_random_indices(len(positives), number_of_examples_per_scale[0])]
-          negatives = [negatives[i] for i in quasi_random_indices(len(negatives), number_of_examples_per_scale[1])]
-
-          # extract features
-          feature_extractor.prepare(image, scale)
-          # .. negative features
-          if negatives:
-            negative_features = numpy.zeros((len(negatives), feature_extractor.number_of_features), numpy.uint16)
-            for i, bb in enumerate(negatives):
-              feature_extractor.extract_all(bb, negative_features, i)
-            hdf5.set("Negatives-%s-%.5f" % (part,scale), negative_features)
-            total_negatives += len(negatives)
-
-          # positive features
-          if positives:
-            positive_features = numpy.zeros((len(positives), feature_extractor.number_of_features), numpy.uint16)
-            for i, bb in enumerate(positives):
-              feature_extractor.extract_all(bb, positive_features, i)
-            hdf5.set("Positives-%s-%.5f" % (part,scale), positive_features)
-            total_positives += len(positives)
-      # cd backwards after each image
-      hdf5.cd("..")
-
-    hdf5.set("TotalPositives", total_positives)
-    hdf5.set("TotalNegatives", total_negatives)
+    if data_type is None:
+      hdf5 = bob.io.base.HDF5File(feature_file, "w")
+    else:
+      # the features are appended to the feature matrices of this part; the feature file, which contains the metadata of the matrices, is written last
+      if os.path.exists(feature_file):
+        os.remove(feature_file)
+      _, positives_file, negatives_file = _matrix_files(feature_file)
+      matrices = {1 : open(positives_file, 'wb'), -1 : open(negatives_file, 'wb')}
+    # the (dataset, label, image, mirrored, scale, number of rows) of all blocks of features, i.e., of all datasets that are written
+    # or the (dataset, label, first row, number of rows) of all blocks of features that are appended to the feature matrices
+    blocks = []
+
+    def write(features, label, index, part, scale):
+      # writes the given block of features
+      name = "%s-%s-%.5f" % ("Positives" if label > 0 else "Negatives", part, scale)
+      if data_type is None:
+        hdf5.set(name, features)
+        blocks.append((("Image-%d" % index, name), label, index, "om".index(part), scale, len(features)))
+      else:
+        _append_features(features, data_type, matrices[label])
+        blocks.append((("Image-%d" % index, name), label, totals[label], len(features)))
+      totals[label] += len(features)
+
+    try:
+      for index in indices:
+        logger.debug("Processing file %d of %d: %s", index+1, indices[-1]+1, self.image_paths[index])
+        if data_type is None:
+          hdf5.create_group("Image-%d" % index)
+          hdf5.cd("Image-%d" % index)
+
+        # load image
+        image = bob.io.base.load(self.image_paths[index])
+        if image.ndim == 3:
+          image = bob.ip.color.rgb_to_gray(image)
+        # get ground_truth bounding boxes
+        ground_truth = self.bounding_boxes[index]
+
+        # collect image and GT for originally and mirrored image
+        images = [image] if not mirror else [image, bob.ip.base.flop(image)]
+        ground_truths = [ground_truth] if not mirror else [ground_truth, [gt.mirror_x(image.shape[1]) for gt in ground_truth]]
+        parts = "om"
+
+        # now, sample
+        scale_counter = -1
+        for image, ground_truth, part in zip(images, ground_truths, parts):
+          for scale, scaled_image_shape in sampler.scales(image):
+            scale_counter += 1
+            # label all possible positions in the image at once
+            tops, lefts = sampler.sample_scaled_offsets(scaled_image_shape)
+            positive, negative = _label(tops, lefts, sampler.m_patch_box.size_f, ground_truth, scale, similarity_thresholds)
+            if scale_counter % use_every_nth_negative_scale != 0:
+              negative[:] = False
+
+            # per scale, limit the number of positive and negative samples
+            positives = numpy.flatnonzero(positive)
+            negatives = numpy.flatnonzero(negative)
+            positives = positives[list(quasi_random_indices(len(positives), number_of_examples_per_scale[0]))]
+            negatives = negatives[list(quasi_random_indices(len(negatives), number_of_examples_per_scale[1]))]
+
+            # extract features
+            feature_extractor.prepare(image, scale)
+            # .. negative features
+            if len(negatives):
+              negative_features = numpy.zeros((len(negatives), feature_extractor.number_of_features), numpy.uint16)
+              feature_extractor.extract_all_batch(_boxes(tops[negatives], lefts[negatives], sampler.m_patch_box.size_f), negative_features)
+              write(negative_features, -1, index, part, scale)
+
+            # positive features
+            if len(positives):
+              positive_features = numpy.zeros((len(positives), feature_extractor.number_of_features), numpy.uint16)
+              feature_extractor.extract_all_batch(_boxes(tops[positives], lefts[positives], sampler.m_patch_box.size_f), positive_features)
+              write(positive_features, 1, index, part, scale)
+
+        if data_type is None:
+          hdf5.cd("..")
+    finally:
+      if data_type is not None:
+        for matrix in matrices.values():
+          matrix.close()
+
+    # the index lists the blocks in the order, in which the features are numbered in :py:meth:`sample`, i.e., sorted by dataset name
+    if data_type is None:
+      if blocks:
+        hdf5.set("Index", numpy.array([b[1:] for b in sorted(blocks)], numpy.float64))
+      hdf5.set("TotalPositives", totals[1])
+      hdf5.set("TotalNegatives", totals[-1])
+    else:
+      _write_matrix_metadata(feature_file, data_type, feature_extractor.number_of_features, totals, [b[1:] for b in sorted(blocks)])
+    return totals[1], totals[-1]
 
   def sample(self, model = None, maximum_number_of_positives = None, maximum_number_of_negatives = None, positive_indices = None, negative_indices = None):
     """sample([model], [maximum_number_of_positives], [maximum_number_of_negatives], [positive_indices], [negative_indices]) -> positives, negatives
@@ -305,6 +402,10 @@ class TrainingSet:
     However, when you have to restart training from a given point, you can set the ``positive_indices`` and ``negative_indices`` parameters, to retrieve the features for the given indices.
     In this case, no additional features are selected, but the given sets of indices are stored internally.
 
+    Using the ``Index`` that :py:meth:`extract` stores in each feature file, only the datasets that contain selected features are read from file, and feature files that do not contain any of the selected features are skipped.
+    Feature files that have been written by older versions, i.e., without ``Index``, can still be read, but all of their features are loaded.
+    When the features have been extracted into feature matrices, or converted into a feature matrix using :py:meth:`convert`, the features are read from the memory-mapped matrices instead.
+
     .. note::
        The ``positive_indices`` and ``negative_indices`` only have an effect, when ``model`` is ``None``.
 
@@ -325,32 +426,18 @@ class TrainingSet:
       The new set of training features for the positive class (faces) and negative class (background).
     """
 
-    # get all existing feature files
-    feature_file = self._feature_file(index = 0)
-    if os.path.exists(feature_file):
-      feature_files = [feature_file]
-    else:
-      feature_files = []
-      i = 1
-      while True:
-        feature_file = self._feature_file(index = i)
-        if not os.path.exists(feature_file):
-          break
-        feature_files.append(feature_file)
-        i += 1
+    # get all existing feature files, or the feature matrix
+    sources = self._feature_sources()
 
     features = []
     labels = []
 
     # make a first iteration through the feature files and count the number of positives and negatives
     positive_count, negative_count = 0, 0
-    logger.info("Reading %d feature files", len(feature_files))
-    for feature_file in feature_files:
-      logger.debug(".. Loading file %s", feature_file)
-      hdf5 = bob.io.base.HDF5File(feature_file)
-      positive_count += hdf5.get("TotalPositives")
-      negative_count += hdf5.get("TotalNegatives")
-      del hdf5
+    logger.info("Reading %d feature files", len(sources))
+    for total_positives, total_negatives, _ in sources:
+      positive_count += total_positives
+      negative_count += total_negatives
 
     if model is None:
       # get a list of indices and store them, so that we don't re-use them next time
@@ -368,28 +455,25 @@ class TrainingSet:
       logger.info("Extracting %d of %d positive and %d of %d negative samples" % (len(positive_indices), positive_count, len(negative_indices), negative_count))
 
       positive_count, negative_count = 0, 0
-      for feature_file in feature_files:
-        hdf5 = bob.io.base.HDF5File(feature_file)
-        for image in sorted(hdf5.sub_groups(recursive=False, relative=True)):
-          hdf5.cd(image)
-          for scale in sorted(hdf5.keys(relative=True)):
-            read = hdf5.get(scale)
-            size = read.shape[0]
-            if scale.startswith("Positives"):
-              # copy positive data
-              while positive_indices and positive_count <= positive_indices[0] and positive_count + size > positive_indices[0]:
-                assert positive_indices[0] >= positive_count
-                features.append(read[positive_indices.popleft() - positive_count, :])
-                labels.append(1)
-              positive_count += size
-            else:
-              # copy negative data
-              while negative_indices and negative_count <= negative_indices[0] and negative_count + size > negative_indices[0]:
-                assert negative_indices[0] >= negative_count
-                features.append(read[negative_indices.popleft() - negative_count, :])
-                labels.append(-1)
-              negative_count += size
-          hdf5.cd("..")
+      for total_positives, total_negatives, blocks in sources:
+        # skip files that do not contain any of the requested features
+        if not (positive_indices and positive_indices[0] < positive_count + total_positives) and not (negative_indices and negative_indices[0] < negative_count + total_negatives):
+          positive_count += total_positives
+          negative_count += total_negatives
+          continue
+        for label, size, read in blocks():
+          indices, count = (positive_indices, positive_count) if label > 0 else (negative_indices, negative_count)
+          # copy the requested features of the current block
+          rows = []
+          while indices and count <= indices[0] and count + size > indices[0]:
+            rows.append(indices.popleft() - count)
+          if rows:
+            features.extend(read(rows))
+            labels.extend([label] * len(rows))
+          if label > 0:
+            positive_count += size
+          else:
+            negative_count += size
       # return features and labels
       return numpy.array(features), numpy.array(labels)
 
@@ -402,33 +486,35 @@ class TrainingSet:
       worst_positives, worst_negatives = [], []
       positive_count, negative_count = 0, 0
 
-      for feature_file in feature_files:
-        hdf5 = bob.io.base.HDF5File(feature_file)
-        for image in sorted(hdf5.sub_groups(recursive=False, relative=True)):
-          hdf5.cd(image)
-          for scale in sorted(hdf5.keys(relative=True)):
-            read = hdf5.get(scale)
-            size = read.shape[0]
-            prediction = bob.blitz.array((size,), numpy.float64)
-            # forward features through the model
-            result = model.forward(read, prediction)
-            if scale.startswith("Positives"):
-              indices = [i for i in range(size) if positive_count + i not in self.positive_indices]
-              worst_positives.extend([(prediction[i], positive_count + i, read[i]) for i in indices if prediction[i] <= 0])
-              positive_count += size
-            else:
-              indices = [i for i in range(size) if negative_count + i not in self.negative_indices]
-              worst_negatives.extend([(prediction[i], negative_count + i, read[i]) for i in indices if prediction[i] >= 0])
-              negative_count += size
-          hdf5.cd("..")
-
-        # cut off good results
-        if maximum_number_of_positives is not None and len(worst_positives) > maximum_number_of_positives:
+      def cut_off(worst_positives, worst_negatives, limit = 1):
+        # cut off good results, when more than limit times the maximum number of examples are collected
+        if maximum_number_of_positives is not None and len(worst_positives) > limit * maximum_number_of_positives:
           # keep only the positives with the low predictions (i.e., the worst)
           worst_positives = sorted(worst_positives, key=lambda k: k[0])[:maximum_number_of_positives]
-        if maximum_number_of_negatives is not None and len(worst_negatives) > maximum_number_of_negatives:
+        if maximum_number_of_negatives is not None and len(worst_negatives) > limit * maximum_number_of_negatives:
           # keep only the negatives with the high predictions (i.e., the worst)
           worst_negatives = sorted(worst_negatives, reverse=True, key=lambda k: k[0])[:maximum_number_of_negatives]
+        return worst_positives, worst_negatives
+
+      for _, _, blocks in sources:
+        for label, size, read in blocks():
+          read = read()
+          prediction = bob.blitz.array((size,), numpy.float64)
+          # forward features through the model
+          result = model.forward(read, prediction)
+          # the rows are copied, so that the block of features can be released
+          if label > 0:
+            indices = [i for i in range(size) if positive_count + i not in self.positive_indices]
+            worst_positives.extend([(prediction[i], positive_count + i, numpy.array(read[i])) for i in indices if prediction[i] <= 0])
+            positive_count += size
+          else:
+            indices = [i for i in range(size) if negative_count + i not in self.negative_indices]
+            worst_negatives.extend([(prediction[i], negative_count + i, numpy.array(read[i])) for i in indices if prediction[i] >= 0])
+            negative_count += size
+          # limit the memory, especially when all features are read from a single feature matrix
+          worst_positives, worst_negatives = cut_off(worst_positives, worst_negatives, 2)
+
+      worst_positives, worst_negatives = cut_off(worst_positives, worst_negatives)
 
       # mark all indices to be used
       self.positive_indices |= set(k[1] for k in worst_positives)
@@ -438,6 +524,58 @@ class TrainingSet:
       return numpy.array([f[2] for f in worst_positives] + [f[2] for f in worst_negatives]), numpy.array([1]*len(worst_positives) + [-1]*len(worst_negatives))
 
 
+  def convert(self, matrix_directory = None, data_type = numpy.uint16):
+    """convert([matrix_directory], [data_type]) -> None
+
+    Converts the extracted features into feature matrices, which can be memory-mapped.
+
+    All features that are stored in the feature files written by :py:meth:`extract` are written into two flat binary files ``Matrix-Positives.bin`` and ``Matrix-Negatives.bin``, one row per feature, in the order in which the features are numbered by :py:meth:`sample`.
+    The data type, the number of features and the index of the blocks of features are stored in a small ``Matrix.hdf5`` file, which is written last.
+    As soon as it exists, :py:meth:`sample` reads the features from the matrices using :py:class:`numpy.memmap`, i.e., only the pages that contain the requested features are read, and the features are passed to the model without copying them.
+
+    This function converts features that have been extracted into HDF5 datasets, and it combines the feature matrices of several parallel parts (see the ``data_type`` parameter of :py:meth:`extract`) into one.
+    Since the matrices can only be written, when the features of all parallel processes have been extracted, this function needs to be called after :py:meth:`extract` has finished, and the matrices are rewritten each time it is called.
+    Extracting features again removes the ``Matrix.hdf5`` file, so that outdated matrices are not used.
+
+    **Parameters:**
+
+    ``matrix_directory`` : str or ``None``
+      The directory to write the feature matrices into; if ``None``, the ``feature_directory`` of this training set is used.
+      Otherwise, the feature extractor file is copied, so that the ``matrix_directory`` can be used as a ``feature_directory`` on its own
+
+    ``data_type`` : :py:class:`numpy.dtype` or str
+      The data type of the stored features, either ``uint16`` or ``uint8``; ``uint8`` halves the size of the matrices, but can only be used when all features are smaller than 256 (e.g., for regular LBP codes with 8 neighbors)
+    """
+    data_type = _check_data_type(data_type)
+    matrix_directory = matrix_directory or self.feature_directory
+    bob.io.base.create_directories_safe(matrix_directory)
+    metadata_file, positives_file, negatives_file = _matrix_files(os.path.join(matrix_directory, "Matrix.hdf5"))
+
+    # read all features from the feature files
+    sources = self._feature_sources(use_matrix = False)
+    if os.path.exists(metadata_file):
+      os.remove(metadata_file)
+
+    logger.info("Converting %d feature files into feature matrices in %s", len(sources), matrix_directory)
+    index = []
+    totals = {1 : 0, -1 : 0}
+    number_of_features = 0
+    with open(positives_file, 'wb') as positives, open(negatives_file, 'wb') as negatives:
+      for _, _, blocks in sources:
+        for label, size, read in blocks():
+          features = read()
+          _append_features(features, data_type, positives if label > 0 else negatives)
+          index.append((label, totals[label], size))
+          totals[label] += size
+          number_of_features = features.shape[1]
+
+    _write_matrix_metadata(metadata_file, data_type, number_of_features, totals, index)
+
+    extractor_file = os.path.join(self.feature_directory, "Extractor.hdf5")
+    if os.path.abspath(matrix_directory) != os.path.abspath(self.feature_directory) and os.path.exists(extractor_file):
+      shutil.copy(extractor_file, matrix_directory)
+
+
   def feature_extractor(self):
     """feature_extractor() -> extractor
 
@@ -455,3 +593,116 @@ class TrainingSet:
       raise IOError("Could not found extractor file %s. Did you already run the extraction process? Did you specify the correct `feature_directory` in the constructor?" % extractor_file)
     hdf5 = bob.io.base.HDF5File(extractor_file)
     return FeatureExtractor(hdf5)
+
+
+def _blocks(hdf5):
+  # yields the label, the number of features and a function to read the features with the given row indices (or all features of the block) for all blocks of features in the given feature file
+  # the blocks are yielded in the order, in which the features are numbered in TrainingSet.sample
+  if hdf5.has_dataset("Index"):
+    # the index contains the names and sizes of all datasets, which are only read when features of them are requested
+    for label, image, mirrored, scale, size in hdf5.read("Index"):
+      dataset = "/Image-%d/%s-%s-%.5f" % (image, "Positives" if label > 0 else "Negatives", "om"[int(mirrored)], scale)
+      yield int(label), int(size), lambda rows = None, dataset=dataset, size=int(size): _read_rows(hdf5, dataset, size, rows)
+  else:
+    # features have been extracted without index, so we need to read them to get their number
+    for image in sorted(hdf5.sub_groups(recursive=False, relative=True)):
+      hdf5.cd(image)
+      for scale in sorted(hdf5.keys(relative=True)):
+        read = hdf5.get(scale)
+        yield 1 if scale.startswith("Positives") else -1, read.shape[0], lambda rows = None, read=read: read if rows is None else read[rows]
+      hdf5.cd("..")
+
+
+def _read_rows(hdf5, dataset, size, rows = None):
+  # reads the given rows of the given dataset with the given number of rows
+  if rows is not None and len(rows) * 4 < size:
+    # a few rows are read one by one
+    return numpy.array([hdf5.lread(dataset, row) for row in rows])
+  # otherwise, the whole dataset is read at once
+  features = hdf5.get(dataset)
+  return features if rows is None else features[rows]
+
+
+def _check_data_type(data_type):
+  # returns the given data type of feature matrices, if it is supported
+  data_type = numpy.dtype(data_type)
+  if data_type not in (numpy.dtype(numpy.uint8), numpy.dtype(numpy.uint16)):
+    raise ValueError("The data type %s is not supported, please use uint16 or uint8" % data_type)
+  return data_type
+
+
+def _matrix_files(metadata_file):
+  # returns the names of the given metadata file and of the positive and negative feature matrices that belong to it
+  prefix = os.path.splitext(metadata_file)[0]
+  return metadata_file, prefix + "-Positives.bin", prefix + "-Negatives.bin"
+
+
+def _append_features(features, data_type, matrix):
+  # appends the given block of features to the given (opened) feature matrix
+  if data_type != features.dtype and features.max() > numpy.iinfo(data_type).max:
+    raise ValueError("The features cannot be stored with data type %s, as they contain values up to %d" % (data_type, features.max()))
+  features.astype(data_type).tofile(matrix)
+
+
+def _write_matrix_metadata(metadata_file, data_type, number_of_features, totals, index):
+  # writes the metadata of the feature matrices, i.e., the blocks of features with their label, first row and number of rows
+  hdf5 = bob.io.base.HDF5File(metadata_file, "w")
+  hdf5.set("DataType", str(data_type))
+  hdf5.set("NumberOfFeatures", number_of_features)
+  hdf5.set("TotalPositives", totals[1])
+  hdf5.set("TotalNegatives", totals[-1])
+  if index:
+    hdf5.set("Index", numpy.array(index, numpy.int64))
+
+
+def _matrix_blocks(metadata_file):
+  # yields the blocks of features stored in the feature matrices that belong to the given metadata file, see _blocks
+  metadata_file, positives_file, negatives_file = _matrix_files(metadata_file)
+  hdf5 = bob.io.base.HDF5File(metadata_file)
+  if not hdf5.has_dataset("Index"):
+    return
+  data_type = numpy.dtype(hdf5.get("DataType"))
+  number_of_features = hdf5.get("NumberOfFeatures")
+  matrices = {
+    1 : numpy.memmap(positives_file, data_type, 'r', shape=(hdf5.get("TotalPositives"), number_of_features)) if hdf5.get("TotalPositives") else None,
+    -1 : numpy.memmap(negatives_file, data_type, 'r', shape=(hdf5.get("TotalNegatives"), number_of_features)) if hdf5.get("TotalNegatives") else None
+  }
+  for label, first, size in hdf5.get("Index"):
+    yield int(label), int(size), lambda rows = None, matrix=matrices[int(label)], first=int(first), size=int(size): _as_features(matrix[first:first+size] if rows is None else matrix[first + numpy.asarray(rows)])
+
+
+def _as_features(features):
+  # features are returned as uint16, avoiding a copy if they are stored as such
+  return features if features.dtype == numpy.uint16 else features.astype(numpy.uint16)
+
+
+def _boxes(tops, lefts, patch_size):
+  # creates the box array of the sampled bounding boxes with the given top-left offsets
+  boxes = numpy.ndarray((len(tops), 4), numpy.float64)
+  boxes[:,0], boxes[:,1] = tops, lefts
+  boxes[:,2:] = patch_size
+  return BoxArray(boxes)
+
+
+def _label(tops, lefts, patch_size, ground_truth, scale, similarity_thresholds):
+  # computes which of the sampled bounding boxes are positive and negative examples for the given ground truth bounding boxes
+  # a bounding box is labeled by the first ground truth bounding box, to which its similarity is above the lower threshold
+  positive = numpy.zeros(len(tops), numpy.bool_)
+  negative = numpy.ones(len(tops), numpy.bool_)
+  if not len(tops) or not ground_truth:
+    return positive, negative
+  similarities = _boxes(tops, lefts, patch_size).similarity(BoxArray(ground_truth).scale(scale))
+  above = similarities > min(similarity_thresholds)
+  first = numpy.argmax(above, axis=1)
+  matched = above[numpy.arange(len(tops)), first]
+  positive[:] = matched & (similarities[numpy.arange(len(tops)), first] > similarity_thresholds[1])
+  negative[:] = ~matched
+  return positive, negative
+
+
+def _extract_part(arguments):
+  # extracts the features of one part of the training set in a worker process
+  training_set, sampler, extractor_file, flags, options, parallel, task_id = arguments
+  feature_extractor = FeatureExtractor(bob.io.base.HDF5File(extractor_file))
+  feature_extractor.compact, feature_extractor.scale_blocks = flags
+  return training_set._extract_part(sampler, feature_extractor, options, parallel, task_id)
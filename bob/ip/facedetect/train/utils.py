@@ -153,10 +153,11 @@ def expected_eye_positions(bounding_box, padding = None):
 
 
 
-def parallel_part(data, parallel):
-  """parallel_part(data, parallel) -> part
+def parallel_part(data, parallel, task_id = None):
+  """parallel_part(data, parallel, [task_id]) -> part
 
   Splits off samples from the the given data list and the given number of parallel jobs based on the ``SGE_TASK_ID`` environment variable.
+  Instead of the environment variable, the (1-based) ``task_id`` can also be given directly.
 
   **Parameters:**
 
@@ -166,16 +167,22 @@ def parallel_part(data, parallel):
   ``parallel`` : int or ``None``
     The total number of parts, in which the data should be split into
 
+  ``task_id`` : int or ``None``
+    The index of the part, starting with 1; if not given, it is read from the ``SGE_TASK_ID`` environment variable
+
   **Returns:**
 
   ``part`` : [object]
     The desired partition of the ``data``
   """
-  if parallel is None or "SGE_TASK_ID" not in os.environ:
+  if task_id is None:
+    if parallel is None or "SGE_TASK_ID" not in os.environ:
+      return data
+    task_id = int(os.environ['SGE_TASK_ID'])
+  elif parallel is None:
     return data
 
   data_per_job = int(math.ceil(float(len(data)) / float(parallel)))
-  task_id = int(os.environ['SGE_TASK_ID'])
   first = (task_id-1) * data_per_job
   last = min(len(data), task_id * data_per_job)
   return data[first:last]
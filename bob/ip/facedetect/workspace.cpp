@@ -0,0 +1,179 @@
+/**
+ * @brief Binds the Workspace class to python
+ *
+ * Copyright (C) 2011-2014 Idiap Research Institute, Martigny, Switzerland
+ */
+
+#include "main.h"
+
+/******************************************************************/
+/************ Constructor Section *********************************/
+/******************************************************************/
+
+static auto Workspace_doc = bob::extension::ClassDoc(
+  BOB_EXT_MODULE_PREFIX ".Workspace",
+  "This class stores the memory that is required to extract features of one image with a :py:class:`FeatureExtractor`",
+  "A :py:class:`FeatureExtractor` stores the LBP extractors and the look-up-table of the features, which are not modified during feature extraction. "
+  "The (scaled) image, its integral images and the LBP code maps are stored in a workspace, which is filled by :py:meth:`FeatureExtractor.prepare`. "
+  "When no workspace is given to :py:meth:`FeatureExtractor.prepare`, an internal workspace of the extractor is used.\n\n"
+  "By using one workspace per thread, many detections can run concurrently with the same :py:class:`FeatureExtractor` and :py:class:`CompiledCascade`. "
+  "Each workspace holds its own copies of the LBP extractors, which are created by the first call to :py:meth:`FeatureExtractor.prepare`.\n\n"
+  "The memory of a workspace is sized for the largest image that has been prepared, and it is reused for smaller images. "
+  "The predictions and positions that are found by :py:meth:`CompiledCascade.scan` and :py:meth:`CompiledCascade.scan_best` are collected in buffers of the workspace, too. "
+  "Hence, when images of the same size are processed repeatedly with the same workspace, none of these buffers is enlarged, see :py:attr:`allocations`; only the arrays that are returned to Python are newly created in each call."
+).add_constructor(
+  bob::extension::FunctionDoc(
+    "__init__",
+    "Creates an empty workspace",
+    0,
+    true
+  )
+  .add_prototype("", "")
+);
+
+
+static int PyBobIpFacedetectWorkspace_init(PyBobIpFacedetectWorkspaceObject* self, PyObject* args, PyObject* kwargs) {
+  BOB_TRY
+
+  char** kwlist = Workspace_doc.kwlist(0);
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "", kwlist)) return -1;
+
+  self->cxx.reset(new bob::ip::facedetect::Workspace());
+  return 0;
+
+  BOB_CATCH_MEMBER("cannot create Workspace", -1)
+}
+
+static void PyBobIpFacedetectWorkspace_delete(PyBobIpFacedetectWorkspaceObject* self) {
+  self->cxx.reset();
+  Py_TYPE(self)->tp_free((PyObject*)self);
+}
+
+int PyBobIpFacedetectWorkspace_Check(PyObject* o) {
+  return PyObject_IsInstance(o, reinterpret_cast<PyObject*>(&PyBobIpFacedetectWorkspace_Type));
+}
+
+
+/******************************************************************/
+/************ Variables Section ***********************************/
+/******************************************************************/
+
+static auto image = bob::extension::VariableDoc(
+  "image",
+  "array_like <2D, float or uint8>",
+  "The (prepared) image the next features will be extracted from, read access only",
+  "A copy of the image is returned, since the memory is reused by the next call to :py:meth:`FeatureExtractor.prepare`. "
+  "When the image has been prepared in compact form (see :py:attr:`FeatureExtractor.compact`), the image is of type uint8."
+);
+PyObject* PyBobIpFacedetectWorkspace_image(PyBobIpFacedetectWorkspaceObject* self, void*){
+  BOB_TRY
+  if (self->cxx->isCompact()) return PyBlitzArrayCxx_AsNumpy(self->cxx->getCompactImage().copy());
+  return PyBlitzArrayCxx_AsNumpy(self->cxx->getImage().copy());
+  BOB_CATCH_MEMBER("image could not be read", 0)
+}
+
+static auto shape = bob::extension::VariableDoc(
+  "shape",
+  "(int, int)",
+  "The shape of the image in the scale that has been prepared, read access only",
+  "Usually, this is the shape of the :py:attr:`image`. "
+  "When the blocks of the LBP extractors are scaled instead of the image (see :py:attr:`FeatureExtractor.scale_blocks`), the :py:attr:`image` is larger, and this is the shape in which the patches are sampled."
+);
+PyObject* PyBobIpFacedetectWorkspace_shape(PyBobIpFacedetectWorkspaceObject* self, void*){
+  BOB_TRY
+  auto shape = self->cxx->getShape();
+  return Py_BuildValue("ii", shape[0], shape[1]);
+  BOB_CATCH_MEMBER("shape could not be read", 0)
+}
+
+static auto scaled_blocks = bob::extension::VariableDoc(
+  "scaled_blocks",
+  "bool",
+  "Have the blocks of the LBP extractors been scaled instead of the image in the latest call to :py:meth:`FeatureExtractor.prepare`? read access only"
+);
+PyObject* PyBobIpFacedetectWorkspace_scaled_blocks(PyBobIpFacedetectWorkspaceObject* self, void*){
+  BOB_TRY
+  if (self->cxx->hasScaledBlocks()) Py_RETURN_TRUE;
+  Py_RETURN_FALSE;
+  BOB_CATCH_MEMBER("scaled_blocks could not be read", 0)
+}
+
+static auto allocations = bob::extension::VariableDoc(
+  "allocations",
+  "int",
+  "The number of times that the buffers of this workspace have been enlarged, read access only",
+  "This counter is increased, whenever a buffer of the workspace needs to be enlarged, e.g., when a larger image is prepared or scanned than before. "
+  "It counts the buffers for the prepared images, for scanning them and for the scan results, but not the arrays that are returned to Python. "
+  "It can be used to assert that processing images of the same size again reuses the buffers of the workspace."
+);
+PyObject* PyBobIpFacedetectWorkspace_allocations(PyBobIpFacedetectWorkspaceObject* self, void*){
+  BOB_TRY
+  return Py_BuildValue("n", (Py_ssize_t)self->cxx->getAllocations());
+  BOB_CATCH_MEMBER("allocations could not be read", 0)
+}
+
+static PyGetSetDef PyBobIpFacedetectWorkspace_getseters[] = {
+    {
+      image.name(),
+      (getter)PyBobIpFacedetectWorkspace_image,
+      0,
+      image.doc(),
+      0
+    },
+    {
+      shape.name(),
+      (getter)PyBobIpFacedetectWorkspace_shape,
+      0,
+      shape.doc(),
+      0
+    },
+    {
+      scaled_blocks.name(),
+      (getter)PyBobIpFacedetectWorkspace_scaled_blocks,
+      0,
+      scaled_blocks.doc(),
+      0
+    },
+    {
+      allocations.name(),
+      (getter)PyBobIpFacedetectWorkspace_allocations,
+      0,
+      allocations.doc(),
+      0
+    },
+    {0}  /* Sentinel */
+};
+
+
+/******************************************************************/
+/************ Module Section **************************************/
+/******************************************************************/
+
+// Define the Workspace type struct; will be initialized later
+PyTypeObject PyBobIpFacedetectWorkspace_Type = {
+  PyVarObject_HEAD_INIT(0,0)
+  0
+};
+
+bool init_BobIpFacedetectWorkspace(PyObject* module)
+{
+  // initialize the type struct
+  PyBobIpFacedetectWorkspace_Type.tp_name = Workspace_doc.name();
+  PyBobIpFacedetectWorkspace_Type.tp_basicsize = sizeof(PyBobIpFacedetectWorkspaceObject);
+  PyBobIpFacedetectWorkspace_Type.tp_flags = Py_TPFLAGS_DEFAULT;
+  PyBobIpFacedetectWorkspace_Type.tp_doc = Workspace_doc.doc();
+
+  // set the functions
+  PyBobIpFacedetectWorkspace_Type.tp_new = PyType_GenericNew;
+  PyBobIpFacedetectWorkspace_Type.tp_init = reinterpret_cast<initproc>(PyBobIpFacedetectWorkspace_init);
+  PyBobIpFacedetectWorkspace_Type.tp_dealloc = reinterpret_cast<destructor>(PyBobIpFacedetectWorkspace_delete);
+  PyBobIpFacedetectWorkspace_Type.tp_getset = PyBobIpFacedetectWorkspace_getseters;
+
+  // check that everything is fine
+  if (PyType_Ready(&PyBobIpFacedetectWorkspace_Type) < 0)
+    return false;
+
+  // add the type to the module
+  Py_INCREF(&PyBobIpFacedetectWorkspace_Type);
+  return PyModule_AddObject(module, "Workspace", (PyObject*)&PyBobIpFacedetectWorkspace_Type) >= 0;
+}
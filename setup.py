@@ -95,10 +95,17 @@ setup(
         'bob.ip.facedetect._library',
         [
           "bob/ip/facedetect/cpp/features.cpp",
+          "bob/ip/facedetect/cpp/codes.cpp",
           "bob/ip/facedetect/cpp/boundingbox.cpp",
+          "bob/ip/facedetect/cpp/cascade.cpp",
+          "bob/ip/facedetect/cpp/pyramid.cpp",
 
           "bob/ip/facedetect/bounding_box.cpp",
+          "bob/ip/facedetect/box_array.cpp",
           "bob/ip/facedetect/feature_extractor.cpp",
+          "bob/ip/facedetect/workspace.cpp",
+          "bob/ip/facedetect/image_pyramid.cpp",
+          "bob/ip/facedetect/compiled_cascade.cpp",
           "bob/ip/facedetect/main.cpp",
         ],
         version = version,
@@ -137,11 +144,17 @@ setup(
       'console_scripts': [
         'collect_training_data.py = bob.ip.facedetect.script.collect_training_data:main',
         'extract_training_features.py = bob.ip.facedetect.script.extract_training_features:main',
+        'convert_training_features.py = bob.ip.facedetect.script.convert_training_features:main',
         'train_detector.py = bob.ip.facedetect.script.train_detector:main',
         'validate_detector.py = bob.ip.facedetect.script.validate_detector:main',
         'detect_faces.py = bob.ip.facedetect.script.detect_faces:main',
         'evaluate_detections.py = bob.ip.facedetect.script.evaluate:main',
-        'plot_froc.py = bob.ip.facedetect.script.plot_froc:main'
+        'plot_froc.py = bob.ip.facedetect.script.plot_froc:main',
+        'benchmark_pruning.py = bob.ip.facedetect.script.benchmark_pruning:main',
+        'benchmark_pyramid.py = bob.ip.facedetect.script.benchmark_pyramid:main',
+        'benchmark_block_scaling.py = bob.ip.facedetect.script.benchmark_block_scaling:main',
+        'benchmark_feature_reading.py = bob.ip.facedetect.script.benchmark_feature_reading:main',
+        'benchmark_code_maps.py = bob.ip.facedetect.script.benchmark_code_maps:main'
       ],
     },
 